@@ -0,0 +1,187 @@
+'''Measures the client-side CPU cost of the steps of a call, with requests
+answered by a null backend so that no time is spent on the network.
+
+    python benchmarks/client_benchmark.py [-o results.json]
+        [-b baseline.json] [-t tolerance] [--save-baseline baseline.json]
+
+Results are printed, and written as JSON with -o. With -b the results are
+compared to a baseline written earlier with --save-baseline, and the script
+exits with status 1 if a case got slower than the baseline by more than the
+tolerance. Timings depend on the machine and interpreter, so compare
+against a baseline recorded on the same machine. The stored
+benchmarks/client_baseline.json comes from CPython 2.7 on x86_64 and is
+only good for spotting large jumps elsewhere.
+'''
+
+import json
+import platform
+import sys
+import timeit
+from optparse import OptionParser
+from urlparse import urlparse, parse_qs
+
+from Crypto.PublicKey import RSA
+
+from mcash import mapi_client
+from mcash.mapi_client.mapi_response import MapiResponse
+from mcash.mapi_client.validation import create_payment_request_validator
+
+BASE_URL = 'https://api.mca.sh/merchant/v1'
+
+
+class PagedBackend(object):
+    """Answers list requests with pages of page_size uris, pages pages in
+    total, and every other request with content.
+    """
+
+    def __init__(self, pages=10, page_size=10, content='{"id": "tid1"}'):
+        self.content = content
+        self.pages = []
+        for page in range(1, pages + 1):
+            next_link = None
+            if page < pages:
+                next_link = BASE_URL + '/settlement/?page=%d' % (page + 1)
+            self.pages.append(json.dumps({
+                'uris': [BASE_URL + '/settlement/%d/' % (page * 100 + i)
+                         for i in range(page_size)],
+                'next': next_link}))
+
+    def dispatch_request(self, method, url, body, headers, auth, files=None):
+        auth(method, url, headers, body)
+        parsed = urlparse(url)
+        if parsed.path.endswith('/settlement/'):
+            page = int(parse_qs(parsed.query).get('page', ['1'])[0])
+            return MapiResponse(200, {}, self.pages[page - 1])
+        return MapiResponse(200, {}, self.content)
+
+
+def _line_items(n):
+    return [{'product_id': 'product-%d' % i,
+             'vat': '0.50',
+             'description': 'Product number %d' % i,
+             'vat_rate': '0.25',
+             'total': '2.50',
+             'item_cost': '2.50',
+             'quantity': '1',
+             'tags': [{'tag_id': 'tag-1', 'label': 'Some product info'}]}
+            for i in range(n)]
+
+
+def _payment_request():
+    return {'customer': 'alice', 'currency': 'NOK', 'amount': '25.00',
+            'allow_credit': False, 'pos_id': 'pos1', 'pos_tid': 'tid1',
+            'action': 'auth', 'expires_in': 60,
+            'line_items': _line_items(10)}
+
+
+def _client(auth=None, **kwargs):
+    return mapi_client.MapiClient(base_url='https://api.mca.sh',
+                                  auth=auth or mapi_client.OpenAuth(),
+                                  mcash_merchant='benchmerchant',
+                                  mcash_user='benchuser',
+                                  backend=PagedBackend(),
+                                  **kwargs)
+
+
+def cases(privkey):
+    """Dict of case name to a function making one call"""
+    client = _client()
+    rsa_client = _client(auth=mapi_client.RsaSha256Auth(privkey))
+    rsa_auth = rsa_client.auth
+    payment_request = _payment_request()
+    encoded = client._encode_body(payment_request)
+    headers = client.get_headers()
+    outcome = json.dumps({'id': 'tid1', 'status': 'ok', 'amount': '25.00',
+                          'currency': 'NOK', 'captures': [],
+                          'attachment_uri': None, 'permissions': None})
+    url = BASE_URL + '/payment_request/'
+    off_client = _client(validation='off')
+
+    return {
+        'get_headers': client.get_headers,
+        'validate_payment_request': lambda: create_payment_request_validator(
+            payment_request),
+        'encode_payment_request': lambda: client._encode_body(
+            payment_request),
+        'sign_rsa': lambda: rsa_auth('POST', url, dict(headers), encoded),
+        'response_decode': lambda: MapiResponse(200, {}, outcome).json(),
+        'do_req_get': lambda: client.do_req('GET', url + 'tid1/outcome/'),
+        'create_payment_request': lambda: client.create_payment_request(
+            **payment_request),
+        'create_payment_request_unvalidated': lambda: (
+            off_client.create_payment_request(**payment_request)),
+        'create_payment_request_rsa': lambda: (
+            rsa_client.create_payment_request(**payment_request)),
+        'get_all_settlements_100': client.get_all_settlements,
+    }
+
+
+def _measure(call, calls, min_time):
+    """Seconds per call, the best of 5 runs of at least calls calls and
+    min_time seconds each
+    """
+    timer = timeit.Timer(call)
+    number = calls
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def client_benchmark(calls, privkey, min_time=0.1):
+    """Returns a dict of case name to microseconds per call"""
+    results = {}
+    for name, call in sorted(cases(privkey).items()):
+        results[name] = _measure(call, calls, min_time) * 1e6
+        print '%-36s %12.1fus' % (name, results[name])
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of each case against the baseline, returns the
+    names of the cases slower by more than tolerance
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        change = results[name] / baseline[name] - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print '%-36s %+11.1f%%%s' % (name, change * 100, flag)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--calls", dest="calls", type="int",
+                      default=10, help="minimum calls per measurement")
+    parser.add_option("-m", "--min-time", dest="min_time", type="float",
+                      default=0.1, help="minimum seconds per measurement")
+    parser.add_option("-o", "--output", dest="output",
+                      help="write the results as JSON to this file")
+    parser.add_option("-b", "--baseline", dest="baseline",
+                      help="compare the results with this baseline")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float",
+                      default=0.25, help="allowed slowdown against the "
+                                         "baseline, 0.25 is 25%")
+    parser.add_option("--save-baseline", dest="save_baseline",
+                      help="write the results as a baseline to this file")
+    (options, args) = parser.parse_args()
+
+    privkey = RSA.generate(2048).exportKey()
+    results = client_benchmark(options.calls, privkey, options.min_time)
+    document = {'python': platform.python_version(),
+                'machine': platform.machine(),
+                'us_per_call': results}
+    for path in (options.output, options.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(document, f, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['us_per_call']
+        print
+        if compare(results, baseline, options.tolerance):
+            sys.exit(1)
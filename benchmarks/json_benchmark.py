@@ -0,0 +1,79 @@
+'''Measures encoding and decoding time of typical Merchant API payloads with
+each installed JSON codec.
+
+    python benchmarks/json_benchmark.py [-n calls]
+'''
+
+import timeit
+from optparse import OptionParser
+
+from mcash.mapi_client.json_codecs import (available_json_codecs,
+                                           get_json_codec)
+
+BASE_URL = 'https://api.mca.sh/merchant/v1'
+
+
+def _payment_request(line_items):
+    return {'customer': 'alice', 'currency': 'NOK', 'amount': '250.00',
+            'allow_credit': False, 'pos_id': 'pos1', 'pos_tid': 'tid1',
+            'action': 'auth', 'expires_in': 60,
+            'text': u'Takk for handelen',
+            'line_items': [{'product_id': 'product-%d' % i,
+                            'vat': '0.50',
+                            'description': u'Varenummer %d' % i,
+                            'vat_rate': '0.25',
+                            'total': '2.50',
+                            'item_cost': '2.50',
+                            'quantity': '1',
+                            'tags': [{'tag_id': 'tag-1',
+                                      'label': 'Some product info'}]}
+                           for i in range(line_items)]}
+
+
+def _settlement(transactions):
+    return {'id': 'settlement1',
+            'amount': '%d.00' % (transactions * 100),
+            'currency': 'NOK',
+            'fee': '%d.00' % transactions,
+            'settlement_date': '2014-05-01',
+            'transactions': [{'tid': 'tid%d' % i,
+                              'pos_id': 'pos1',
+                              'pos_tid': 'postid%d' % i,
+                              'amount': '100.00',
+                              'fee': '1.00',
+                              'date': '2014-04-30 12:00:%02d' % (i % 60),
+                              'type': 'payment'}
+                             for i in range(transactions)]}
+
+
+def _settlement_page(size):
+    return {'uris': [BASE_URL + '/settlement/%d/' % i for i in range(size)],
+            'next': BASE_URL + '/settlement/?page=2'}
+
+
+PAYLOADS = [('payment request, 1 item', _payment_request(1)),
+            ('payment request, 50 items', _payment_request(50)),
+            ('settlement page, 100 uris', _settlement_page(100)),
+            ('settlement, 1000 transactions', _settlement(1000))]
+
+
+def json_benchmark(calls):
+    codecs = [get_json_codec(name) for name in available_json_codecs()]
+    print '%-32s %-12s %12s %12s' % ('payload', 'codec', 'dumps', 'loads')
+    for description, payload in PAYLOADS:
+        encoded = codecs[-1].dumps(payload)
+        for codec in codecs:
+            dumps = min(timeit.repeat(lambda: codec.dumps(payload),
+                                      number=calls, repeat=3)) / calls
+            loads = min(timeit.repeat(lambda: codec.loads(encoded),
+                                      number=calls, repeat=3)) / calls
+            print '%-32s %-12s %10.1fus %10.1fus' % (
+                description, codec.name, dumps * 1e6, loads * 1e6)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--calls", dest="calls", type="int",
+                      default=100, help="calls per measurement")
+    (options, args) = parser.parse_args()
+    json_benchmark(options.calls)
@@ -0,0 +1,223 @@
+'''Drives MapiClient against the bundled stub Merchant API, to measure what
+a gateway can sustain without touching mCASH.
+
+    python benchmarks/load_generator.py [-b requests,requests-no-keepalive]
+        [-c 1,4,16] [-d seconds] [--latency ms] [--jitter ms]
+        [--error-rate fraction] [--page-size n] [--settlements n]
+        [--retry] [--stub-url url] [-o results.json]
+
+Every worker thread runs a mix of calls: creating payment requests and
+polling their outcomes, reading a POS and a shortlink, and listing all
+settlements page by page. Each combination of backend and concurrency
+level runs for the given duration and reports throughput, latency
+percentiles, failed calls and the client CPU time per call.
+
+The stub is run in a separate process, so that the CPU time measured is
+the client's alone. Use --stub-url to run against a stub started
+elsewhere instead.
+'''
+
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from optparse import OptionParser
+
+from mcash import mapi_client
+from mcash.mapi_client.stub_server import StubMerchantApi
+
+BACKENDS = {
+    'requests': lambda concurrency: mapi_client.RequestsFramework(
+        pool_maxsize=concurrency),
+    'requests-no-keepalive': lambda concurrency: (
+        mapi_client.RequestsFramework(keep_alive=False)),
+}
+
+# (weight, name) of the calls each worker picks from
+MIX = [(30, 'create_payment_request'),
+       (40, 'get_payment_request_outcome'),
+       (15, 'get_pos'),
+       (10, 'get_shortlink'),
+       (5, 'get_all_settlements')]
+
+
+def _serve_stub(options, urls, stop):
+    stub = StubMerchantApi(page_size=options.page_size,
+                           latency=options.latency / 1000.0,
+                           latency_jitter=options.jitter / 1000.0,
+                           error_rate=options.error_rate,
+                           log_requests=False)
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    stub.shortlinks['sl1'] = {'id': 'sl1', 'serial_number': '1'}
+    for i in range(options.settlements):
+        stub.add_settlement({'id': 'settlement%d' % i, 'amount': '100.00'})
+    with stub:
+        urls.put(stub.url)
+        stop.wait()
+
+
+class Worker(threading.Thread):
+    def __init__(self, client, number, deadline):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.client = client
+        self.number = number
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+        self.tids = []
+        self._calls = []
+        for weight, name in MIX:
+            self._calls.extend([getattr(self, '_' + name)] * weight)
+
+    def _create_payment_request(self):
+        res = self.client.create_payment_request(
+            customer='alice', currency='NOK', amount='100.00',
+            allow_credit=False, pos_id='pos1',
+            pos_tid='%d-%d' % (self.number, len(self.latencies)),
+            action='auth', expires_in=60)
+        self.tids.append(res['id'])
+
+    def _get_payment_request_outcome(self):
+        if not self.tids:
+            return self._create_payment_request()
+        self.client.get_payment_request_outcome(random.choice(self.tids))
+
+    def _get_pos(self):
+        self.client.get_pos('pos1')
+
+    def _get_shortlink(self):
+        self.client.get_shortlink('sl1')
+
+    def _get_all_settlements(self):
+        self.client.get_all_settlements()
+
+    def run(self):
+        while time.time() < self.deadline:
+            call = random.choice(self._calls)
+            start = time.time()
+            try:
+                call()
+            except Exception:
+                self.errors += 1
+            self.latencies.append(time.time() - start)
+
+
+def _percentile(values, percentile):
+    index = int(len(values) * percentile / 100.0)
+    return values[min(index, len(values) - 1)]
+
+
+def run_load(url, backend, concurrency, duration, retry=False):
+    client = mapi_client.MapiClient(
+        base_url=url, auth=mapi_client.OpenAuth(),
+        mcash_merchant='stubmerchant', mcash_user='admin',
+        backend=BACKENDS[backend](concurrency),
+        retry_policy=mapi_client.RetryPolicy() if retry else None)
+    cpu = os.times()
+    start = time.time()
+    workers = [Worker(client, i, start + duration)
+               for i in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    cpu_end = os.times()
+    client.close()
+
+    latencies = sorted(l for w in workers for l in w.latencies)
+    calls = len(latencies)
+    if not calls:
+        raise RuntimeError("no calls finished in %s seconds" % duration)
+    cpu_seconds = (cpu_end[0] - cpu[0]) + (cpu_end[1] - cpu[1])
+    return {'backend': backend,
+            'concurrency': concurrency,
+            'calls': calls,
+            'errors': sum(w.errors for w in workers),
+            'calls_per_sec': calls / elapsed,
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p90_ms': _percentile(latencies, 90) * 1000,
+            'p99_ms': _percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+            'cpu_us_per_call': cpu_seconds / calls * 1e6}
+
+
+def load_generator(url, backends, concurrencies, duration, retry):
+    print '%-22s %5s %8s %7s %10s %8s %8s %8s %8s %10s' % (
+        'backend', 'conc', 'calls', 'errors', 'calls/s', 'p50 ms', 'p90 ms',
+        'p99 ms', 'max ms', 'cpu us')
+    results = []
+    for backend in backends:
+        for concurrency in concurrencies:
+            r = run_load(url, backend, concurrency, duration, retry)
+            results.append(r)
+            print ('%(backend)-22s %(concurrency)5d %(calls)8d %(errors)7d '
+                   '%(calls_per_sec)10.1f %(p50_ms)8.1f %(p90_ms)8.1f '
+                   '%(p99_ms)8.1f %(max_ms)8.1f %(cpu_us_per_call)10.1f' % r)
+    return results
+
+
+def _ints(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-b", "--backends", dest="backends",
+                      default=','.join(sorted(BACKENDS)),
+                      help="comma separated backends, of " +
+                           ', '.join(sorted(BACKENDS)))
+    parser.add_option("-c", "--concurrency", dest="concurrency",
+                      default='1,4,16',
+                      help="comma separated numbers of worker threads")
+    parser.add_option("-d", "--duration", dest="duration", type="float",
+                      default=5.0, help="seconds to run each combination")
+    parser.add_option("--latency", dest="latency", type="float", default=5,
+                      help="stub latency in milliseconds")
+    parser.add_option("--jitter", dest="jitter", type="float", default=5,
+                      help="random stub latency of up to this many "
+                           "milliseconds on top of --latency")
+    parser.add_option("--error-rate", dest="error_rate", type="float",
+                      default=0.0, help="fraction of requests the stub "
+                                        "answers with 503")
+    parser.add_option("--page-size", dest="page_size", type="int",
+                      default=10, help="uris per page of list endpoints")
+    parser.add_option("--settlements", dest="settlements", type="int",
+                      default=50, help="number of settlements to list")
+    parser.add_option("--retry", dest="retry", action="store_true",
+                      default=False, help="retry failed requests with the "
+                                          "default RetryPolicy")
+    parser.add_option("--stub-url", dest="stub_url",
+                      help="use a stub that is already running, the stub "
+                           "options are then ignored")
+    parser.add_option("-o", "--output", dest="output",
+                      help="write the results as JSON to this file")
+    (options, args) = parser.parse_args()
+
+    backends = options.backends.split(',')
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error("unknown backend " + backend)
+
+    stub_process = None
+    url = options.stub_url
+    if url is None:
+        urls = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        stub_process = multiprocessing.Process(target=_serve_stub,
+                                               args=(options, urls, stop))
+        stub_process.start()
+        url = urls.get()
+    try:
+        results = load_generator(url, backends, _ints(options.concurrency),
+                                 options.duration, options.retry)
+    finally:
+        if stub_process is not None:
+            stop.set()
+            stub_process.join()
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,118 @@
+'''Measures the memory held by decoded payloads as plain dicts and as the
+typed models returned with typed_results=True.
+
+    python benchmarks/models_benchmark.py [-n objects]
+'''
+
+import sys
+from optparse import OptionParser
+
+from mcash.mapi_client.json_codecs import get_json_codec
+from mcash.mapi_client.models import (Settlement, PaymentRequest,
+                                      PaymentRequestOutcome, Shortlink, Pos)
+
+BASE_URL = 'https://api.mca.sh/merchant/v1'
+
+
+def _settlement(i):
+    return {'id': 'settlement%d' % i, 'currency': 'NOK',
+            'amount': '10000.00', 'fee': '100.00',
+            'created': '2014-05-01 00:00:00',
+            'uri': BASE_URL + '/settlement/settlement%d/' % i,
+            'payout_details': {'account_number': '12345678903',
+                               'amount': '9900.00'},
+            'transactions': [{'tid': 'tid%d-%d' % (i, t), 'pos_id': 'pos1',
+                              'pos_tid': 'postid%d' % t,
+                              'amount': '100.00', 'fee': '1.00',
+                              'date': '2014-04-30 12:00:%02d' % (t % 60),
+                              'type': 'payment'}
+                             for t in range(100)]}
+
+
+def _payment_request(i):
+    return {'id': 'tid%d' % i, 'customer': 'alice', 'currency': 'NOK',
+            'amount': '250.00', 'allow_credit': False, 'pos_id': 'pos1',
+            'pos_tid': 'postid%d' % i, 'action': 'auth', 'expires_in': 60,
+            'text': u'Takk for handelen',
+            'line_items': [{'product_id': 'product-%d' % t, 'vat': '0.50',
+                            'description': u'Varenummer %d' % t,
+                            'vat_rate': '0.25', 'total': '2.50',
+                            'item_cost': '2.50', 'quantity': '1'}
+                           for t in range(5)]}
+
+
+def _outcome(i):
+    return {'id': 'tid%d' % i, 'status': 'auth', 'status_code': 2000,
+            'customer': 'alice', 'currency': 'NOK', 'amount': '250.00',
+            'additional_amount': '0.00', 'auth_amount': '250.00',
+            'pos_id': 'pos1', 'pos_tid': 'postid%d' % i,
+            'date_modified': '2014-04-30 12:00:00',
+            'date_expires': '2014-05-01 12:00:00',
+            'captures': [], 'refunds': [], 'attachment_uri': None,
+            'permissions': None}
+
+
+def _shortlink(i):
+    return {'id': 'shortlink%d' % i,
+            'callback_uri': 'https://example.com/scan/%d/' % i,
+            'serial_number': str(i), 'description': 'Till %d' % i,
+            'uri': 'http://mca.sh/s/%d/' % i}
+
+
+def _pos(i):
+    return {'id': 'pos%d' % i, 'name': 'Till %d' % i, 'type': 'store',
+            'location': {'latitude': 59.91, 'longitude': 10.75,
+                         'accuracy': 20.0}}
+
+
+PAYLOADS = [('settlement, 100 transactions', Settlement, _settlement),
+            ('payment request, 5 items', PaymentRequest, _payment_request),
+            ('payment request outcome', PaymentRequestOutcome, _outcome),
+            ('shortlink', Shortlink, _shortlink),
+            ('pos', Pos, _pos)]
+
+
+def deep_size(obj, seen):
+    """Bytes held by obj and everything it refers to, counting shared
+    objects once
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += deep_size(value, seen)
+    else:
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                try:
+                    size += deep_size(getattr(obj, name), seen)
+                except AttributeError:
+                    pass
+    return size
+
+
+def models_benchmark(objects):
+    codec = get_json_codec()
+    print '%-32s %12s %12s %8s' % ('payload', 'dicts', 'models', 'ratio')
+    for description, model, payload in PAYLOADS:
+        encoded = [codec.dumps(payload(i)) for i in range(objects)]
+        wire = sum(len(e) for e in encoded)
+        dicts = deep_size([codec.loads(e) for e in encoded], set())
+        models = deep_size([model.from_dict(codec.loads(e))
+                            for e in encoded], set())
+        print '%-32s %10.1fkB %10.1fkB %7.2fx   (%.1fkB on the wire)' % (
+            description, dicts / 1e3, models / 1e3, float(dicts) / models,
+            wire / 1e3)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--objects", dest="objects", type="int",
+                      default=1000, help="objects of each payload")
+    (options, args) = parser.parse_args()
+    models_benchmark(options.objects)
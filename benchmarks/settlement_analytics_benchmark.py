@@ -0,0 +1,80 @@
+'''Measures building a SettlementTable from settlement dicts, aggregating
+it and exporting it, with NumPy if installed and with the array fallback.
+
+    python benchmarks/settlement_analytics_benchmark.py [-n settlements]
+        [-t transactions per settlement]
+'''
+
+import io
+import time
+from optparse import OptionParser
+
+from mcash.mapi_client import settlement_analytics
+from mcash.mapi_client.settlement_analytics import SettlementTable
+
+CURRENCIES = ['NOK', 'NOK', 'NOK', 'SEK', 'EUR']
+TYPES = ['payment', 'payment', 'payment', 'refund']
+
+
+def _settlements(count, transactions):
+    return [{'id': 'settlement%d' % i,
+             'currency': CURRENCIES[i % len(CURRENCIES)],
+             'created': '20%02d-%02d-%02d 00:00:00' % (
+                 10 + i % 5, 1 + i % 12, 1 + i % 28),
+             'amount': '%d.%02d' % (i % 10000, i % 100),
+             'fee': '%d.%02d' % (i % 100, i % 97),
+             'transactions': [{'tid': 'tid%d-%d' % (i, t),
+                               'type': TYPES[t % len(TYPES)],
+                               'amount': '%d.00' % (t * 10),
+                               'fee': '0.%02d' % (t % 100)}
+                              for t in range(transactions)]}
+            for i in range(count)]
+
+
+def _time(f):
+    start = time.time()
+    result = f()
+    return result, (time.time() - start) * 1000
+
+
+def _run(settlements):
+    table, build = _time(lambda: SettlementTable.from_settlements(
+        settlements))
+    print '  %-40s %8.1fms' % ('from_settlements', build)
+    for description, f in [
+            ('totals by currency and month', table.totals),
+            ('totals by day', lambda: table.totals(by=('period',),
+                                                   period='day')),
+            ('transaction totals by currency, month, type',
+             table.transaction_totals)]:
+        print '  %-40s %8.1fms' % (description, _time(f)[1])
+    for description, export in [('to_csv', table.to_csv),
+                                ('save', table.save)]:
+        f = io.BytesIO()
+        print '  %-40s %8.1fms %8.1fkB' % (
+            description, _time(lambda: export(f))[1], len(f.getvalue()) / 1e3)
+
+
+def settlement_analytics_benchmark(count, transactions):
+    settlements = _settlements(count, transactions)
+    numpy = settlement_analytics.numpy
+    if numpy is not None:
+        print 'numpy %s, %d settlements' % (numpy.__version__, count)
+        _run(settlements)
+    settlement_analytics.numpy = None
+    try:
+        print 'array, %d settlements' % count
+        _run(settlements)
+    finally:
+        settlement_analytics.numpy = numpy
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--settlements", dest="settlements", type="int",
+                      default=50000, help="number of settlements")
+    parser.add_option("-t", "--transactions", dest="transactions",
+                      type="int", default=0,
+                      help="transactions per settlement")
+    (options, args) = parser.parse_args()
+    settlement_analytics_benchmark(options.settlements, options.transactions)
@@ -0,0 +1,63 @@
+'''Measures how many requests per second RsaSha256Auth can sign with each
+installed signing engine, and checks that all engines produce byte-identical
+Authorization headers.
+
+    python benchmarks/sign_benchmark.py [-k private_key.pem] [-d seconds]
+'''
+
+import sys
+import time
+from optparse import OptionParser
+
+from Crypto.PublicKey import RSA
+
+from mcash.mapi_client.auth import RsaSha256Auth
+from mcash.mapi_client.signers import available_engines
+
+
+class FixedTimestampAuth(RsaSha256Auth):
+    def _get_timestamp(self):
+        return '2014-01-01 12:00:00'
+
+
+def _sign(auth):
+    headers = {'X-Mcash-Merchant': 'benchmerchant',
+               'X-Mcash-User': 'benchuser'}
+    body = '{"customer": "alice", "amount": "100.00", "currency": "NOK"}'
+    return auth('POST', 'https://api.mca.sh/merchant/v1/payment_request/',
+                headers, body)[2]['Authorization']
+
+
+def sign_benchmark(privkey, duration):
+    headers = {}
+    for engine in available_engines():
+        auth = FixedTimestampAuth(privkey, signer=engine)
+        headers[engine] = _sign(auth)
+        count = 0
+        start = time.time()
+        while time.time() - start < duration:
+            _sign(auth)
+            count += 1
+        print '%-14s %10.1f signatures/sec' % (engine,
+                                               count / (time.time() - start))
+
+    identical = len(set(headers.values())) == 1
+    print 'Authorization headers identical across engines:', identical
+    return identical
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-k", "--keyfilename", dest="keyfile",
+                      help="RSA private key in PEM format, a 2048 bit key "
+                           "is generated if not given")
+    parser.add_option("-d", "--duration", dest="duration", type="float",
+                      default=2.0, help="seconds to run each engine")
+    (options, args) = parser.parse_args()
+
+    if options.keyfile:
+        privkey = open(options.keyfile).read()
+    else:
+        privkey = RSA.generate(2048).exportKey()
+    if not sign_benchmark(privkey, options.duration):
+        sys.exit(1)
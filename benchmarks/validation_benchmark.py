@@ -0,0 +1,58 @@
+'''Measures the per-call client-side cost of create_payment_request with
+1, 50 and 500 line items for each validation mode. Requests are not sent,
+the client uses the null backend.
+
+    python benchmarks/validation_benchmark.py [-n calls]
+'''
+
+import timeit
+from optparse import OptionParser
+
+from mcash import mapi_client
+from mcash.mapi_client.validation import VALIDATION_MODES
+
+
+def _line_items(n):
+    return [{'product_id': 'product-%d' % i,
+             'vat': '0.50',
+             'description': 'Product number %d' % i,
+             'vat_rate': '0.25',
+             'total': '2.50',
+             'item_cost': '2.50',
+             'quantity': '1',
+             'tags': [{'tag_id': 'tag-1', 'label': 'Some product info'}]}
+            for i in range(n)]
+
+
+def validation_benchmark(calls):
+    print '%-12s %12s %12s %12s' % ('line items', 'full', 'fast', 'off')
+    for n in (1, 50, 500):
+        line_items = _line_items(n)
+        timings = []
+        for mode in VALIDATION_MODES:
+            client = mapi_client.MapiClient(
+                base_url='https://api.mca.sh',
+                auth=mapi_client.OpenAuth(),
+                mcash_merchant='benchmerchant',
+                mcash_user='benchuser',
+                backend=mapi_client.NullFramework(content='{"id": "tid"}'),
+                validation=mode)
+
+            def call():
+                client.create_payment_request(
+                    customer='alice', currency='NOK',
+                    amount='%.2f' % (2.5 * n), allow_credit=False,
+                    pos_id='pos1', pos_tid='tid1', action='auth',
+                    expires_in=60, line_items=line_items)
+            timings.append(min(timeit.repeat(call, number=calls,
+                                             repeat=3)) / calls)
+        print '%-12d %10.1fus %10.1fus %10.1fus' % (
+            (n,) + tuple(t * 1e6 for t in timings))
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("-n", "--calls", dest="calls", type="int",
+                      default=200, help="calls per measurement")
+    (options, args) = parser.parse_args()
+    validation_benchmark(options.calls)
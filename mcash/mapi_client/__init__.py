@@ -1,7 +1,23 @@
 from mcash.mapi_client.mapi_client import *
+from mcash.mapi_client.async_mapi_client import *
 from mcash.mapi_client.auth import *
+from mcash.mapi_client.signers import *
+from mcash.mapi_client.json_codecs import *
+from mcash.mapi_client.cache import *
+from mcash.mapi_client.retry import *
+from mcash.mapi_client.hedging import *
+from mcash.mapi_client.ratelimit import *
+from mcash.mapi_client.coalescing import *
+from mcash.mapi_client.outcomes import *
+from mcash.mapi_client.metrics import *
+from mcash.mapi_client.timing import *
+from mcash.mapi_client.models import *
+from mcash.mapi_client.settlement_analytics import *
+from mcash.mapi_client.sync_store import *
+from mcash.mapi_client.http_cache import *
 from mcash.mapi_client.mapi_error import *
 from mcash.mapi_client.mapi_response import *
 from mcash.mapi_client.backends import *
 from mcash.mapi_client.backends.requestsframework import *
+from mcash.mapi_client.backends.nullframework import *
 from mcash.mapi_client.backends.urlfetch import *
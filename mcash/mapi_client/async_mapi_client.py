@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from mapi_client import MapiClient
+from backends.requestsframework import RequestsFramework
+
+__all__ = ["AsyncMapiClient"]
+
+
+class AsyncMapiClient(object):
+    """Non-blocking counterpart to MapiClient.
+
+    Takes the same arguments as MapiClient, plus max_workers. Every endpoint
+    method returns a concurrent.futures.Future that resolves to what the
+    MapiClient method of the same name returns, or raises the MapiError or
+    validation error it raised. The calls are run on a shared thread pool
+    through a MapiClient, so auth, validation and the backend are the same.
+
+    The methods returning iterators, get_shortlink_generator and the iter_
+    methods, return them directly rather than in a future, as their pages
+    are only fetched while iterating.
+
+    Arguments:
+        max_workers:
+            Maximum number of requests in flight at the same time
+        client:
+            Use an existing MapiClient instead of creating one
+    """
+    _endpoints = [
+        'do_req',
+        'get_merchant',
+        'get_merchant_lookup',
+        'create_user',
+        'update_user',
+        'get_user',
+        'create_pos',
+        'get_all_pos',
+        'count_pos',
+        'update_pos',
+        'delete_pos',
+        'get_pos',
+        'create_payment_request',
+        'update_payment_request',
+        'batch_create_payment_requests',
+        'batch_update_payment_requests',
+        'get_payment_request',
+        'get_payment_request_outcome',
+        'post_chat_message',
+        'update_ticket',
+        'create_shortlink',
+        'get_all_shortlinks',
+        'count_shortlinks',
+        'update_shortlink',
+        'delete_shortlink',
+        'get_shortlink',
+        'get_last_settlement',
+        'get_all_settlements',
+        'count_settlements',
+        'get_settlement',
+        'create_permission_request',
+        'get_permission_request',
+        'get_permission_request_outcome',
+        'get_all_status_codes',
+        'count_status_codes',
+        'get_status_code',
+        'upload_receipt',
+        'upload_attachment',
+    ]
+    _iterators = [
+        'iter_pos',
+        'get_shortlink_generator',
+        'iter_shortlinks',
+        'iter_settlements',
+        'iter_status_codes',
+    ]
+
+    def __init__(self, *args, **kwargs):
+        max_workers = kwargs.pop('max_workers', 20)
+        client = kwargs.pop('client', None)
+        if client is None:
+            # Size the connection pool so every worker can keep a
+            # connection alive
+            kwargs.setdefault('backend',
+                              RequestsFramework(pool_maxsize=max_workers))
+            client = MapiClient(*args, **kwargs)
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers)
+
+    def wait_for_outcome(self, *args, **kwargs):
+        # already returns a future, and needs no worker while waiting
+        return self.client.wait_for_outcome(*args, **kwargs)
+    wait_for_outcome.__doc__ = MapiClient.wait_for_outcome.__doc__
+
+    def wait_for_permission_outcome(self, *args, **kwargs):
+        return self.client.wait_for_permission_outcome(*args, **kwargs)
+    wait_for_permission_outcome.__doc__ = \
+        MapiClient.wait_for_permission_outcome.__doc__
+
+    def close(self):
+        """Wait for pending calls to finish and release the connections"""
+        self.executor.shutdown(wait=True)
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _submitter(name):
+    def submit(self, *args, **kwargs):
+        return self.executor.submit(getattr(self.client, name),
+                                    *args, **kwargs)
+    submit.__name__ = name
+    submit.__doc__ = getattr(MapiClient, name).__doc__
+    return submit
+
+def _passthrough(name):
+    def call(self, *args, **kwargs):
+        return getattr(self.client, name)(*args, **kwargs)
+    call.__name__ = name
+    call.__doc__ = getattr(MapiClient, name).__doc__
+    return call
+
+for _name in AsyncMapiClient._endpoints:
+    setattr(AsyncMapiClient, _name, _submitter(_name))
+for _name in AsyncMapiClient._iterators:
+    setattr(AsyncMapiClient, _name, _passthrough(_name))
@@ -1,7 +1,6 @@
 import base64
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
+import hashlib
+from signers import get_signer
 from time import strftime
 
 __all__ = ["OpenAuth", "SecretAuth", "RsaSha256Auth"]
@@ -27,10 +26,20 @@ class SecretAuth(object):
 
 
 class RsaSha256Auth(object):
-    """Attaches RSA authentication to the given Request object."""
+    """Attaches RSA authentication to the given Request object.
 
-    def __init__(self, privkey):
-        self.signer = PKCS1_v1_5.new(RSA.importKey(privkey))
+    Arguments:
+        privkey:
+            The RSA private key
+        signer:
+            Name of the signing engine to use, or an object with a
+            sign(data) method. Defaults to the fastest installed engine.
+    """
+
+    def __init__(self, privkey, signer=None):
+        if signer is None or isinstance(signer, basestring):
+            signer = get_signer(privkey, signer)
+        self.signer = signer
 
     def __call__(self, method, url, headers, body):
         headers['X-Mcash-Timestamp'] = self._get_timestamp()
@@ -44,11 +53,16 @@ class RsaSha256Auth(object):
         """
         return str(strftime("%Y-%m-%d %H:%M:%S"))
 
+    _empty_digest = 'SHA256=' + base64.b64encode(hashlib.sha256('').digest())
+
     def _get_sha256_digest(self, content):
         """Return the sha256 digest of the content in the
         header format the Merchant API expects.
         """
-        content_sha256 = base64.b64encode(SHA256.new(content).digest())
+        if not content:
+            # GETs and DELETEs all have the same digest
+            return self._empty_digest
+        content_sha256 = base64.b64encode(hashlib.sha256(content).digest())
         return 'SHA256=' + content_sha256
 
     def _sha256_sign(self, method, url, headers, body):
@@ -61,7 +75,6 @@ class RsaSha256Auth(object):
                 sign_headers += d + key.upper() + '=' + value
                 d = '&'
 
-        rsa_signature = base64.b64encode(
-            self.signer.sign(SHA256.new(sign_headers)))
+        rsa_signature = base64.b64encode(self.signer.sign(sign_headers))
 
         return 'RSA-SHA256 ' + rsa_signature
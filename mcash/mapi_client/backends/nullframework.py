@@ -0,0 +1,19 @@
+from ..mapi_response import MapiResponse
+
+__all__ = ["NullFramework"]
+
+
+class NullFramework(object):
+    """Backend that sends nothing. Auth is applied to each request and a
+    canned response is returned, which makes it possible to measure the
+    client-side cost of a call.
+    """
+
+    def __init__(self, status=200, headers=None, content='{}'):
+        self.status = status
+        self.headers = headers or {}
+        self.content = content
+
+    def dispatch_request(self, method, url, body, headers, auth, files=None):
+        auth(method, url, headers, body)
+        return MapiResponse(self.status, self.headers, self.content)
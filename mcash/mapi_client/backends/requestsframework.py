@@ -1,17 +1,154 @@
+from __future__ import absolute_import
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
 from ..mapi_response import MapiResponse
 
 __all__ = ["RequestsFramework"]
 
+# seconds spent connecting by the request being timed on this thread, None
+# when the request is not timed
+_connecting = threading.local()
+# connection class of urllib3 to its subclass timing connect
+_timed_connection_classes = {}
+
+
+def _timed_connection_class(cls):
+    timed = _timed_connection_classes.get(cls)
+    if timed is None:
+        def connect(self):
+            start = time.time()
+            try:
+                return cls.connect(self)
+            finally:
+                if getattr(_connecting, 'seconds', None) is not None:
+                    _connecting.seconds += time.time() - start
+        timed = _timed_connection_classes[cls] = type(
+            'Timed' + cls.__name__, (cls,), {'connect': connect})
+    return timed
+
+
+class _TimingAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record the time they take to connect,
+    which urllib3 does lazily when the first request is sent on them.
+    """
+
+    def _timed(self, pool):
+        cls = pool.ConnectionCls
+        if cls not in _timed_connection_classes.values():
+            pool.ConnectionCls = _timed_connection_class(cls)
+        return pool
+
+    def get_connection(self, *args, **kwargs):
+        return self._timed(HTTPAdapter.get_connection(self, *args, **kwargs))
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        # used instead of get_connection by requests 2.32 and later
+        return self._timed(HTTPAdapter.get_connection_with_tls_context(
+            self, *args, **kwargs))
+
 
 class RequestsFramework(object):
-    def dispatch_request(self, method, url, body, headers, auth, files=None):
-        import requests
+    """Dispatches requests through a pooled requests Session, so repeated
+    calls to the Merchant API reuse kept-alive TCP/TLS connections instead of
+    paying a fresh handshake per call.
+
+    Arguments:
+        pool_connections:
+            Number of per-host connection pools to keep
+        pool_maxsize:
+            Maximum number of connections kept alive per host
+        pool_block:
+            Wait for a free connection when a host's pool is exhausted
+            instead of opening extra connections that are thrown away
+        keep_alive:
+            Keep connections open between requests
+        max_idle:
+            Seconds the pool may sit unused before its connections are
+            closed and reopened on the next request. None never reaps.
+        timeout:
+            Socket timeout in seconds for each request
+    """
+
+    retryable_errors = (requests.ConnectionError, requests.Timeout)
+    # dispatch_request accepts a RequestTiming to break the round trip down
+    records_timing = True
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, max_idle=None, timeout=60):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._last_used = time.time()
+        self.session = self._create_session()
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = _TimingAdapter(pool_connections=self.pool_connections,
+                                 pool_maxsize=self.pool_maxsize,
+                                 pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def _reap_idle_connections(self):
+        """Close pooled connections that have been idle longer than
+        max_idle, the server or a middlebox has most likely dropped them.
+        """
+        now = time.time()
+        with self._lock:
+            idle = now - self._last_used
+            self._last_used = now
+        if self.max_idle is not None and idle > self.max_idle:
+            for adapter in self.session.adapters.values():
+                adapter.close()
+
+    def dispatch_request(self, method, url, body, headers, auth, files=None,
+                         timing=None):
         method, url, headers, data = auth(method, url, headers, body)
-        res = requests.request(method,
-                               url,
-                               data=data,
-                               headers=headers,
-                               auth=auth,
-                               timeout=60,
-                               files=files)
-        return MapiResponse(res.status_code, res.headers, res.content)
+        self._reap_idle_connections()
+        if timing is None:
+            res = self.session.request(method,
+                                       url,
+                                       data=data,
+                                       headers=headers,
+                                       timeout=self.timeout,
+                                       files=files)
+            return MapiResponse(res.status_code, res.headers, res.content)
+
+        # Stream the response, so that waiting for the headers and reading
+        # the body can be told apart. Connecting is timed by the connections
+        # of the _TimingAdapter.
+        start = time.time()
+        _connecting.seconds = 0.0
+        try:
+            res = self.session.request(method,
+                                       url,
+                                       data=data,
+                                       headers=headers,
+                                       timeout=self.timeout,
+                                       files=files,
+                                       stream=True)
+            connect = _connecting.seconds
+        finally:
+            _connecting.seconds = None
+        headers_received = time.time()
+        content = res.content
+        if connect:
+            timing.add('connect', connect)
+        timing.add('server_wait', headers_received - start - connect)
+        timing.add('download', time.time() - headers_received)
+        return MapiResponse(res.status_code, res.headers, content)
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
@@ -7,15 +7,23 @@ __all__ = ["UrlFetchFramework"]
 
 
 class UrlFetchFramework(object):
-    def dispatch_request(self, method, url, body, headers, auth):
-        method, url, headers, data = auth(method, url, headers, body)
+    retryable_errors = (urlfetch.DownloadError,
+                        urlfetch.DeadlineExceededError)
 
-        payload = {}
-        if type(data) == dict:
-            for key, value in data.iteritems():
+    def dispatch_request(self, method, url, body, headers, auth):
+        if type(body) == dict:
+            # Encode before signing, so the content digest is computed over
+            # the bytes that are sent. MapiClient passes bodies pre-encoded.
+            payload = {}
+            for key, value in body.iteritems():
                 if value is not None:
                     payload.update({key: value})
-            data = json.dumps(payload)
+            body = json.dumps(payload)
+
+        method, url, headers, data = auth(method, url, headers, body)
+        if hasattr(data, 'read'):
+            # urlfetch can't stream, it needs the whole payload
+            data = data.read()
 
         res = urlfetch.fetch(url=url,
                              payload=data,
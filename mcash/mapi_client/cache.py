@@ -0,0 +1,123 @@
+import copy
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+__all__ = ["LRUCache", "ResponseCache"]
+
+_missing = object()
+
+
+class LRUCache(object):
+    """Thread-safe mapping holding at most maxsize entries, evicting the
+    least recently used first. Entries can be given a time to live in
+    seconds, after which they are treated as missing.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _missing)
+            if entry is _missing:
+                return default
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                return default
+            # reinsert to mark as most recently used
+            self._data[key] = entry
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, predicate=None):
+        """Remove all entries, or those whose key matches predicate"""
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if predicate(k)]:
+                    del self._data[key]
+
+
+class ResponseCache(object):
+    """Cache for the results of API endpoints that rarely change.
+
+    Results are kept per endpoint for the TTL configured for that endpoint,
+    endpoints without a TTL are not cached. Callers get a copy of the cached
+    result, so it is safe to modify.
+
+    Arguments:
+        maxsize:
+            Maximum number of results kept, across all endpoints
+        ttls:
+            Dict of endpoint name to TTL in seconds, updating the defaults
+    """
+    default_ttls = {
+        'get_status_code': 3600,
+        'get_all_status_codes': 3600,
+        'get_merchant': 300,
+        'get_merchant_lookup': 300,
+    }
+
+    def __init__(self, maxsize=1024, ttls=None):
+        self.ttls = dict(self.default_ttls)
+        self.ttls.update(ttls or {})
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._cache = LRUCache(maxsize)
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, endpoint, key, fetch):
+        """Return the cached result of endpoint for key, or call fetch and
+        cache what it returns.
+        """
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            return fetch()
+        value = self._cache.get((endpoint, key), _missing)
+        with self._lock:
+            if value is _missing:
+                self.misses[endpoint] += 1
+            else:
+                self.hits[endpoint] += 1
+        if value is _missing:
+            value = fetch()
+            self._cache.set((endpoint, key), value, ttl)
+        return copy.deepcopy(value)
+
+    def invalidate(self, endpoint=None, key=_missing):
+        """Drop cached results. Without arguments everything is dropped,
+        otherwise all results of endpoint, or only the one for key.
+        """
+        if endpoint is None:
+            self._cache.clear()
+        elif key is _missing:
+            self._cache.clear(lambda k: k[0] == endpoint)
+        else:
+            self._cache.delete((endpoint, key))
+
+    def stats(self):
+        """Hit and miss counters per endpoint, and overall size"""
+        return {'hits': dict(self.hits),
+                'misses': dict(self.misses),
+                'size': len(self._cache),
+                'evictions': self._cache.evictions}
@@ -0,0 +1,87 @@
+import threading
+import time
+
+__all__ = ["RequestCoalescer"]
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = None
+
+
+class RequestCoalescer(object):
+    """Single-flight for identical reads. While a request for a key is in
+    flight, other callers asking for the same key wait for it and share its
+    response instead of sending their own.
+
+    The response is shared as is, callers must not modify it or the data
+    parsed from it. MapiClient keys requests on the merchant and user as
+    well as the url and expected status, so one coalescer can be shared by
+    the clients of several merchants.
+
+    Arguments:
+        reuse_window:
+            Seconds a finished response is handed to new callers before a
+            fresh request is sent, 0 shares only requests in flight. Errors
+            are never reused.
+    """
+
+    def __init__(self, reuse_window=0):
+        self.reuse_window = reuse_window
+        self.requests = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fetch):
+        """Return the result of fetch, or of the call in flight for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.finished is not None and (
+                    time.time() - call.finished >= self.reuse_window):
+                del self._calls[key]
+                call = None
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                if self.reuse_window > 0:
+                    self._drop_expired()
+                self.requests += 1
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if call.error is None and self.reuse_window > 0:
+                    call.finished = time.time()
+                elif self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _drop_expired(self):
+        now = time.time()
+        for key, call in self._calls.items():
+            if (call.finished is not None and
+                    now - call.finished >= self.reuse_window):
+                del self._calls[key]
+
+    def stats(self):
+        """Counters of requests sent and requests answered by another"""
+        with self._lock:
+            return {'requests': self.requests, 'coalesced': self.coalesced}
@@ -0,0 +1,50 @@
+from urlparse import urlparse
+
+__all__ = ["endpoint_family", "endpoint_template"]
+
+
+def endpoint_family(url):
+    """Name of the resource collection a url belongs to, the first path
+    segment after the API version, e.g. 'payment_request' for
+    .../merchant/v1/payment_request/<tid>/outcome/
+    """
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    for i, segment in enumerate(segments[:-1]):
+        if segment == 'v1':
+            return segments[i + 1]
+    return segments[0] if segments else ''
+
+
+# Placeholder for the id following each collection in a path
+_id_names = {
+    'payment_request': '{tid}',
+    'permission_request': '{rid}',
+    'pos': '{pos_id}',
+    'shortlink': '{shortlink_id}',
+    'settlement': '{settlement_id}',
+    'status_code': '{value}',
+    'user': '{user_id}',
+    'merchant': '{merchant_id}',
+    'merchant_lookup': '{lookup_id}',
+    'channel': '{channel_id}',
+}
+
+
+def endpoint_template(url):
+    """Path of url with ids replaced by placeholders, e.g.
+    '/payment_request/{tid}/outcome/' for
+    .../merchant/v1/payment_request/<tid>/outcome/?page=2
+
+    Paths alternate between collection names and ids. The /merchant/v1
+    prefix is dropped, other API prefixes are kept.
+    """
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    prefix = []
+    if 'v1' in segments:
+        i = segments.index('v1') + 1
+        prefix, segments = segments[:i], segments[i:]
+        if prefix == ['merchant', 'v1']:
+            prefix = []
+    for i in range(1, len(segments), 2):
+        segments[i] = _id_names.get(segments[i - 1], '{id}')
+    return '/' + ''.join(s + '/' for s in prefix + segments)
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+__all__ = ["HedgingPolicy"]
+
+
+class HedgingPolicy(object):
+    """Cuts the tail latency of reads by sending a second, identical GET
+    when the first one is slower than most recent GETs, and using whichever
+    response arrives first.
+
+    The delay before hedging is the given percentile of the latencies of
+    recent requests, clamped between min_delay and max_delay. Until enough
+    latencies are recorded, max_delay is used. The losing request cannot be
+    aborted mid-flight, its response is dropped when it arrives.
+
+    Arguments:
+        percentile:
+            Latency percentile after which the hedge is sent
+        min_delay, max_delay:
+            Bounds of the hedge delay in seconds
+        window:
+            Number of recent latencies the percentile is computed over
+        max_workers:
+            Threads available to run hedged requests on, requests beyond
+            that are sent without hedging
+
+    The threads are started on first use and stopped by close, which
+    MapiClient.close calls. A closed policy starts new threads when it is
+    used again, so it may be shared by clients closed at different times.
+    """
+    min_samples = 20
+
+    def __init__(self, percentile=95, min_delay=0.01, max_delay=1.0,
+                 window=200, max_workers=10):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        # requests sent on the caller's thread, as no worker was free to
+        # run the first attempt on
+        self.requests_unhedged = 0
+        # hedges that were due but not sent, as no worker was free
+        self.hedges_skipped = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor = None
+        # free workers of the executor
+        self._workers = threading.Semaphore(max_workers)
+
+    def delay(self):
+        """Seconds to wait for the first request before hedging"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.max_delay
+            latencies = sorted(self._latencies)
+        index = int(len(latencies) * self.percentile / 100.0)
+        delay = latencies[min(index, len(latencies) - 1)]
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def _timed(self, send):
+        start = time.time()
+        res = send()
+        with self._lock:
+            self._latencies.append(time.time() - start)
+        return res
+
+    def _run(self, send):
+        try:
+            return self._timed(send)
+        finally:
+            self._workers.release()
+
+    def _submit(self, send):
+        """Run send on a free worker, None if all workers are busy. Nothing
+        is ever queued, so an attempt starts as soon as it is submitted.
+        """
+        if not self._workers.acquire(False):
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers)
+            return self._executor.submit(self._run, send)
+
+    def send(self, send):
+        """Call send, and call it again if it has not returned after the
+        hedge delay. Returns the first response that is not a server error,
+        or the last failure if both fail.
+
+        Attempts only run on free workers. When all workers are busy the
+        request is sent on the caller's thread without a hedge, and when
+        the hedge is due but no worker is free it is skipped, so a busy
+        client does not add load.
+        """
+        with self._lock:
+            self.requests += 1
+        first = self._submit(send)
+        if first is None:
+            with self._lock:
+                self.requests_unhedged += 1
+            return self._timed(send)
+        done, pending = wait([first], timeout=self.delay())
+        if done:
+            return first.result()
+
+        hedge = self._submit(send)
+        if hedge is None:
+            with self._lock:
+                self.hedges_skipped += 1
+            return first.result()
+        with self._lock:
+            self.hedges_fired += 1
+        pending = set([first, hedge])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                failed = (future.exception() is not None or
+                          future.result().status >= 500)
+                if not failed:
+                    # the loser cannot be aborted once sent, its response
+                    # is dropped
+                    for loser in pending:
+                        loser.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+        # both failed, report the most recent failure
+        return future.result()
+
+    def stats(self):
+        """Counters of requests, hedges sent and hedges that won, and of
+        requests sent unhedged and hedges skipped because all workers were
+        busy
+        """
+        with self._lock:
+            return {'requests': self.requests,
+                    'hedges_fired': self.hedges_fired,
+                    'hedges_won': self.hedges_won,
+                    'requests_unhedged': self.requests_unhedged,
+                    'hedges_skipped': self.hedges_skipped}
+
+    def close(self):
+        """Stop the threads, attempts in flight still complete"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,287 @@
+"""Revalidating HTTP cache for GET requests.
+
+With an HttpCache, MapiClient keeps the responses to GET requests that
+carry an ETag or Last-Modified header, or a Cache-Control max-age. When
+the same url is requested again the response is served from the cache
+while it is fresh by max-age, and otherwise the request is sent with
+If-None-Match and If-Modified-Since, so that the API can answer 304 Not
+Modified without a body, after which the cached body is served.
+
+Entries are kept in a storage, MemoryStorage or DiskStorage, both bounded
+by the number of bytes held. A storage is any object with get(key),
+set(key, entry), delete(key), __len__ and a size attribute.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from mapi_response import MapiResponse
+
+__all__ = ["HttpCache", "MemoryStorage", "DiskStorage"]
+
+_Entry = namedtuple('_Entry', ['status', 'headers', 'content', 'etag',
+                               'last_modified', 'expires'])
+
+
+def _entry_size(entry):
+    return len(entry.content or '') + sum(
+        len(key) + len(value) for key, value in entry.headers.items())
+
+
+def _cache_control(value):
+    """Cache-Control directives as a dict of name to argument"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def _expires(headers, now):
+    """Time until which a response is fresh, None to always revalidate"""
+    directives = _cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return None
+    try:
+        max_age = int(directives.get('max-age', ''))
+    except ValueError:
+        return None
+    return now + max_age if max_age > 0 else None
+
+
+class MemoryStorage(object):
+    """Keeps entries in memory, evicting the least recently used once they
+    hold more than max_bytes of headers and content.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            # reinsert to mark as most recently used
+            self._data[key] = item
+            return item[0]
+
+    def set(self, key, entry):
+        size = _entry_size(entry)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._data[key] = (entry, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                old_key, (old_entry, old_size) = self._data.popitem(
+                    last=False)
+                self.size -= old_size
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
+
+
+class DiskStorage(object):
+    """Keeps entries as files in directory, one per url, so that they
+    survive restarts. Each file holds a line of JSON with the status,
+    headers and validators, followed by the content. Once the files take
+    more than max_bytes, the least recently used are removed.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # file name to size of the entries already in the directory
+        self._sizes = {}
+        for name in os.listdir(directory):
+            if name.endswith('.entry'):
+                self._sizes[name] = os.path.getsize(
+                    os.path.join(directory, name))
+        self.size = sum(self._sizes.itervalues())
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _name(self, key):
+        return hashlib.sha1(json.dumps(key)).hexdigest() + '.entry'
+
+    def get(self, key):
+        path = os.path.join(self.directory, self._name(key))
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                content = f.read()
+            # the access time is not updated on every file system
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get('key') != \
+                json.loads(json.dumps(key)):
+            return None
+        try:
+            return _Entry(header['status'], header['headers'], content,
+                          header['etag'], header['last_modified'],
+                          header['expires'])
+        except KeyError:
+            return None
+
+    def set(self, key, entry):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        # a line of JSON describing the entry, followed by the content, so
+        # that reading an entry never runs code from the file
+        header = {'key': key, 'status': entry.status,
+                  'headers': entry.headers, 'etag': entry.etag,
+                  'last_modified': entry.last_modified,
+                  'expires': entry.expires}
+        data = json.dumps(header) + '\n' + (entry.content or '')
+        if len(data) > self.max_bytes:
+            self.delete(key)
+            return
+        temporary = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                      threading.current_thread().ident)
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temporary, path)
+            self.size += len(data) - self._sizes.get(name, 0)
+            self._sizes[name] = len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        name = self._name(key)
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        self.size -= self._sizes.pop(name, 0)
+
+    def _evict(self):
+        def last_used(name):
+            try:
+                return os.path.getmtime(os.path.join(self.directory, name))
+            except OSError:
+                return 0
+        for name in sorted(self._sizes, key=last_used):
+            if self.size <= self.max_bytes:
+                break
+            self._remove(name)
+            self.evictions += 1
+
+
+class HttpCache(object):
+    """Revalidating cache of GET responses, see the module documentation.
+    Only responses with status 200 are stored, and none with
+    Cache-Control no-store.
+
+    Arguments:
+        storage:
+            Where entries are kept, by default a MemoryStorage
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        # served from the cache without a request
+        self.hits = 0
+        # answered with 304 and served from the cache
+        self.revalidated = 0
+        # answered with a full response
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def send(self, key, headers, send):
+        """Return the response for key, calling send with the request
+        headers, including any conditional headers, when the cache cannot
+        answer by itself.
+        """
+        entry = self.storage.get(key)
+        now = time.time()
+        if entry is not None:
+            if entry.expires is not None and entry.expires > now:
+                self._count('hits')
+                return self._response(entry)
+            headers = dict(headers or {})
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                headers['If-Modified-Since'] = entry.last_modified
+        res = send(headers)
+
+        if res.status == 304 and entry is not None:
+            self._count('revalidated')
+            etag = res.headers.get('ETag', entry.etag)
+            last_modified = res.headers.get('Last-Modified',
+                                            entry.last_modified)
+            entry = entry._replace(etag=etag, last_modified=last_modified,
+                                   expires=_expires(res.headers, now))
+            self.storage.set(key, entry)
+            return self._response(entry)
+
+        self._count('misses')
+        if res.status == 200:
+            self._store(key, res, now)
+        elif entry is not None and res.status // 100 == 4:
+            self.storage.delete(key)
+        return res
+
+    def _store(self, key, res, now):
+        headers = res.headers
+        if 'no-store' in _cache_control(headers.get('Cache-Control')):
+            return
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        expires = _expires(headers, now)
+        if etag is None and last_modified is None and expires is None:
+            return
+        self.storage.set(key, _Entry(res.status, dict(headers.items()),
+                                     res.content, etag, last_modified,
+                                     expires))
+
+    def _response(self, entry):
+        return MapiResponse(entry.status, entry.headers, entry.content)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        """Hit, revalidation and miss counters, and the number of entries
+        and bytes held by the storage
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'revalidated': self.revalidated,
+                    'misses': self.misses,
+                    'entries': len(self.storage),
+                    'size': self.storage.size}
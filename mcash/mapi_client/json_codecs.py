@@ -0,0 +1,112 @@
+"""JSON codecs used by MapiClient to encode request bodies and by
+MapiResponse to decode responses.
+
+A codec is any object with dumps(obj), returning the encoded body as a
+byte string, and loads(s). The bytes returned by dumps are the ones that
+are signed and sent, so a codec only needs to produce valid compact JSON,
+not the same bytes as the standard library.
+"""
+import json
+import re
+
+__all__ = ["StdlibJsonCodec", "UjsonCodec", "SimplejsonCodec",
+           "get_json_codec", "available_json_codecs"]
+
+# 20 digits in a row, possibly an integer beyond 64 bits, which ujson does
+# not always reject but may decode to a wrong number
+_long_digits = re.compile(r'\d{20}')
+
+
+class StdlibJsonCodec(object):
+    """The json module of the standard library, always available"""
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, s):
+        return json.loads(s)
+
+
+class UjsonCodec(object):
+    """Decodes with ujson, three to four times faster than the standard
+    library. Bodies with 20 digits or more in a row, which may hold an
+    integer above 64 bits that ujson would silently decode to a wrong
+    number, are decoded with the standard library, as are bodies ujson
+    fails on.
+
+    Bodies are encoded with the standard library, which encodes the byte
+    strings that make up most request bodies faster than ujson does, see
+    benchmarks/json_benchmark.py.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, s):
+        if _long_digits.search(s) is not None:
+            return json.loads(s)
+        try:
+            return self._ujson.loads(s, precise_float=True)
+        except (OverflowError, ValueError):
+            # json raises the error with a useful message if s is invalid
+            return json.loads(s)
+
+
+class SimplejsonCodec(object):
+    """simplejson with its C speedups. Unlike the standard library it
+    decodes ASCII strings to str instead of unicode, so it is never chosen
+    automatically.
+    """
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson
+        self._simplejson = simplejson
+
+    def dumps(self, obj):
+        return self._simplejson.dumps(obj, separators=(',', ':'))
+
+    def loads(self, s):
+        return self._simplejson.loads(s)
+
+
+# Fastest first
+_codecs = [UjsonCodec, SimplejsonCodec, StdlibJsonCodec]
+# Codecs that decode to the same types as the standard library
+_automatic = [UjsonCodec, StdlibJsonCodec]
+
+
+def available_json_codecs():
+    """Names of the codecs that can be imported"""
+    names = []
+    for codec_class in _codecs:
+        try:
+            codec_class()
+        except ImportError:
+            continue
+        names.append(codec_class.name)
+    return names
+
+
+def get_json_codec(name=None):
+    """Return the named codec, or the fastest installed codec that decodes
+    to the same types as the standard library.
+    """
+    if name is not None:
+        for codec_class in _codecs:
+            if codec_class.name == name:
+                return codec_class()
+        raise ValueError("unknown JSON codec " + name)
+
+    for codec_class in _automatic[:-1]:
+        try:
+            return codec_class()
+        except ImportError:
+            pass
+    return _automatic[-1]()
@@ -1,13 +1,20 @@
-import json
+import Queue
+import threading
+import time
 from auth import OpenAuth
-from validation import validate_input
+from validation import validate_input, VALIDATION_MODES
 import logging
 from mapi_response import MapiResponse
 from backends.requestsframework import RequestsFramework
 from mapi_error import MapiError
-
-from poster.encode import multipart_encode
-from poster.encode import MultipartParam
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multipart import encode_attachment
+from outcomes import OutcomeWaiter
+from endpoints import endpoint_template
+from timing import RequestTiming, TimedAuth, take_validation
+from json_codecs import get_json_codec
+from models import (Settlement, PaymentRequest, PaymentRequestOutcome,
+                    Shortlink, Pos)
 
 
 __all__ = ["MapiClient"]
@@ -26,7 +33,21 @@ class MapiClient(object):
                  mcash_user=None,
                  mcash_integrator=None,
                  additional_headers=None,
-                 logger=None
+                 logger=None,
+                 backend=None,
+                 depagination_prefetch=1,
+                 response_cache=None,
+                 validation='full',
+                 retry_policy=None,
+                 hedging_policy=None,
+                 rate_limiter=None,
+                 request_coalescer=None,
+                 outcome_waiter=None,
+                 metrics=None,
+                 timing_hook=None,
+                 json_codec=None,
+                 typed_results=False,
+                 http_cache=None
                  ):
         """
         TODO: we need some explanations of the arguments here
@@ -34,7 +55,7 @@ class MapiClient(object):
         if additional_headers is None:
             additional_headers = {}
 
-        self.backend = RequestsFramework()
+        self.backend = backend or RequestsFramework()
         self.auth = auth
         self.logger = logger or logging.getLogger(__name__)
         base_url = base_url.replace('/merchant/v1', '')
@@ -48,6 +69,61 @@ class MapiClient(object):
         self.mcash_integrator = mcash_integrator
         self.default_headers = self._default_headers.copy()
         self.default_headers.update(additional_headers)
+        # number of pages list endpoints fetch ahead of the caller
+        self.depagination_prefetch = depagination_prefetch
+        # optional ResponseCache for endpoints that rarely change
+        self.response_cache = response_cache
+        if validation not in VALIDATION_MODES:
+            raise ValueError("validation should be one of " +
+                             ", ".join(VALIDATION_MODES))
+        # how thoroughly arguments are validated, see validation.py
+        self.validation = validation
+        # optional RetryPolicy for failed requests that are safe to repeat
+        self.retry_policy = retry_policy
+        # optional HedgingPolicy for GETs
+        self.hedging_policy = hedging_policy
+        # optional RateLimiter applied to every request sent
+        self.rate_limiter = rate_limiter
+        # optional RequestCoalescer sharing identical GETs in flight
+        self.request_coalescer = request_coalescer
+        # OutcomeWaiter behind wait_for_outcome, created on first use if
+        # not given
+        self.outcome_waiter = outcome_waiter
+        self._owns_outcome_waiter = False
+        self._outcome_waiter_lock = threading.Lock()
+        # optional MetricsSink told about every request sent
+        self.metrics = metrics
+        # optional callable given a RequestTiming for every request made
+        # through do_req
+        self.timing_hook = timing_hook
+        # encodes request bodies and decodes responses, see json_codecs.py.
+        # A codec name or object, by default the fastest installed.
+        if json_codec is None or isinstance(json_codec, basestring):
+            json_codec = get_json_codec(json_codec)
+        self.json_codec = json_codec
+        # return compact models instead of dicts from the getters of
+        # settlements, payment requests, shortlinks and POSes, see models.py
+        self.typed_results = typed_results
+        # optional HttpCache revalidating GETs with ETag and Last-Modified
+        self.http_cache = http_cache
+
+    def close(self):
+        """Release the connections held by the backend, and the threads of
+        the hedging policy
+        """
+        if self._owns_outcome_waiter:
+            self.outcome_waiter.close()
+        if self.hedging_policy is not None:
+            self.hedging_policy.close()
+        close = getattr(self.backend, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def get_headers(self, headers=None):
         if not headers:
@@ -65,38 +141,306 @@ class MapiClient(object):
         h.update(headers)
         return h
 
-    def do_req(self, method, url, body=None, headers=None, status=None):
+    def do_req(self, method, url, body=None, headers=None, status=None,
+               idempotent=None):
         """Used internally to send a request to the API, left public
         so it can be used to talk to the API more directly.
+
+        When the client has a retry_policy, requests failing with a
+        connection error or a retryable status are retried if idempotent is
+        true. By default GET, PUT and DELETE requests are idempotent.
+        Idempotent GETs are hedged when the client has a hedging_policy.
+        GETs without extra headers are coalesced when the client has a
+        request_coalescer, concurrent callers then get the same response.
         """
-        if body is None:
-            body = ''
+        if (self.request_coalescer is not None and not headers and
+                method.upper() == 'GET' and idempotent is not False):
+            # the expected status is part of the key, as the leader's
+            # response is checked against it for every caller
+            return self.request_coalescer.do(
+                ('GET',) + self._identity() + (url, status),
+                lambda: self._do_shared_req(method, url, body, status,
+                                            idempotent))
+        return self._do_req(method, url, body, headers, status, idempotent)
+
+    def _identity(self):
+        """Merchant and user or integrator of the requests. Responses
+        differ per identity, so shared caches and coalescers key on it.
+        """
+        return (self.mcash_merchant, self.mcash_user or self.mcash_integrator)
+
+    def _do_shared_req(self, method, url, body, status, idempotent):
+        res = self._do_req(method, url, body, None, status, idempotent)
+        # decode before the response is handed out, so that all callers
+        # share one parsed copy instead of racing to decode it
+        try:
+            res.json()
+        except ValueError:
+            pass
+        return res
+
+    def _do_req(self, method, url, body, headers, status, idempotent):
+        timing = None
+        if self.timing_hook is not None:
+            timing = RequestTiming(method, url)
+            validation = take_validation()
+            if validation is not None:
+                timing.add('validate', validation)
+            start = time.time()
+            body = self._encode_body(body)
+            timing.add('serialize', time.time() - start)
         else:
-            body = json.dumps(body)
+            body = self._encode_body(body)
+        if idempotent is None:
+            idempotent = method.upper() in ('GET', 'HEAD', 'PUT', 'DELETE')
+        if self.retry_policy is not None:
+            self.retry_policy.request_started()
+        retryable_errors = getattr(self.backend, 'retryable_errors', ())
+        hedge = (self.hedging_policy is not None and idempotent and
+                 method.upper() == 'GET')
+
+        attempt = 1
+        while True:
+            try:
+                if hedge:
+                    res = self._hedged_send(method, url, body, headers,
+                                            timing)
+                else:
+                    res = self._send(method, url, body, headers,
+                                     timing=timing)
+            except retryable_errors:
+                if not self._should_retry(attempt, idempotent):
+                    raise
+            else:
+                if status is None:
+                    if res.status // 100 == 2:
+                        break
+                elif res.status == status:
+                    break
+                if not self._should_retry(attempt, idempotent, res):
+                    error = MapiError(*res)
+                    if timing is not None:
+                        self._report_timing(timing, error, attempt)
+                    raise error
+            attempt += 1
+
+        if timing is not None:
+            self._report_timing(timing, res, attempt)
+        return res
+
+    def _hedged_send(self, method, url, body, headers, timing):
+        """Send through the hedging policy. Each attempt is timed on its
+        own, and only the phases of the attempt whose response is used are
+        added to timing.
+        """
+        if timing is None:
+            return self.hedging_policy.send(
+                lambda: self._send(method, url, body, headers))
+        attempts = {}
+
+        def send():
+            attempt = RequestTiming(method, url)
+            res = self._send(method, url, body, headers, timing=attempt)
+            attempts[id(res)] = attempt
+            return res
+        res = self.hedging_policy.send(send)
+        timing.merge(attempts[id(res)])
+        return res
+
+    def _report_timing(self, timing, res, attempts):
+        # decode here so the decode phase is included, the decoded content
+        # is kept by the response for the caller
+        start = time.time()
+        try:
+            res.json()
+        except ValueError:
+            pass
+        else:
+            timing.add('decode', time.time() - start)
+        timing.status = res.status
+        timing.attempts = attempts
+        res.timing = timing
+        self.timing_hook(timing)
+
+    def _send(self, method, url, body, headers, auth=None, timing=None):
+        if (self.http_cache is None or auth is not None or
+                method.upper() != 'GET'):
+            return self._send_request(method, url, body, headers, auth,
+                                      timing)
+        key = self._identity() + (url,)
+        res = self.http_cache.send(
+            key, headers,
+            lambda headers: self._send_request(method, url, body, headers,
+                                               auth, timing))
+        res.json_codec = self.json_codec
+        return res
+
+    def _send_request(self, method, url, body, headers, auth=None,
+                      timing=None):
+        if self.rate_limiter is None and self.metrics is None:
+            return self._dispatch(method, url, body, headers, auth, timing)
+        token = None
+        if self.rate_limiter is not None:
+            token = self.rate_limiter.acquire(url)
+        if self.metrics is not None:
+            endpoint = endpoint_template(url)
+            self.metrics.request_started(method, endpoint)
+        start = time.time()
+        res = None
+        try:
+            res = self._dispatch(method, url, body, headers, auth, timing)
+            return res
+        finally:
+            latency = time.time() - start
+            status = None if res is None else res.status
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(token, latency, status)
+            if self.metrics is not None:
+                self.metrics.request_finished(
+                    method, endpoint, status, latency,
+                    len(body) if body else 0,
+                    len(res.content or '') if res is not None else 0)
+
+    def _dispatch(self, method, url, body, headers, auth=None, timing=None):
+        """Send one request. Without auth, the client's auth is used and
+        the default headers are added to headers.
+        """
+        if auth is None:
+            # Headers are built for every attempt, so that auth signs each
+            # one with a fresh timestamp
+            headers = self.get_headers(headers)
+            auth = self.auth
+        if timing is not None:
+            return self._timed_dispatch(method, url, body, headers, auth,
+                                        timing)
         res = self.backend.dispatch_request(method=method,
                                             url=url,
                                             body=body,
-                                            headers=self.get_headers(headers),
-                                            auth=self.auth)
+                                            headers=headers,
+                                            auth=auth)
         if not isinstance(res, MapiResponse):
             res = MapiResponse(*res)
-        if status is None:
-            if res.status // 100 != 2:
-                raise MapiError(*res)
-        elif res.status != status:
-            raise MapiError(*res)
+        res.json_codec = self.json_codec
+        return res
 
+    def _timed_dispatch(self, method, url, body, headers, auth, timing):
+        kwargs = {}
+        if getattr(self.backend, 'records_timing', False):
+            kwargs['timing'] = timing
+        auth = TimedAuth(auth, timing)
+        start = time.time()
+        res = self.backend.dispatch_request(method=method,
+                                            url=url,
+                                            body=body,
+                                            headers=headers,
+                                            auth=auth,
+                                            **kwargs)
+        if not kwargs:
+            # the round trip of backends that do not time it themselves
+            # counts as server wait
+            timing.add('server_wait', time.time() - start - auth.seconds)
+        if not isinstance(res, MapiResponse):
+            res = MapiResponse(*res)
+        res.json_codec = self.json_codec
         return res
 
-    def _depagination_generator(self, url):
-        data = self.do_req('GET', url).json()
-        yield data['uris']
+    def _should_retry(self, attempt, idempotent, res=None):
+        """Decide whether to retry after a failed attempt, and wait for the
+        backoff delay if so. res is None for connection errors.
+        """
+        if self.retry_policy is None:
+            return False
+        status = None if res is None else res.status
+        if not self.retry_policy.should_retry(attempt, idempotent, status):
+            return False
+        retry_after = None if res is None else res.headers.get('Retry-After')
+        delay = self.retry_policy.delay(attempt, retry_after)
+        self.logger.info("Retrying failed request (attempt %d, status %s) "
+                         "in %.2f seconds", attempt, status, delay)
+        time.sleep(delay)
+        return True
+
+    def _encode_body(self, body):
+        """Serialize body to the bytes that are both signed and sent, so it
+        is encoded once and the backends pass it on untouched.
+        """
+        if body is None:
+            return ''
+        return self.json_codec.dumps(body)
 
-        next_link = data.pop('next')
+    def _result(self, model, res):
+        """The decoded content of res, as a model if typed_results is set.
+        The model takes the decoded values over without copying them.
+        """
+        data = res.json()
+        if self.typed_results and isinstance(data, dict):
+            return model.from_dict(data)
+        return data
+
+    def _depagination_generator(self, url, prefetch=None):
+        """Returns a generator yielding the 'uris' of each page of the list
+        at url, following the 'next' links. With prefetch above 0, a
+        background thread keeps up to that many following pages in flight
+        while the caller processes the current one.
+        """
+        if prefetch is None:
+            prefetch = self.depagination_prefetch
+        if prefetch > 0:
+            return self._prefetching_page_generator(url, prefetch)
+        return self._page_generator(url)
+
+    def _page_generator(self, url):
+        next_link = url
         while next_link is not None:
-            data = self.do_req('GET', next_link).json()
-            next_link = data.pop('next')
-            yield data['uris']
+            uris, next_link = self._get_page(next_link)
+            yield uris
+
+    def _get_page(self, url):
+        """Returns the uris and next link of a page. Nothing else of the
+        page is kept, the response is dropped when this returns.
+        """
+        # the parsed data may be shared by coalesced requests, so it is only
+        # read, never modified
+        data = self.do_req('GET', url).json()
+        return data['uris'], data.get('next')
+
+    def _prefetching_page_generator(self, url, prefetch):
+        end = object()
+        pages = Queue.Queue()
+        # one slot for the page held by the caller, the rest is lookahead
+        slots = threading.Semaphore(prefetch + 1)
+        stop = threading.Event()
+
+        def fetch_pages():
+            page_generator = self._page_generator(url)
+            try:
+                while True:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    uris = next(page_generator, end)
+                    pages.put((uris, None))
+                    if uris is end:
+                        return
+            except Exception as e:
+                pages.put((None, e))
+
+        fetcher = threading.Thread(target=fetch_pages)
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            while True:
+                uris, error = pages.get()
+                if error is not None:
+                    raise error
+                if uris is end:
+                    return
+                yield uris
+                slots.release()
+        finally:
+            # stops the fetcher if the caller stops iterating early
+            stop.set()
+            slots.release()
 
     def _depaginate_all(self, url):
         """GETs the url provided and traverses the 'next' url that's
@@ -108,6 +452,31 @@ class MapiClient(object):
             items += x
         return items
 
+    def _cached(self, endpoint, key, fetch):
+        if self.response_cache is None:
+            return fetch()
+        return self.response_cache.get_or_fetch(endpoint, key, fetch)
+
+    def _iter_items(self, url):
+        """GETs the url provided and yields the items one at a time while
+        traversing the 'next' urls. Only the pages being consumed and
+        prefetched are held in memory.
+        """
+        pages = self._depagination_generator(url)
+        try:
+            for uris in pages:
+                for uri in uris:
+                    yield uri
+        finally:
+            pages.close()
+
+    def _count_items(self, url):
+        """Counts the items in a paginated list without keeping them"""
+        count = 0
+        for uris in self._depagination_generator(url):
+            count += len(uris)
+        return count
+
     def get_merchant(self, merchant_id):
         """Endpoint for retrieving info about merchants
 
@@ -121,9 +490,9 @@ class MapiClient(object):
             merchant_id:
                 Merchant id assigned by mCASH
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/merchant/' +
-                           merchant_id + '/').json()
+        url = self.merchant_api_base_url + '/merchant/' + merchant_id + '/'
+        return self._cached('get_merchant', merchant_id,
+                            lambda: self.do_req('GET', url).json())
 
     def get_merchant_lookup(self, lookup_id):
         """Perform a Merchant Lookup.
@@ -131,9 +500,10 @@ class MapiClient(object):
         Handle merchant lookup on secondary ID. This is endpoint can only be
         used by integrators.
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/merchant_lookup/' +
-                           lookup_id + '/').json()
+        url = (self.merchant_api_base_url + '/merchant_lookup/' +
+               lookup_id + '/')
+        return self._cached('get_merchant_lookup', lookup_id,
+                            lambda: self.do_req('GET', url).json())
 
     @validate_input
     def create_user(self, user_id,
@@ -225,6 +595,17 @@ class MapiClient(object):
         """
         return self._depaginate_all(self.merchant_api_base_url + '/pos/')
 
+    def iter_pos(self):
+        """Iterate over all Point of Sales for merchant, fetching pages as
+        needed
+        """
+        return self._iter_items(self.merchant_api_base_url + '/pos/')
+
+    def count_pos(self):
+        """Count the Point of Sales for merchant
+        """
+        return self._count_items(self.merchant_api_base_url + '/pos/')
+
     @validate_input
     def update_pos(self, pos_id, name, pos_type, location=None):
         """Update POS resource. Returns the raw response object.
@@ -265,9 +646,8 @@ class MapiClient(object):
             pos_id:
                 POS id as chosen on registration
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/pos/' +
-                           pos_id + '/').json()
+        return self._result(Pos, self.do_req(
+            'GET', self.merchant_api_base_url + '/pos/' + pos_id + '/'))
 
     @validate_input
     def create_payment_request(self, customer, currency, amount, allow_credit,
@@ -361,8 +741,9 @@ class MapiClient(object):
         if line_items:
             arguments['line_items'] = line_items
 
+        # Idempotent on pos_id and pos_tid
         return self.do_req('POST', self.merchant_api_base_url + '/payment_request/',
-                           arguments).json()
+                           arguments, idempotent=True).json()
 
     @validate_input
     def update_payment_request(self, tid, currency=None, amount=None,
@@ -441,9 +822,111 @@ class MapiClient(object):
 
 
         arguments = {k: v for k, v in arguments.items() if v is not None}
+        # Captures are idempotent on capture_id and amount, a refund is only
+        # safe to repeat when it has a refund_id
+        idempotent = (action or '').lower() != 'refund' or refund_id is not None
         return self.do_req('PUT',
                            self.merchant_api_base_url + '/payment_request/' +
-                           tid + '/', arguments)
+                           tid + '/', arguments, idempotent=idempotent)
+
+    def batch_create_payment_requests(self, payment_requests, max_workers=10,
+                                      stream=False):
+        """Post many payment requests concurrently
+
+        Each item is a dict of arguments to create_payment_request. Since
+        payment requests are idempotent on pos_id and pos_tid, a batch that
+        failed halfway can safely be posted again as a whole.
+
+        Returns a list with the result of each item, or the exception it
+        failed with, in input order: a MapiError, the validation error of
+        an invalid item, or the connection error of the backend. One
+        failing item never hides the results of the others. With stream
+        set, returns a generator yielding (index, result or exception) as
+        each item completes.
+
+        Arguments:
+            payment_requests:
+                List of dicts of create_payment_request arguments
+            max_workers:
+                Maximum number of requests in flight at the same time
+            stream:
+                Yield results as they complete instead of returning a list
+        """
+        return self._batch(self.create_payment_request, payment_requests,
+                           max_workers, stream)
+
+    def batch_update_payment_requests(self, updates, max_workers=10,
+                                      stream=False):
+        """Update, capture, release, abort or refund many payment requests
+        concurrently
+
+        Each item is a dict of arguments to update_payment_request, including
+        the tid. Partial captures must have a capture_id and partial refunds
+        a refund_id, so that the batch can safely be sent again after a
+        failure without capturing or refunding anything twice. An item
+        without one is not sent, and fails with a ValueError.
+
+        Returns a list with the result of each item, or the exception it
+        failed with, in input order: a MapiError, the validation error of
+        an invalid item, or the connection error of the backend. One
+        failing item never hides the results of the others. With stream
+        set, returns a generator yielding (index, result or exception) as
+        each item completes.
+
+        Arguments:
+            updates:
+                List of dicts of update_payment_request arguments
+            max_workers:
+                Maximum number of requests in flight at the same time
+            stream:
+                Yield results as they complete instead of returning a list
+        """
+        return self._batch(self._batch_update_payment_request, updates,
+                           max_workers, stream)
+
+    def _batch_update_payment_request(self, **update):
+        """update_payment_request, refusing partial captures and refunds
+        that could not safely be sent twice
+        """
+        action = (update.get('action') or '').lower()
+        if update.get('amount') is not None:
+            if action == 'capture' and update.get('capture_id') is None:
+                raise ValueError("capture_id must be set when capturing "
+                                 "an amount in a batch (tid %s)" %
+                                 update.get('tid'))
+            if action == 'refund' and update.get('refund_id') is None:
+                raise ValueError("refund_id must be set when refunding "
+                                 "an amount in a batch (tid %s)" %
+                                 update.get('tid'))
+        return self.update_payment_request(**update)
+
+    def _batch(self, method, items, max_workers, stream):
+        """Call method with each dict of kwargs in items on a bounded thread
+        pool. Exceptions are returned in place of the result, the other
+        items were sent and their results must reach the caller.
+        """
+        def call(kwargs):
+            try:
+                return method(**kwargs)
+            except Exception as e:
+                return e
+
+        executor = ThreadPoolExecutor(max_workers)
+        futures = [executor.submit(call, item) for item in items]
+        executor.shutdown(wait=False)
+        if stream:
+            return self._iter_completed(futures)
+        return [f.result() for f in futures]
+
+    def _iter_completed(self, futures):
+        index = dict((f, i) for i, f in enumerate(futures))
+        try:
+            for f in as_completed(futures):
+                yield index[f], f.result()
+        finally:
+            # Don't send what is still queued if the caller stops early
+            for f in futures:
+                f.cancel()
 
     def get_payment_request(self, tid):
         """Retrieve payment request info
@@ -452,9 +935,9 @@ class MapiClient(object):
             tid:
                 Transaction id assigned by mCASH
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/payment_request/' +
-                           tid + '/').json()
+        return self._result(PaymentRequest, self.do_req(
+            'GET', self.merchant_api_base_url + '/payment_request/' +
+            tid + '/'))
 
     def get_payment_request_outcome(self, tid):
         """Retrieve payment request outcome
@@ -463,9 +946,38 @@ class MapiClient(object):
             tid:
                 Transaction id assigned by mCASH
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/payment_request/' +
-                           tid + '/outcome/').json()
+        return self._result(PaymentRequestOutcome, self.do_req(
+            'GET', self.merchant_api_base_url + '/payment_request/' +
+            tid + '/outcome/'))
+
+    def wait_for_outcome(self, tid, timeout=None, expires_in=None):
+        """Wait for a payment request to get a final status. Returns a
+        concurrent.futures.Future of the outcome.
+
+        All waits of the client are polled by one OutcomeWaiter, which
+        backs off as waits get older, so waiting for thousands of payment
+        requests at once is cheap.
+
+        Arguments:
+            tid:
+                Transaction id assigned by mCASH
+            timeout:
+                Seconds after which the future raises
+                concurrent.futures.TimeoutError, None to wait until final
+            expires_in:
+                Seconds until the payment request expires, if known
+        """
+        return self._get_outcome_waiter().wait(
+            ('payment_request', tid),
+            lambda: self.get_payment_request_outcome(tid),
+            timeout=timeout, expires_in=expires_in)
+
+    def _get_outcome_waiter(self):
+        with self._outcome_waiter_lock:
+            if self.outcome_waiter is None:
+                self.outcome_waiter = OutcomeWaiter(logger=self.logger)
+                self._owns_outcome_waiter = True
+            return self.outcome_waiter
 
     def post_chat_message(self, merchant_id, channel_id, message):
         """post a chat message
@@ -530,6 +1042,16 @@ class MapiClient(object):
         """
         return self._depaginate_all(self.merchant_api_base_url + '/shortlink/')
 
+    def iter_shortlinks(self):
+        """Iterate over shortlink registrations, fetching pages as needed
+        """
+        return self._iter_items(self.merchant_api_base_url + '/shortlink/')
+
+    def count_shortlinks(self):
+        """Count shortlink registrations
+        """
+        return self._count_items(self.merchant_api_base_url + '/shortlink/')
+
     @validate_input
     def update_shortlink(self, shortlink_id, callback_uri=None):
         """Update existing shortlink registration
@@ -564,7 +1086,8 @@ class MapiClient(object):
         if "://" not in shortlink_id_or_url:
             shortlink_id_or_url = self.merchant_api_base_url + '/shortlink/' + shortlink_id_or_url + '/'
 
-        return self.do_req('GET', shortlink_id_or_url).json()
+        return self._result(Shortlink,
+                            self.do_req('GET', shortlink_id_or_url))
 
     def get_last_settlement(self):
         """This endpoint redirects to the last Settlement
@@ -574,13 +1097,24 @@ class MapiClient(object):
 
         Redirect latest Settlement
         """
-        return self.do_req('GET', self.merchant_api_base_url + '/last_settlement/').json()
+        return self._result(Settlement, self.do_req(
+            'GET', self.merchant_api_base_url + '/last_settlement/'))
 
     def get_all_settlements(self):
         """List settlements
         """
         return self._depaginate_all(self.merchant_api_base_url + '/settlement/')
 
+    def iter_settlements(self):
+        """Iterate over settlements, fetching pages as needed
+        """
+        return self._iter_items(self.merchant_api_base_url + '/settlement/')
+
+    def count_settlements(self):
+        """Count settlements
+        """
+        return self._count_items(self.merchant_api_base_url + '/settlement/')
+
     def get_settlement(self, settlement_id):
         """Retrieve information regarding one settlement. The settlement
         contains detailed information about the amount paid out in the
@@ -593,9 +1127,9 @@ class MapiClient(object):
             settlement_id:
                 The ID of the settlement to retrieve.
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/settlement/' +
-                           settlement_id + '/').json()
+        return self._result(Settlement, self.do_req(
+            'GET', self.merchant_api_base_url + '/settlement/' +
+            settlement_id + '/'))
 
     @validate_input
     def create_permission_request(self, customer, pos_id, pos_tid, scope,
@@ -613,9 +1147,10 @@ class MapiClient(object):
                      'text': text,
                      'callback_uri': callback_uri,
                      'expires_in': expires_in}
+        # Idempotent on pos_id and pos_tid
         return self.do_req('POST',
                            self.merchant_api_base_url + '/permission_request/',
-                           arguments).json()
+                           arguments, idempotent=True).json()
 
     def get_permission_request(self, rid):
         """See permission request info
@@ -639,39 +1174,61 @@ class MapiClient(object):
                            self.merchant_api_base_url + '/permission_request/' +
                            rid + '/outcome/').json()
 
+    def wait_for_permission_outcome(self, rid, timeout=None,
+                                    expires_in=None):
+        """Wait for a permission request to get a final status. Returns a
+        concurrent.futures.Future of the outcome, see wait_for_outcome.
+
+        Arguments:
+            rid:
+                Permission request id assigned my mCASH
+        """
+        return self._get_outcome_waiter().wait(
+            ('permission_request', rid),
+            lambda: self.get_permission_request_outcome(rid),
+            timeout=timeout, expires_in=expires_in)
+
     def get_all_status_codes(self):
         """Get all status codes
         """
-        return self._depaginate_all(self.merchant_api_base_url + '/status_code/')
+        url = self.merchant_api_base_url + '/status_code/'
+        return self._cached('get_all_status_codes', None,
+                            lambda: self._depaginate_all(url))
+
+    def iter_status_codes(self):
+        """Iterate over all status codes, fetching pages as needed
+        """
+        return self._iter_items(self.merchant_api_base_url + '/status_code/')
+
+    def count_status_codes(self):
+        """Count status codes
+        """
+        return self._count_items(self.merchant_api_base_url + '/status_code/')
 
     def get_status_code(self, value):
         """Get status code
         """
-        return self.do_req('GET',
-                           self.merchant_api_base_url + '/status_code/' +
-                           value + '/').json()
+        url = self.merchant_api_base_url + '/status_code/' + value + '/'
+        return self._cached('get_status_code', value,
+                            lambda: self.do_req('GET', url).json())
 
     def upload_receipt(self, url, data):
         """Upload a receipt to the give url
 
         :param url:
-        :param data:
+        :param data: a string or a file-like object
         :return:
         """
         return self.upload_attachment(url=url, data=data, mime_type='application/vnd.mcash.receipt.v1+json')
 
-    def upload_attachment(self, url, mime_type, data):
-        data, headers = multipart_encode([MultipartParam('file', value=data, filename='filename', filetype=mime_type)])
-        data = "".join(data)
-
-        res = self.backend.dispatch_request(method='POST',
-                                            url=url,
-                                            body=data,
-                                            headers=headers,
-                                            auth=OpenAuth())
+    def upload_attachment(self, url, mime_type, data, length=None):
+        """Upload an attachment to the given url. A file-like data is read and
+        sent in chunks, so it is not loaded into memory as a whole. Its
+        size is found by seeking, pass length for streams that cannot seek.
+        """
+        data, headers = encode_attachment(data, mime_type, length=length)
 
-        if not isinstance(res, MapiResponse):
-            res = MapiResponse(*res)
+        res = self._send('POST', url, data, headers, auth=OpenAuth())
 
         if res.status // 100 != 2:
             raise MapiError(*res)
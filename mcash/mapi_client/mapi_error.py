@@ -1,9 +1,18 @@
-from mapi_response import MapiResponse
+from mapi_response import ResponseBase, _not_decoded
 
 __all__ = ["MapiError"]
 
 
-class MapiError(MapiResponse, Exception):
+class MapiError(ResponseBase, Exception):
+    """Raised for responses with an unexpected status. Has the same
+    attributes and methods as MapiResponse.
+    """
+
     def __init__(self, status, headers, content):
-        MapiResponse.__init__(self, status, headers, content)
         Exception.__init__(self, status, headers, content)
+        self.status = status
+        self._headers = headers
+        self.content = content
+        self._json = _not_decoded
+        self._json_codec = None
+        self.timing = None
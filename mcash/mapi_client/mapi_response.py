@@ -1,18 +1,125 @@
-import json
+from json_codecs import get_json_codec
 
 __all__ = ['MapiResponse']
 
+_default_json_codec = get_json_codec()
+# marks content that has not been decoded yet, None is valid JSON
+_not_decoded = object()
 
-class MapiResponse(object):
-    def __init__(self, status, headers, content):
-        self.status = status
-        self.headers = headers
-        self.content = content
+
+class Headers(object):
+    """Read-only, case-insensitive view of the headers given by a backend.
+    The lowercased index is only built on the first lookup.
+    """
+    __slots__ = ('_headers', '_lower')
+
+    def __init__(self, headers):
+        self._headers = headers
+        self._lower = None
+
+    def _index(self):
+        if self._lower is None:
+            self._lower = dict((key.lower(), value)
+                               for key, value in self._headers.items())
+        return self._lower
+
+    def __getitem__(self, key):
+        return self._index()[key.lower()]
+
+    def get(self, key, default=None):
+        return self._index().get(key.lower(), default)
+
+    def __contains__(self, key):
+        return key.lower() in self._index()
+
+    def __iter__(self):
+        return iter(self._headers)
+
+    def __len__(self):
+        return len(self._headers)
+
+    def keys(self):
+        return list(self._headers)
+
+    def items(self):
+        return list(self._headers.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Headers):
+            other = other._index()
+        else:
+            other = dict((k.lower(), v) for k, v in other.items())
+        return self._index() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Headers(%r)' % (dict(self._headers),)
+
+
+class ResponseBase(object):
+    """Methods shared by MapiResponse and MapiError. Holds no state of its
+    own, so that MapiResponse can use __slots__ while MapiError also
+    derives from Exception.
+    """
+    __slots__ = ()
+
+    @property
+    def headers(self):
+        """Case-insensitive mapping of the response headers"""
+        headers = self._headers
+        if not isinstance(headers, Headers):
+            headers = self._headers = Headers(headers or {})
+        return headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = headers
+
+    @property
+    def json_codec(self):
+        return self._json_codec or _default_json_codec
+
+    @json_codec.setter
+    def json_codec(self, codec):
+        self._json_codec = codec
 
     def json(self):
-        return json.loads(self.content)
+        """The decoded content, decoded once and shared by later calls"""
+        if self._json is _not_decoded:
+            self._json = self.json_codec.loads(self.content)
+        return self._json
+
+    def drop_content(self):
+        """Decode the content, and let go of the raw bytes. Returns the
+        decoded content.
+        """
+        data = self.json()
+        self.content = None
+        return data
 
     def __iter__(self):
         yield self.status
-        yield self.headers
+        yield self._headers
         yield self.content
+
+
+class MapiResponse(ResponseBase):
+    """Status, headers and content of a response. Responses are compact,
+    they have no __dict__ and only decode the content and index the
+    headers when asked to.
+    """
+    __slots__ = ('status', '_headers', 'content', '_json', '_json_codec',
+                 'timing')
+
+    def __init__(self, status, headers, content):
+        self.status = status
+        self._headers = headers
+        self.content = content
+        self._json = _not_decoded
+        # codec decoding the content, MapiClient sets its own on the
+        # responses it returns
+        self._json_codec = None
+        # RequestTiming of the request, when the client has a timing_hook
+        self.timing = None
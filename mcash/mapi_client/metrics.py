@@ -0,0 +1,182 @@
+import bisect
+import threading
+
+__all__ = ["MetricsSink", "Metrics", "DEFAULT_BUCKETS"]
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class MetricsSink(object):
+    """Receives a call for every HTTP request the client sends. Subclass it
+    to forward the measurements to a metrics system of your choice.
+
+    endpoint is the path of the url with ids replaced by placeholders, such
+    as '/payment_request/{tid}/outcome/', see endpoints.endpoint_template.
+    """
+
+    def request_started(self, method, endpoint):
+        pass
+
+    def request_finished(self, method, endpoint, status, latency,
+                         request_bytes, response_bytes):
+        """status is None for requests that failed without a response,
+        latency is in seconds.
+        """
+        pass
+
+
+class _Histogram(object):
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class _EndpointMetrics(object):
+    def __init__(self):
+        self.in_flight = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = 0
+        # status to _Histogram
+        self.latencies = {}
+
+
+class Metrics(MetricsSink):
+    """Collects latency histograms per endpoint and status, byte counts,
+    errors and requests in flight in memory, and exports them in the
+    Prometheus text format.
+
+    A request is counted as an error if it failed without a response or
+    with a status of 400 or above.
+
+    Arguments:
+        buckets:
+            Upper bounds in seconds of the latency histogram buckets
+        prefix:
+            Prefix of the exported metric names
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='mapi_client'):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        # (method, endpoint) to _EndpointMetrics
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, method, endpoint):
+        key = (method, endpoint)
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            metrics = self._endpoints[key] = _EndpointMetrics()
+        return metrics
+
+    def request_started(self, method, endpoint):
+        with self._lock:
+            self._endpoint(method, endpoint).in_flight += 1
+
+    def request_finished(self, method, endpoint, status, latency,
+                         request_bytes, response_bytes):
+        label = 'error' if status is None else str(status)
+        with self._lock:
+            metrics = self._endpoint(method, endpoint)
+            metrics.in_flight -= 1
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            if status is None or status >= 400:
+                metrics.errors += 1
+            histogram = metrics.latencies.get(label)
+            if histogram is None:
+                histogram = metrics.latencies[label] = \
+                    _Histogram(self.buckets)
+            histogram.counts[bisect.bisect_left(self.buckets, latency)] += 1
+            histogram.sum += latency
+            histogram.count += 1
+
+    def stats(self):
+        """Dict of (method, endpoint) to requests, errors, error_rate,
+        in_flight, request_bytes, response_bytes and statuses, a dict of
+        status to number of requests
+        """
+        stats = {}
+        with self._lock:
+            for key, metrics in self._endpoints.items():
+                statuses = dict((status, h.count) for status, h
+                                in metrics.latencies.items())
+                requests = sum(statuses.values())
+                stats[key] = {
+                    'requests': requests,
+                    'errors': metrics.errors,
+                    'error_rate': (float(metrics.errors) / requests
+                                   if requests else 0.0),
+                    'in_flight': metrics.in_flight,
+                    'request_bytes': metrics.request_bytes,
+                    'response_bytes': metrics.response_bytes,
+                    'statuses': statuses}
+        return stats
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        p = self.prefix
+        duration = []
+        in_flight = []
+        request_bytes = []
+        response_bytes = []
+        errors = []
+        with self._lock:
+            for (method, endpoint), metrics in sorted(self._endpoints.items()):
+                labels = _labels(method=method, endpoint=endpoint)
+                in_flight.append('%s_requests_in_flight{%s} %d' %
+                                 (p, labels, metrics.in_flight))
+                request_bytes.append('%s_request_bytes_total{%s} %d' %
+                                     (p, labels, metrics.request_bytes))
+                response_bytes.append('%s_response_bytes_total{%s} %d' %
+                                      (p, labels, metrics.response_bytes))
+                errors.append('%s_request_errors_total{%s} %d' %
+                              (p, labels, metrics.errors))
+                for status, h in sorted(metrics.latencies.items()):
+                    labels = _labels(method=method, endpoint=endpoint,
+                                     status=status)
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, h.counts):
+                        cumulative += count
+                        duration.append(
+                            '%s_request_duration_seconds_bucket{%s,le="%r"} '
+                            '%d' % (p, labels, bound, cumulative))
+                    duration.append(
+                        '%s_request_duration_seconds_bucket{%s,le="+Inf"} '
+                        '%d' % (p, labels, h.count))
+                    duration.append('%s_request_duration_seconds_sum{%s} %r'
+                                    % (p, labels, h.sum))
+                    duration.append('%s_request_duration_seconds_count{%s} %d'
+                                    % (p, labels, h.count))
+
+        lines = []
+        for name, kind, help, samples in [
+                ('request_duration_seconds', 'histogram',
+                 'Latency of Merchant API requests', duration),
+                ('requests_in_flight', 'gauge',
+                 'Merchant API requests waiting for a response', in_flight),
+                ('request_bytes_total', 'counter',
+                 'Bytes sent in request bodies', request_bytes),
+                ('response_bytes_total', 'counter',
+                 'Bytes received in response bodies', response_bytes),
+                ('request_errors_total', 'counter',
+                 'Requests failed without a response or with a 4xx or 5xx '
+                 'status', errors)]:
+            lines.append('# HELP %s_%s %s' % (p, name, help))
+            lines.append('# TYPE %s_%s %s' % (p, name, kind))
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (name, _escape(value))
+                    for name, value in sorted(labels.items()))
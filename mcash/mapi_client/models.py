@@ -0,0 +1,267 @@
+"""Compact, read-only result objects for the payloads clients tend to hold
+on to in bulk, returned instead of dicts when MapiClient is created with
+typed_results=True.
+
+A model keeps the fields it knows in __slots__ and any other fields in the
+extra dict, so fields added to the API are not lost. Nested objects become
+records, slotted objects with one class per set of keys, which makes a
+list of similar objects such as line items cost a fraction of the same
+list of dicts. Objects with a key named like an attribute of Record,
+such as items or get, and objects with new sets of keys once the number
+of record classes is capped, become DictRecords keeping their fields in a
+dict instead. Values are taken over from the decoded JSON as they are,
+and values of fields that repeat across many objects, like currency or
+status, are shared between the objects instead of being held once each.
+
+Models and records can be read like the dicts they replace, model['id']
+and model.get('text') work as well as model.id, and to_dict() returns the
+plain dict.
+"""
+import re
+
+__all__ = ["Model", "Record", "DictRecord", "Settlement", "PaymentRequest",
+           "PaymentRequestOutcome", "Shortlink", "Pos"]
+
+# Fields whose values are shared between objects
+_shared_fields = frozenset(['currency', 'status', 'status_code', 'type',
+                            'pos_id', 'action', 'customer', 'vat_rate',
+                            'label', 'tag_id'])
+# Values of shared fields, capped so unusual data cannot grow it forever
+_shared_values = {}
+_max_shared_values = 10000
+
+_identifier = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Record classes by their sorted keys, capped like the shared values
+_record_classes = {}
+_max_record_classes = 1000
+
+
+def _share(value):
+    shared = _shared_values.get(value)
+    if shared is not None:
+        return shared
+    if len(_shared_values) < _max_shared_values:
+        _shared_values[value] = value
+    return value
+
+
+def _compact(value):
+    """Turn the dicts in a decoded JSON value into records"""
+    if isinstance(value, dict):
+        return _record(value)
+    if isinstance(value, list):
+        return [_compact(v) for v in value]
+    return value
+
+
+def _values(data):
+    for key, value in data.iteritems():
+        if key in _shared_fields and isinstance(value, basestring):
+            value = _share(value)
+        elif isinstance(value, (dict, list)):
+            value = _compact(value)
+        yield key, value
+
+
+def _record(data):
+    keys = tuple(sorted(data))
+    record_class = _record_classes.get(keys)
+    if record_class is None:
+        if not all(_identifier.match(key) for key in keys):
+            # not representable as slots, keep the dict
+            return dict((k, _compact(v)) for k, v in data.iteritems())
+        if (len(_record_classes) >= _max_record_classes or
+                not _reserved.isdisjoint(keys)):
+            # a slot would hide the method of the same name
+            return DictRecord(dict(_values(data)))
+        record_class = _record_classes[keys] = type(
+            'Record', (Record,), {'__slots__': keys, '_fields': keys})
+    record = record_class.__new__(record_class)
+    for key, value in _values(data):
+        setattr(record, key, value)
+    return record
+
+
+class Record(object):
+    """Slotted, dict-like object for a nested JSON object"""
+    __slots__ = ()
+    _fields = ()
+
+    def _items(self):
+        for key in self._fields:
+            yield key, getattr(self, key)
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def keys(self):
+        return [key for key, value in self._items()]
+
+    def items(self):
+        return list(self._items())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        """The object as plain dicts and lists"""
+        return dict((key, _to_plain(value)) for key, value in self._items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == _to_plain(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+
+class DictRecord(Record):
+    """Record keeping its fields in a dict. Fields named like an attribute
+    of Record can only be read as items.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        # only called for names that are not methods or slots
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def _items(self):
+        return self._data.iteritems()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+
+# Names a slot of a record must not take
+_reserved = frozenset(dir(DictRecord))
+
+
+def _to_plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return dict((k, _to_plain(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return [_to_plain(v) for v in value]
+    return value
+
+
+class Model(Record):
+    """Base class of the typed results. Subclasses list the fields they
+    know in __slots__. Known fields missing from the payload read as None
+    as attributes, and are missing as items, like in the dict.
+    """
+    __slots__ = ('extra',)
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls.__new__(cls)
+        fields = cls._field_set
+        extra = None
+        for key, value in data.iteritems():
+            if key in _shared_fields and isinstance(value, basestring):
+                value = _share(value)
+            elif isinstance(value, (dict, list)):
+                value = _compact(value)
+            if key in fields:
+                setattr(model, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        model.extra = extra
+        return model
+
+    def __getattr__(self, name):
+        # only called for slots that were not set
+        if name in self._field_set:
+            return None
+        raise AttributeError(name)
+
+    def _items(self):
+        for key in self._fields:
+            try:
+                yield key, object.__getattribute__(self, key)
+            except AttributeError:
+                pass
+        if self.extra:
+            for item in self.extra.iteritems():
+                yield item
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+
+def _model(cls):
+    cls._fields = cls.__slots__
+    cls._field_set = frozenset(cls.__slots__)
+    return cls
+
+
+@_model
+class Settlement(Model):
+    __slots__ = ('id', 'currency', 'amount', 'fee', 'payout_details',
+                 'created', 'transactions', 'uri')
+
+
+@_model
+class PaymentRequest(Model):
+    __slots__ = ('id', 'customer', 'currency', 'amount', 'additional_amount',
+                 'additional_edit', 'allow_credit', 'pos_id', 'pos_tid',
+                 'action', 'text', 'callback_uri', 'display_message_uri',
+                 'expires_in', 'required_scope', 'required_scope_text',
+                 'line_items', 'links')
+
+
+@_model
+class PaymentRequestOutcome(Model):
+    __slots__ = ('id', 'status', 'status_code', 'customer', 'currency',
+                 'amount', 'additional_amount', 'auth_amount', 'pos_id',
+                 'pos_tid', 'date_modified', 'date_expires', 'captures',
+                 'refunds', 'attachment_uri', 'permissions')
+
+
+@_model
+class Shortlink(Model):
+    __slots__ = ('id', 'callback_uri', 'serial_number', 'description', 'uri')
+
+
+@_model
+class Pos(Model):
+    __slots__ = ('id', 'name', 'type', 'location')
@@ -0,0 +1,80 @@
+from poster.encode import multipart_encode
+from poster.encode import MultipartParam
+
+__all__ = ["MultipartStream", "encode_attachment"]
+
+
+class MultipartStream(object):
+    """File-like view of an encoded multipart/form-data body.
+
+    The body is produced chunk by chunk from poster's generator as it is
+    read, so a file attachment is read incrementally from its file object
+    and never held in memory as a whole. The length is known up front, so
+    it can be sent with a Content-Length rather than chunked.
+    """
+
+    def __init__(self, datagen, length):
+        self._datagen = datagen
+        self._buffer = ''
+        self.len = length
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        if self._buffer:
+            yield self._buffer
+            self._buffer = ''
+        for block in self._datagen:
+            yield block
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return ''.join(self)
+        while len(self._buffer) < size:
+            block = next(self._datagen, None)
+            if block is None:
+                break
+            self._buffer += block
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _remaining_size(fileobj):
+    """Number of bytes left to read in fileobj, from its len attribute or
+    by seeking to the end and back
+    """
+    size = getattr(fileobj, 'len', None)
+    if size is not None:
+        return size
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, 2)
+        end = fileobj.tell()
+        fileobj.seek(position)
+    except (AttributeError, IOError, OSError, ValueError):
+        # io.UnsupportedOperation derives from IOError and ValueError
+        raise ValueError("cannot determine the size of the attachment, "
+                         "pass its length")
+    return end - position
+
+
+def encode_attachment(data, mime_type, filename='filename', length=None):
+    """Encode data, a string or a file-like object, as the 'file' part of a
+    multipart/form-data body. Returns a MultipartStream and the headers
+    describing it.
+
+    The size of a file-like object is taken from length if given, from its
+    len attribute, or by seeking. A stream that cannot seek, such as a
+    pipe, needs length. Data is read from the current position.
+    """
+    if hasattr(data, 'read'):
+        if length is None:
+            length = _remaining_size(data)
+        param = MultipartParam('file', fileobj=data, filename=filename,
+                               filetype=mime_type, filesize=length)
+    else:
+        param = MultipartParam('file', value=data, filename=filename,
+                               filetype=mime_type)
+    datagen, headers = multipart_encode([param])
+    return MultipartStream(datagen, int(headers['Content-Length'])), headers
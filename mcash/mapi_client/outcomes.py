@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from mapi_error import MapiError
+
+__all__ = ["OutcomeWaiter"]
+
+
+class _Pending(object):
+    """An outcome being waited for, shared by all waiters of the same id"""
+
+    def __init__(self, key, fetch, expires_at):
+        self.key = key
+        self.fetch = fetch
+        self.created = time.time()
+        self.expires_at = expires_at
+        # list of (future, deadline), deadline is None for no timeout
+        self.waiters = []
+
+
+class OutcomeWaiter(object):
+    """Waits for the outcomes of many payment and permission requests at
+    once, with a single scheduler thread polling all of them.
+
+    Each outcome is polled at an interval that starts at min_interval and
+    grows with the age of the wait, up to max_interval, since customers act
+    on most requests within seconds and the rest can take minutes. An
+    outcome is always polled right after its request expires, when its
+    status becomes final. Polls for all outcomes together, first polls
+    included, are sent at most max_rate per second, so thousands of
+    outcomes waited for at once poll less often each rather than flooding
+    the API.
+
+    Waiting for the same id more than once shares the polling.
+
+    Arguments:
+        min_interval, max_interval:
+            Bounds of the interval between polls of one outcome in seconds
+        growth:
+            Seconds added to the interval per second of age
+        max_rate:
+            Maximum polls per second over all outcomes
+        max_workers:
+            Number of polls that may be in flight at once
+        logger:
+            Logger for poll failures
+    """
+    pending_statuses = ('pending',)
+
+    def __init__(self, min_interval=0.5, max_interval=10.0, growth=0.1,
+                 max_rate=50.0, max_workers=10, logger=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.growth = growth
+        self.max_rate = float(max_rate)
+        self.logger = logger or logging.getLogger(__name__)
+        self.polls = 0
+        self._pending = {}
+        # heap of (time, sequence number, pending) of the next polls
+        self._schedule = []
+        # heap of (deadline, sequence number, pending) of the waiters with
+        # a timeout
+        self._deadlines = []
+        self._sequence = itertools.count()
+        # earliest time the next poll may be sent at
+        self._next_poll = 0
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._thread = None
+        self._closed = False
+
+    def wait(self, key, fetch, timeout=None, expires_in=None):
+        """Wait for the outcome fetched by fetch to get a final status.
+        Returns a Future of the outcome, which raises
+        concurrent.futures.TimeoutError after timeout seconds.
+
+        Arguments:
+            key:
+                Identifies the outcome, waits with equal keys share polls
+            fetch:
+                Callable returning the outcome dict
+            timeout:
+                Seconds to wait at most, None to wait until final
+            expires_in:
+                Seconds until the request expires, if known
+        """
+        future = Future()
+        now = time.time()
+        deadline = now + timeout if timeout is not None else None
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("OutcomeWaiter is closed")
+            pending = self._pending.get(key)
+            if pending is None:
+                expires_at = None
+                if expires_in is not None:
+                    expires_at = now + expires_in
+                pending = self._pending[key] = _Pending(key, fetch, expires_at)
+                # the first poll goes out as soon as the rate allows, the
+                # outcome may already be final
+                self._push(self._schedule, now, pending)
+            pending.waiters.append((future, deadline))
+            if deadline is not None:
+                self._push(self._deadlines, deadline, pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def _push(self, heap, when, pending):
+        heapq.heappush(heap, (when, next(self._sequence), pending))
+
+    def _interval(self, pending, now):
+        age = now - pending.created
+        interval = min(self.max_interval,
+                       self.min_interval + age * self.growth)
+        # spread the polls of many outcomes so the total stays in max_rate
+        interval = max(interval, len(self._pending) / self.max_rate)
+        if pending.expires_at is not None and now < pending.expires_at:
+            interval = min(interval, pending.expires_at - now)
+        return interval
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                now = time.time()
+                # timeouts are never held back by the rate of polls
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, _, pending = heapq.heappop(self._deadlines)
+                    self._expire(pending, now)
+                wake = self._deadlines[0][0] if self._deadlines else None
+                if self._schedule:
+                    when = max(self._schedule[0][0], self._next_poll)
+                    if when <= now:
+                        _, _, pending = heapq.heappop(self._schedule)
+                        if self._expire(pending, now):
+                            self.polls += 1
+                            self._next_poll = now + 1 / self.max_rate
+                            self._executor.submit(self._poll, pending)
+                        continue
+                    wake = when if wake is None else min(wake, when)
+                self._condition.wait(wake - now if wake is not None
+                                     else None)
+
+    def _expire(self, pending, now):
+        """Time out the waiters of pending that are past their deadline.
+        Returns whether it is still waited for.
+        """
+        if self._pending.get(pending.key) is not pending:
+            return False
+        self._expire_waiters(pending, now)
+        if not pending.waiters:
+            del self._pending[pending.key]
+            return False
+        return True
+
+    def _expire_waiters(self, pending, now):
+        waiters = []
+        for future, deadline in pending.waiters:
+            if future.cancelled():
+                continue
+            if deadline is not None and deadline <= now:
+                future.set_exception(TimeoutError())
+                continue
+            waiters.append((future, deadline))
+        pending.waiters = waiters
+
+    def _poll(self, pending):
+        outcome = error = None
+        try:
+            outcome = pending.fetch()
+        except MapiError as e:
+            # the request does not exist or may not be seen, polling
+            # again will not help
+            if 400 <= e.status < 500 and e.status != 429:
+                error = e
+            else:
+                self.logger.warning("Polling outcome %s failed: %s",
+                                    pending.key, e.status)
+        except Exception as e:
+            self.logger.warning("Polling outcome %s failed: %r",
+                                pending.key, e)
+
+        with self._condition:
+            final = (error is not None or outcome is not None and
+                     outcome.get('status') not in self.pending_statuses)
+            if final:
+                if self._pending.get(pending.key) is pending:
+                    del self._pending[pending.key]
+                waiters, pending.waiters = pending.waiters, []
+            else:
+                now = time.time()
+                self._push(self._schedule,
+                           now + self._interval(pending, now), pending)
+                self._condition.notify()
+                return
+        for future, deadline in waiters:
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(outcome)
+
+    def stats(self):
+        """Number of outcomes waited for and polls sent"""
+        with self._condition:
+            return {'pending': len(self._pending), 'polls': self.polls}
+
+    def close(self):
+        """Stop polling, outcomes still waited for are cancelled"""
+        with self._condition:
+            self._closed = True
+            pending, self._pending = self._pending.values(), {}
+            self._schedule = []
+            self._deadlines = []
+            self._condition.notify()
+        for p in pending:
+            for future, deadline in p.waiters:
+                future.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,163 @@
+import threading
+import time
+
+from endpoints import endpoint_family
+
+__all__ = ["TokenBucket", "AdaptiveConcurrencyLimit", "EndpointLimits",
+           "RateLimiter"]
+
+
+class TokenBucket(object):
+    """Lets through rate requests per second on average, with bursts of up
+    to burst requests.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available. Tokens are
+        reserved in call order, so waiting callers are served fairly.
+        """
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimit(object):
+    """Caps the number of requests in flight, adjusting the cap with AIMD.
+
+    Every successful request raises the limit by 1/limit, about one per
+    round of requests. A 429 or 503 response, or a latency above
+    latency_target, multiplies the limit by backoff. The limit is lowered
+    at most once per decrease_interval seconds, so that a burst of failures
+    from the same overload counts once.
+    """
+
+    def __init__(self, initial=10, min_limit=1, max_limit=100,
+                 latency_target=None, backoff=0.5, decrease_interval=1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self.queued = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self.queued += 1
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.queued -= 1
+            self.in_flight += 1
+
+    def release(self, latency, status):
+        """Give back the slot of a finished request, status is None if it
+        failed without a response.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            overloaded = status in (429, 503) or (
+                self.latency_target is not None and
+                latency > self.latency_target)
+            now = time.time()
+            if overloaded:
+                if now - self._last_decrease >= self.decrease_interval:
+                    self._last_decrease = now
+                    self.limit = max(self.min_limit,
+                                     self.limit * self.backoff)
+            elif status is not None and status < 500:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class EndpointLimits(object):
+    """Limits for one family of endpoints
+
+    Arguments:
+        rate:
+            Requests per second, None for no rate limit
+        burst:
+            Requests that may be sent at once above the rate
+        concurrency:
+            AdaptiveConcurrencyLimit keyword arguments, None for no
+            concurrency limit
+    """
+
+    def __init__(self, rate=None, burst=10, concurrency=None):
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.concurrency = None
+        if concurrency is not None:
+            self.concurrency = AdaptiveConcurrencyLimit(**concurrency)
+
+
+class RateLimiter(object):
+    """Client-side rate and concurrency limits per endpoint family, the
+    first path segment after /merchant/v1/ such as 'payment_request',
+    'shortlink' or 'settlement'.
+
+    Arguments:
+        limits:
+            Dict of endpoint family to EndpointLimits
+        default:
+            Factory for the EndpointLimits of families not in limits,
+            None leaves them unlimited
+    """
+
+    def __init__(self, limits=None, default=None):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._lock = threading.Lock()
+
+    def _limits(self, family):
+        limits = self.limits.get(family)
+        if limits is None and self.default is not None:
+            with self._lock:
+                limits = self.limits.setdefault(family, self.default())
+        return limits
+
+    def acquire(self, url):
+        """Wait until a request to url may be sent. Returns a token to pass
+        to release when the request is done.
+        """
+        limits = self._limits(endpoint_family(url))
+        if limits is None:
+            return None
+        if limits.bucket is not None:
+            limits.bucket.acquire()
+        if limits.concurrency is not None:
+            limits.concurrency.acquire()
+        return limits
+
+    def release(self, token, latency, status):
+        if token is not None and token.concurrency is not None:
+            token.concurrency.release(latency, status)
+
+    def stats(self):
+        """Current limits, requests in flight and queue depth per family"""
+        stats = {}
+        for family, limits in self.limits.items():
+            family_stats = {}
+            if limits.bucket is not None:
+                family_stats['rate'] = limits.bucket.rate
+            if limits.concurrency is not None:
+                family_stats.update(
+                    concurrency_limit=int(limits.concurrency.limit),
+                    in_flight=limits.concurrency.in_flight,
+                    queued=limits.concurrency.queued)
+            stats[family] = family_stats
+        return stats
@@ -0,0 +1,96 @@
+import random
+import threading
+
+__all__ = ["RetryPolicy", "RetryBudget"]
+
+
+class RetryBudget(object):
+    """Limits retries to a fraction of the requests made, so that a client
+    retrying against an API that is struggling does not multiply the load.
+
+    Every request deposits ratio tokens and every retry withdraws one. The
+    balance is capped at max_tokens and starts at that value, which gives
+    some room to retry before any requests have been made.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """Take a token for a retry, returns False if the budget is spent"""
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """When and how long to wait before retrying a failed request.
+
+    Only requests that are safe to repeat are retried, see the idempotent
+    argument of MapiClient.do_req. Each retry is signed again, so it gets a
+    fresh timestamp.
+
+    Arguments:
+        max_attempts:
+            Maximum number of attempts, including the first
+        backoff:
+            Delay before the first retry in seconds, doubled for every
+            following retry
+        max_backoff:
+            Upper limit for the delay
+        jitter:
+            Randomize each delay between 0 and the computed value, which
+            keeps clients that failed together from retrying together
+        retry_statuses:
+            HTTP statuses that are worth retrying
+        budget:
+            RetryBudget shared by all requests using the policy, by default
+            a RetryBudget allowing retries for a tenth of the requests
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.1, max_backoff=5.0,
+                 jitter=True, retry_statuses=(429, 502, 503, 504),
+                 budget=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def request_started(self):
+        self.budget.deposit()
+
+    def should_retry(self, attempt, idempotent, status=None):
+        """Whether to retry after attempt number attempt failed, with the
+        given status, or with a connection error if status is None.
+        """
+        if not idempotent or attempt >= self.max_attempts:
+            return False
+        if status is not None and status not in self.retry_statuses:
+            return False
+        return self.budget.withdraw()
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt. A Retry-After given by
+        the server is respected up to max_backoff.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(self.max_backoff, float(retry_after)))
+            except ValueError:
+                # an HTTP date, not worth parsing
+                pass
+        return delay
@@ -0,0 +1,448 @@
+"""Columnar analytics over settlements.
+
+SettlementTable holds settlements and their transactions as columns of
+integers instead of dicts: amounts and fees in hundredths, dates as days
+since 1970-01-01, and currencies and transaction types as indexes into
+lists of names. Totals by currency, period and transaction type are
+computed over whole columns with NumPy when it is installed
+(pip install mcash-mapi-client[analytics]) and with plain loops over the
+columns otherwise. Both give exactly the same results, amounts are never
+converted to floats.
+"""
+import array
+import csv
+import datetime
+import json
+import sys
+from collections import namedtuple
+from decimal import Decimal
+from itertools import islice, izip, repeat
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ["SettlementTable", "Totals", "load_settlements", "PERIODS"]
+
+PERIODS = ('day', 'month', 'year')
+
+# count of rows, amount and fee as Decimals
+Totals = namedtuple('Totals', ['count', 'amount', 'fee'])
+
+_epoch = datetime.date(1970, 1, 1).toordinal()
+_magic = 'MSETTLE1\n'
+
+
+def _typecode(size):
+    for code in 'ilq':
+        try:
+            if array.array(code).itemsize == size:
+                return code
+        except ValueError:
+            # 'q' is not supported by Python 2
+            pass
+    raise ValueError("no array type with %d byte items" % size)
+
+
+# name, array typecode and NumPy dtype of each column
+_columns = [('currency', _typecode(4), 'i4'),
+            ('day', _typecode(4), 'i4'),
+            ('amount', _typecode(8), 'i8'),
+            ('fee', _typecode(8), 'i8'),
+            ('transaction_settlement', _typecode(4), 'i4'),
+            ('transaction_type', _typecode(4), 'i4'),
+            ('transaction_amount', _typecode(8), 'i8'),
+            ('transaction_fee', _typecode(8), 'i8')]
+
+
+def _hundredths(amount):
+    """'123.45' to 12345"""
+    if amount is None:
+        return 0
+    if isinstance(amount, basestring) and amount[-3:-2] == '.':
+        # the usual form, two decimals
+        try:
+            return int(amount[:-3] + amount[-2:])
+        except ValueError:
+            pass
+    value = Decimal(str(amount)).scaleb(2)
+    if value != value.to_integral_value():
+        raise ValueError("amount %r has more than two decimals" % (amount,))
+    return int(value)
+
+
+def _decimal(hundredths):
+    return Decimal(int(hundredths)).scaleb(-2)
+
+
+def _format(hundredths):
+    sign = '-' if hundredths < 0 else ''
+    return '%s%d.%02d' % ((sign,) + divmod(abs(int(hundredths)), 100))
+
+
+def _date(day):
+    return datetime.date.fromordinal(int(day) + _epoch)
+
+
+def _period_code(day, period):
+    if period == 'day':
+        return day
+    date = _date(day)
+    if period == 'month':
+        return (date.year - 1970) * 12 + date.month - 1
+    return date.year - 1970
+
+
+def _period_label(code, period):
+    if period == 'day':
+        return _date(code).isoformat()
+    if period == 'month':
+        return '%04d-%02d' % (1970 + code // 12, code % 12 + 1)
+    return '%04d' % (1970 + code)
+
+
+class _Names(object):
+    """Names and the index of each"""
+
+    def __init__(self, names=()):
+        self.names = list(names)
+        self._index = dict((name, i) for i, name in enumerate(self.names))
+
+    def index(self, name):
+        i = self._index.get(name)
+        if i is None:
+            i = self._index[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+
+class _Builder(object):
+    """Appends settlements to the columns of a SettlementTable"""
+
+    def __init__(self, date_field):
+        self.date_field = date_field
+        self.ids = []
+        self.currencies = _Names()
+        self.types = _Names()
+        self.columns = dict((name, array.array(typecode))
+                            for name, typecode, dtype in _columns)
+        self._days = {}
+
+    def _day(self, value):
+        if value is None:
+            raise ValueError("settlement has no %s" % self.date_field)
+        value = value[:10]
+        day = self._days.get(value)
+        if day is None:
+            day = self._days[value] = datetime.date(
+                int(value[:4]), int(value[5:7]),
+                int(value[8:10])).toordinal() - _epoch
+        return day
+
+    def add(self, settlement):
+        columns = self.columns
+        row = len(self.ids)
+        self.ids.append(settlement.get('id'))
+        columns['currency'].append(
+            self.currencies.index(settlement.get('currency')))
+        columns['day'].append(self._day(settlement.get(self.date_field)))
+        columns['amount'].append(_hundredths(settlement.get('amount')))
+        columns['fee'].append(_hundredths(settlement.get('fee')))
+        transactions = settlement.get('transactions')
+        if not transactions:
+            return
+        type_index = self.types.index
+        columns['transaction_settlement'].extend(
+            repeat(row, len(transactions)))
+        columns['transaction_type'].extend(
+            [type_index(t.get('type')) for t in transactions])
+        columns['transaction_amount'].extend(
+            [_hundredths(t.get('amount')) for t in transactions])
+        columns['transaction_fee'].extend(
+            [_hundredths(t.get('fee')) for t in transactions])
+
+    def table(self):
+        return SettlementTable(self.ids, self.currencies.names,
+                               self.types.names, self.columns)
+
+
+class SettlementTable(object):
+    """Settlements and their transactions as columns.
+
+    The columns are NumPy arrays if NumPy is installed and arrays from the
+    array module otherwise:
+
+        currency, day, amount, fee:
+            One row per settlement. currency indexes currencies, day is
+            the number of days since 1970-01-01, amount and fee are in
+            hundredths.
+        transaction_settlement, transaction_type, transaction_amount,
+        transaction_fee:
+            One row per transaction. transaction_settlement is the row of
+            its settlement, transaction_type indexes transaction_types.
+
+    ids, currencies and transaction_types are lists. Create tables with
+    from_settlements, load_settlements or load.
+    """
+
+    def __init__(self, ids, currencies, transaction_types, columns):
+        self.ids = ids
+        self.currencies = currencies
+        self.transaction_types = transaction_types
+        for name, typecode, dtype in _columns:
+            column = columns[name]
+            if numpy is not None and not isinstance(column, numpy.ndarray):
+                if len(column):
+                    # shares the memory of the array
+                    column = numpy.frombuffer(column, dtype=dtype)
+                else:
+                    column = numpy.zeros(0, dtype=dtype)
+            setattr(self, name, column)
+
+    @classmethod
+    def from_settlements(cls, settlements, date_field='created'):
+        """Build a table from settlement dicts or Settlement models
+
+        Arguments:
+            settlements:
+                Iterable of settlements, as returned by get_settlement
+            date_field:
+                Field holding the date of each settlement, as a string
+                starting with YYYY-MM-DD
+        """
+        builder = _Builder(date_field)
+        for settlement in settlements:
+            builder.add(settlement)
+        return builder.table()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def totals(self, by=('currency', 'period'), period='month'):
+        """Number, amount and fee of the settlements by currency and/or
+        period. Returns a dict from a tuple of the values of by, such as
+        ('NOK', '2014-05'), to Totals.
+
+        Arguments:
+            by:
+                Sequence of 'currency' and 'period'
+            period:
+                One of PERIODS
+        """
+        return self._totals(by, period, self.currency, self.day,
+                            None, self.amount, self.fee)
+
+    def transaction_totals(self, by=('currency', 'period', 'type'),
+                           period='month'):
+        """Number, amount and fee of the transactions of the settlements by
+        currency, period and/or transaction type. Returns a dict from a
+        tuple of the values of by, such as ('NOK', '2014-05', 'payment'),
+        to Totals.
+
+        Arguments:
+            by:
+                Sequence of 'currency', 'period' and 'type'
+            period:
+                One of PERIODS
+        """
+        rows = self.transaction_settlement
+        if numpy is not None:
+            currency = self.currency[rows]
+            day = self.day[rows]
+        else:
+            currency = [self.currency[row] for row in rows]
+            day = [self.day[row] for row in rows]
+        return self._totals(by, period, currency, day, self.transaction_type,
+                            self.transaction_amount, self.transaction_fee)
+
+    def _totals(self, by, period, currency, day, types, amount, fee):
+        if period not in PERIODS:
+            raise ValueError("period should be one of " + ", ".join(PERIODS))
+        keys = []
+        labels = []
+        for name in by:
+            if name == 'currency':
+                keys.append(currency)
+                labels.append(self.currencies.__getitem__)
+            elif name == 'period':
+                keys.append(self._period_codes(day, period))
+                labels.append(lambda code: _period_label(code, period))
+            elif name == 'type' and types is not None:
+                keys.append(types)
+                labels.append(self.transaction_types.__getitem__)
+            else:
+                raise ValueError("cannot group by %r" % (name,))
+
+        if numpy is not None:
+            groups = _group_numpy(keys, amount, fee)
+        else:
+            groups = _group_loop(keys, amount, fee)
+        return dict((tuple(label(code) for label, code in zip(labels, key)),
+                     Totals(count, _decimal(amount), _decimal(fee)))
+                    for key, count, amount, fee in groups)
+
+    def _period_codes(self, day, period):
+        if period == 'day':
+            return day
+        if numpy is not None:
+            unit = 'datetime64[M]' if period == 'month' else 'datetime64[Y]'
+            return day.astype('datetime64[D]').astype(unit).astype('i8')
+        codes = {}
+        for d in day:
+            if d not in codes:
+                codes[d] = _period_code(d, period)
+        return [codes[d] for d in day]
+
+    def to_csv(self, f):
+        """Write one line per settlement to the file f: id, currency, date,
+        amount and fee
+        """
+        writer = csv.writer(f)
+        writer.writerow(['id', 'currency', 'date', 'amount', 'fee'])
+        dates = {}
+        for id, currency, day, amount, fee in izip(
+                self.ids, self.currency.tolist(), self.day.tolist(),
+                self.amount.tolist(), self.fee.tolist()):
+            if day not in dates:
+                dates[day] = _date(day).isoformat()
+            writer.writerow([_utf8(id), _utf8(self.currencies[currency]),
+                             dates[day], _format(amount), _format(fee)])
+
+    def transactions_to_csv(self, f):
+        """Write one line per transaction to the file f: settlement id,
+        type, amount and fee
+        """
+        writer = csv.writer(f)
+        writer.writerow(['settlement_id', 'type', 'amount', 'fee'])
+        for row, type_, amount, fee in izip(
+                self.transaction_settlement.tolist(),
+                self.transaction_type.tolist(),
+                self.transaction_amount.tolist(),
+                self.transaction_fee.tolist()):
+            writer.writerow([_utf8(self.ids[row]),
+                             _utf8(self.transaction_types[type_]),
+                             _format(amount), _format(fee)])
+
+    def save(self, f):
+        """Write the table to the binary file f, to be read back with load.
+        The columns are written as little-endian integers, taking 24 bytes
+        per settlement and 24 per transaction, after a JSON header with the
+        ids and names.
+        """
+        header = {'ids': self.ids,
+                  'currencies': self.currencies,
+                  'transaction_types': self.transaction_types,
+                  'lengths': [len(getattr(self, name))
+                              for name, typecode, dtype in _columns]}
+        f.write(_magic)
+        f.write(json.dumps(header, separators=(',', ':')) + '\n')
+        for name, typecode, dtype in _columns:
+            column = getattr(self, name)
+            if numpy is not None:
+                f.write(column.astype('<' + dtype).tostring())
+            else:
+                if sys.byteorder == 'big':
+                    column = array.array(typecode, column)
+                    column.byteswap()
+                f.write(column.tostring())
+
+    @classmethod
+    def load(cls, f):
+        """Read a table written by save from the binary file f"""
+        if f.read(len(_magic)) != _magic:
+            raise ValueError("not a settlement table")
+        header = json.loads(f.readline())
+        columns = {}
+        for (name, typecode, dtype), length in zip(_columns,
+                                                    header['lengths']):
+            column = array.array(typecode)
+            data = f.read(length * column.itemsize)
+            if len(data) != length * column.itemsize:
+                raise ValueError("settlement table is truncated")
+            column.fromstring(data)
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+        return cls(header['ids'], header['currencies'],
+                   header['transaction_types'], columns)
+
+
+def _group_numpy(keys, amount, fee):
+    """Yields (key, count, amount, fee) of each group of rows with the same
+    values in the key columns
+    """
+    if not len(amount):
+        return
+    if not keys:
+        yield (), len(amount), amount.sum(), fee.sum()
+        return
+    # lexsort sorts by the last key first
+    order = numpy.lexsort(keys[::-1])
+    keys = [numpy.asarray(key)[order] for key in keys]
+    starts = numpy.zeros(len(order), dtype=bool)
+    starts[0] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    starts = numpy.flatnonzero(starts)
+    counts = numpy.diff(numpy.append(starts, len(order)))
+    amounts = numpy.add.reduceat(amount[order], starts)
+    fees = numpy.add.reduceat(fee[order], starts)
+    group_keys = izip(*[key[starts].tolist() for key in keys])
+    for group in izip(group_keys, counts.tolist(), amounts.tolist(),
+                      fees.tolist()):
+        yield group
+
+
+def _group_loop(keys, amount, fee):
+    groups = {}
+    rows = izip(*keys) if keys else repeat(())
+    for key, a, f in izip(rows, amount, fee):
+        totals = groups.get(key)
+        if totals is None:
+            groups[key] = [1, a, f]
+        else:
+            totals[0] += 1
+            totals[1] += a
+            totals[2] += f
+    for key, (count, a, f) in groups.iteritems():
+        yield key, count, a, f
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def load_settlements(client, max_workers=10, date_field='created'):
+    """Fetch every settlement of the merchant into a SettlementTable. The
+    settlements are fetched concurrently, and turned into columns as they
+    arrive, so only the settlements in flight are held as dicts.
+
+    Arguments:
+        client:
+            MapiClient of the merchant
+        max_workers:
+            Maximum number of settlements fetched at the same time
+        date_field:
+            Field holding the date of each settlement
+    """
+    def fetch(uri):
+        return client.do_req('GET', uri).json()
+
+    builder = _Builder(date_field)
+    uris = client.iter_settlements()
+    executor = ThreadPoolExecutor(max_workers)
+    try:
+        while True:
+            chunk = list(islice(uris, max_workers * 4))
+            if not chunk:
+                break
+            for settlement in executor.map(fetch, chunk):
+                builder.add(settlement)
+    finally:
+        executor.shutdown(wait=False)
+    return builder.table()
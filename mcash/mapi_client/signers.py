@@ -0,0 +1,80 @@
+"""RSA-SHA256 (PKCS#1 v1.5) signers used by RsaSha256Auth.
+
+A signer is any object with a sign(data) method returning the raw
+signature bytes of data. PKCS#1 v1.5 signatures are deterministic, so every
+engine produces exactly the same signature for the same key and data.
+"""
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+__all__ = ["PyCryptoSigner", "CryptographySigner", "get_signer",
+           "available_engines"]
+
+
+class PyCryptoSigner(object):
+    """Signs with PyCrypto, always available"""
+    engine = 'pycrypto'
+
+    def __init__(self, privkey):
+        self.signer = PKCS1_v1_5.new(RSA.importKey(privkey))
+
+    def sign(self, data):
+        return self.signer.sign(SHA256.new(data))
+
+
+class CryptographySigner(object):
+    """Signs with the OpenSSL bindings of the cryptography package, which
+    is several times faster than PyCrypto. Only PEM keys are supported.
+    """
+    engine = 'cryptography'
+
+    def __init__(self, privkey):
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+        self.key = serialization.load_pem_private_key(
+            privkey, password=None, backend=default_backend())
+        self.padding = padding.PKCS1v15()
+        self.hash = hashes.SHA256()
+
+    def sign(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        return self.key.sign(data, self.padding, self.hash)
+
+
+# Fastest first
+_engines = [CryptographySigner, PyCryptoSigner]
+
+
+def available_engines():
+    """Names of the engines that can be imported"""
+    names = []
+    for signer_class in _engines:
+        if signer_class is CryptographySigner:
+            try:
+                import cryptography  # noqa
+            except ImportError:
+                continue
+        names.append(signer_class.engine)
+    return names
+
+
+def get_signer(privkey, engine=None):
+    """Return a signer for privkey using the named engine, or the fastest
+    installed engine that can load the key.
+    """
+    if engine is not None:
+        for signer_class in _engines:
+            if signer_class.engine == engine:
+                return signer_class(privkey)
+        raise ValueError("unknown signing engine " + engine)
+
+    for signer_class in _engines[:-1]:
+        try:
+            return signer_class(privkey)
+        except (ImportError, ValueError, TypeError):
+            # not installed, or unable to load this key format
+            pass
+    return _engines[-1](privkey)
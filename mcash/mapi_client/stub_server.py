@@ -0,0 +1,392 @@
+"""In-memory stand-in for the Merchant API, for running the client against
+locally in tests and benchmarks without touching mCASH.
+
+    stub = StubMerchantApi()
+    stub.start()
+    client = MapiClient(base_url=stub.url, auth=OpenAuth(),
+                        mcash_merchant='stubmerchant', mcash_user='admin')
+    ...
+    stub.stop()
+
+Only the parts of the API the client talks to are implemented, and no
+authentication is checked. Successful GETs carry an ETag of the content,
+and are answered with 304 Not Modified when it matches If-None-Match.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
+
+__all__ = ["StubMerchantApi", "StubRequest"]
+
+StubRequest = namedtuple('StubRequest', ['method', 'path', 'headers', 'body',
+                                         'client_address'])
+
+CONTENT_TYPE = 'application/vnd.mcash.api.merchant.v1+json'
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+    # buffer the response, writing headers one by one stalls keep-alive
+    # clients on delayed ACKs
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        status, headers, content = self.server.stub.handle(
+            self.command, self.path, dict(self.headers.items()), body,
+            self.client_address)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        if self.close_connection:
+            # tell the client, or it reuses the connection closed under it
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class StubMerchantApi(object):
+    """Threaded HTTP server serving an in-memory merchant.
+
+    Arguments:
+        host, port:
+            Address to listen on, port 0 picks a free port
+        page_size:
+            Number of uris in each page of a list endpoint
+        latency, latency_jitter:
+            Every answer is delayed by latency seconds plus a random part
+            of up to latency_jitter seconds
+        error_rate:
+            Fraction of requests answered with a random one of
+            error_statuses instead of being served
+        log_requests:
+            Keep every request in the requests list, turn off for long
+            load tests
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, page_size=10, latency=0,
+                 latency_jitter=0, error_rate=0, error_statuses=(503,),
+                 log_requests=True):
+        self.page_size = page_size
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.log_requests = log_requests
+        self.requests = []
+        self.payment_requests = {}
+        # (pos_id, pos_tid) to tid
+        self._payment_request_ids = {}
+        self.outcomes = {}
+        self.permission_requests = {}
+        self.permission_outcomes = {}
+        self.pos = {}
+        self.shortlinks = {}
+        self.settlements = {}
+        self.settlement_order = []
+        self.status_codes = {}
+        self.attachments = []
+        self.injected_errors = []
+        self.injected_latencies = []
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+        self._routes = [
+            ('POST', r'/payment_request/$', self._create_payment_request),
+            ('GET', r'/payment_request/(?P<tid>[^/]+)/$',
+             self._get_payment_request),
+            ('PUT', r'/payment_request/(?P<tid>[^/]+)/$',
+             self._update_payment_request),
+            ('GET', r'/payment_request/(?P<tid>[^/]+)/outcome/$',
+             self._get_payment_request_outcome),
+            ('POST', r'/permission_request/$',
+             self._create_permission_request),
+            ('GET', r'/permission_request/(?P<rid>[^/]+)/$',
+             self._get_permission_request),
+            ('GET', r'/permission_request/(?P<rid>[^/]+)/outcome/$',
+             self._get_permission_request_outcome),
+            ('POST', r'/pos/$', self._create_pos),
+            ('GET', r'/pos/$', self._list('pos')),
+            ('GET', r'/pos/(?P<id>[^/]+)/$', self._get('pos')),
+            ('PUT', r'/pos/(?P<id>[^/]+)/$', self._update('pos')),
+            ('DELETE', r'/pos/(?P<id>[^/]+)/$', self._delete('pos')),
+            ('POST', r'/shortlink/$', self._create_shortlink),
+            ('GET', r'/shortlink/$', self._list('shortlink')),
+            ('GET', r'/shortlink/(?P<id>[^/]+)/$', self._get('shortlink')),
+            ('PUT', r'/shortlink/(?P<id>[^/]+)/$', self._update('shortlink')),
+            ('DELETE', r'/shortlink/(?P<id>[^/]+)/$',
+             self._delete('shortlink')),
+            ('GET', r'/settlement/$', self._list('settlement')),
+            ('GET', r'/settlement/(?P<id>[^/]+)/$', self._get('settlement')),
+            ('GET', r'/last_settlement/$', self._get_last_settlement),
+            ('GET', r'/status_code/$', self._list('status_code')),
+            ('GET', r'/status_code/(?P<id>[^/]+)/$', self._get('status_code')),
+            ('POST', r'/attachment/$', self._upload_attachment),
+        ]
+        self._routes = [(m, re.compile('^/merchant/v1' + p), f)
+                        for m, p, f in self._routes]
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_settlement(self, settlement):
+        """Add a settlement document, it becomes the last settlement"""
+        with self._lock:
+            self.settlements[settlement['id']] = settlement
+            self.settlement_order.append(settlement['id'])
+
+    def add_status_code(self, status_code):
+        with self._lock:
+            self.status_codes[str(status_code['value'])] = status_code
+
+    def set_outcome(self, tid, status, **fields):
+        """Set the status of a payment request, as if the customer had
+        acted on it.
+        """
+        with self._lock:
+            self.outcomes[tid].update(fields, status=status)
+
+    def set_permission_outcome(self, rid, status, **fields):
+        """Set the status of a permission request"""
+        with self._lock:
+            self.permission_outcomes[rid].update(fields, status=status)
+
+    def inject_errors(self, *statuses):
+        """Answer the next requests with these error statuses, in order,
+        instead of serving them.
+        """
+        with self._lock:
+            self.injected_errors.extend(statuses)
+
+    def inject_latency(self, *seconds):
+        """Delay the answers to the next requests by these numbers of
+        seconds, in order.
+        """
+        with self._lock:
+            self.injected_latencies.extend(seconds)
+
+    def handle(self, method, path, headers, body, client_address):
+        """Serve one request, returns status, headers and content"""
+        with self._lock:
+            if self.log_requests:
+                self.requests.append(StubRequest(method, path, headers, body,
+                                                 client_address))
+            if self.injected_latencies:
+                latency = self.injected_latencies.pop(0)
+            else:
+                latency = self.latency
+                if self.latency_jitter:
+                    latency += random.uniform(0, self.latency_jitter)
+        if latency:
+            time.sleep(latency)
+        with self._lock:
+            status = None
+            if self.injected_errors:
+                status = self.injected_errors.pop(0)
+            elif self.error_rate and random.random() < self.error_rate:
+                status = random.choice(self.error_statuses)
+            if status is not None:
+                return status, {'Content-Type': CONTENT_TYPE}, json.dumps(
+                    {'error': 'injected error'})
+        parsed = urlparse(path)
+        query = dict((k, v[0]) for k, v in parse_qs(parsed.query).items())
+        for route_method, pattern, view in self._routes:
+            match = pattern.match(parsed.path)
+            if match is not None and route_method == method:
+                data = None
+                if body and 'json' in headers.get('content-type', ''):
+                    data = json.loads(body)
+                elif body:
+                    data = body
+                with self._lock:
+                    status, content = view(data, query, **match.groupdict())
+                break
+        else:
+            status, content = 404, {'error': 'not found'}
+        if content is None:
+            return status, {}, ''
+        content = json.dumps(content)
+        if method == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.md5(content).hexdigest()
+            if headers.get('if-none-match') == etag:
+                return 304, {'ETag': etag}, ''
+            return status, {'Content-Type': CONTENT_TYPE,
+                            'ETag': etag}, content
+        return status, {'Content-Type': CONTENT_TYPE}, content
+
+    def _uri(self, collection, id):
+        return '%s/merchant/v1/%s/%s/' % (self.url, collection, id)
+
+    def _collection(self, name):
+        return {'pos': self.pos,
+                'shortlink': self.shortlinks,
+                'settlement': self.settlements,
+                'status_code': self.status_codes}[name]
+
+    def _list(self, name):
+        def view(data, query):
+            if name == 'settlement':
+                ids = self.settlement_order
+            else:
+                ids = sorted(self._collection(name))
+            page = int(query.get('page', 0))
+            start = page * self.page_size
+            end = start + self.page_size
+            next_link = None
+            if end < len(ids):
+                next_link = '%s/merchant/v1/%s/?page=%d' % (self.url, name,
+                                                            page + 1)
+            return 200, {'uris': [self._uri(name, i) for i in ids[start:end]],
+                         'next': next_link}
+        return view
+
+    def _get(self, name):
+        def view(data, query, id):
+            if id not in self._collection(name):
+                return 404, {'error': 'not found'}
+            return 200, self._collection(name)[id]
+        return view
+
+    def _update(self, name):
+        def view(data, query, id):
+            if id not in self._collection(name):
+                return 404, {'error': 'not found'}
+            self._collection(name)[id].update(data)
+            return 204, None
+        return view
+
+    def _delete(self, name):
+        def view(data, query, id):
+            if self._collection(name).pop(id, None) is None:
+                return 404, {'error': 'not found'}
+            return 204, None
+        return view
+
+    def _create_pos(self, data, query):
+        if data['id'] in self.pos:
+            return 409, {'error': 'pos already exists'}
+        self.pos[data['id']] = data
+        return 201, {'id': data['id']}
+
+    def _create_shortlink(self, data, query):
+        id = uuid.uuid4().hex[:8]
+        self.shortlinks[id] = dict(data, id=id)
+        return 201, {'id': id}
+
+    def _upload_attachment(self, data, query):
+        self.attachments.append(data)
+        return 201, None
+
+    def _get_last_settlement(self, data, query):
+        if not self.settlement_order:
+            return 404, {'error': 'no settlements'}
+        return 200, self.settlements[self.settlement_order[-1]]
+
+    def _create_payment_request(self, data, query):
+        # Idempotent on pos_id and pos_tid, like the real API
+        key = (data['pos_id'], data['pos_tid'])
+        if key in self._payment_request_ids:
+            return 201, {'id': self._payment_request_ids[key]}
+        tid = uuid.uuid4().hex[:10]
+        self._payment_request_ids[key] = tid
+        self.payment_requests[tid] = data
+        self.outcomes[tid] = {'id': tid,
+                              'status': 'pending',
+                              'amount': data['amount'],
+                              'currency': data['currency'],
+                              'pos_id': data['pos_id'],
+                              'pos_tid': data['pos_tid'],
+                              'captures': []}
+        return 201, {'id': tid}
+
+    def _get_payment_request(self, data, query, tid):
+        if tid not in self.payment_requests:
+            return 404, {'error': 'not found'}
+        return 200, self.payment_requests[tid]
+
+    def _update_payment_request(self, data, query, tid):
+        if tid not in self.payment_requests:
+            return 404, {'error': 'not found'}
+        outcome = self.outcomes[tid]
+        action = (data.get('action') or '').lower()
+        if action == 'capture':
+            # Idempotent on capture_id, like the real API
+            capture_id = data.get('capture_id')
+            captured = [c['capture_id'] for c in outcome['captures']]
+            if capture_id is None or capture_id not in captured:
+                outcome['captures'].append(
+                    {'capture_id': capture_id,
+                     'amount': data.get('amount', outcome['amount'])})
+            outcome['status'] = 'ok'
+        elif action in ('abort', 'release'):
+            outcome['status'] = 'fail'
+        self.payment_requests[tid].update(data)
+        return 204, None
+
+    def _get_payment_request_outcome(self, data, query, tid):
+        if tid not in self.outcomes:
+            return 404, {'error': 'not found'}
+        return 200, self.outcomes[tid]
+
+    def _create_permission_request(self, data, query):
+        # Idempotent on pos_id and pos_tid, like the real API
+        for rid, pr in self.permission_requests.items():
+            if (pr['pos_id'], pr['pos_tid']) == (data['pos_id'],
+                                                 data['pos_tid']):
+                return 201, {'id': rid}
+        rid = uuid.uuid4().hex[:10]
+        self.permission_requests[rid] = data
+        self.permission_outcomes[rid] = {'id': rid, 'status': 'pending'}
+        return 201, {'id': rid}
+
+    def _get_permission_request(self, data, query, rid):
+        if rid not in self.permission_requests:
+            return 404, {'error': 'not found'}
+        return 200, self.permission_requests[rid]
+
+    def _get_permission_request_outcome(self, data, query, rid):
+        if rid not in self.permission_outcomes:
+            return 404, {'error': 'not found'}
+        return 200, self.permission_outcomes[rid]
@@ -0,0 +1,236 @@
+"""Local copy of the list endpoints of merchants, kept in SQLite.
+
+SyncStore.sync walks the paginated lists of POSes, shortlinks and
+settlements of the client's merchant, and only fetches the documents of
+entries it has not seen before, or, with refresh_after, entries fetched
+longer ago than that. Entries gone from a list are removed. Settlements
+never change once created, so they are fetched only once.
+
+A sync of a merchant that has not changed thus only costs the list pages,
+after which list, get and count answer from the local copy.
+"""
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+from concurrent.futures import ThreadPoolExecutor
+
+from json_codecs import get_json_codec
+from mapi_error import MapiError
+
+__all__ = ["SyncStore", "COLLECTIONS"]
+
+# collection name to the MapiClient method iterating over its uris
+_iterators = {'pos': 'iter_pos',
+              'shortlink': 'iter_shortlinks',
+              'settlement': 'iter_settlements'}
+COLLECTIONS = ('pos', 'shortlink', 'settlement')
+# collections whose documents never change once created
+_immutable = frozenset(['settlement'])
+
+_schema = """
+CREATE TABLE IF NOT EXISTS documents (
+    merchant TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    id TEXT,
+    position INTEGER NOT NULL,
+    fetched REAL NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (merchant, collection, uri)
+);
+CREATE INDEX IF NOT EXISTS documents_id
+    ON documents (merchant, collection, id);
+CREATE TABLE IF NOT EXISTS syncs (
+    merchant TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    synced REAL NOT NULL,
+    PRIMARY KEY (merchant, collection)
+);
+"""
+
+
+def _id_from_uri(uri):
+    return uri.rstrip('/').rsplit('/', 1)[-1]
+
+
+class SyncStore(object):
+    """SQLite database holding the POSes, shortlinks and settlements of any
+    number of merchants, each synced from a MapiClient of the merchant.
+    Documents are kept as the JSON sent by the API.
+
+    Arguments:
+        path:
+            File name of the database, ':memory:' for a database that is
+            not kept
+        refresh_after:
+            Seconds after which the documents of changeable collections
+            are fetched again on sync, None to only fetch new entries
+        json_codec:
+            Codec decoding the documents, by default the fastest installed
+    """
+
+    def __init__(self, path, refresh_after=None, json_codec=None):
+        self.refresh_after = refresh_after
+        self.json_codec = json_codec or get_json_codec()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(_schema)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def sync(self, client, collections=COLLECTIONS, max_workers=10):
+        """Bring the local copy of the client's merchant up to date.
+
+        Returns a dict from collection to a dict with the number of entries
+        listed, and of documents added, updated and removed.
+
+        Arguments:
+            client:
+                MapiClient of the merchant
+            collections:
+                Names of the collections to sync, see COLLECTIONS
+            max_workers:
+                Maximum number of documents fetched at the same time
+        """
+        for collection in collections:
+            if collection not in _iterators:
+                raise ValueError("collection should be one of " +
+                                 ", ".join(COLLECTIONS))
+        executor = ThreadPoolExecutor(max_workers)
+        try:
+            return dict((collection,
+                         self._sync(client, collection, executor,
+                                    max_workers))
+                        for collection in collections)
+        finally:
+            executor.shutdown(wait=False)
+
+    def _sync(self, client, collection, executor, max_workers):
+        merchant = client.mcash_merchant
+        started = time.time()
+        with self._lock:
+            known = dict(self._db.execute(
+                'SELECT uri, fetched FROM documents '
+                'WHERE merchant = ? AND collection = ?',
+                (merchant, collection)))
+
+        stale_before = None
+        if self.refresh_after is not None and collection not in _immutable:
+            stale_before = started - self.refresh_after
+        positions = {}
+        to_fetch = []
+        for position, uri in enumerate(
+                getattr(client, _iterators[collection])()):
+            positions[uri] = position
+            fetched = known.get(uri)
+            if fetched is None or (stale_before is not None and
+                                   fetched < stale_before):
+                to_fetch.append(uri)
+
+        stats = {'listed': len(positions), 'added': 0, 'updated': 0,
+                 'removed': 0}
+        uris = iter(to_fetch)
+        while True:
+            chunk = list(islice(uris, max_workers * 4))
+            if not chunk:
+                break
+            rows = []
+            for uri, content in zip(chunk, executor.map(
+                    lambda uri: self._fetch(client, uri), chunk)):
+                if content is None:
+                    # removed since it was listed
+                    del positions[uri]
+                    continue
+                rows.append((merchant, collection, uri,
+                             self._id(content, uri), positions[uri],
+                             time.time(), sqlite3.Binary(content)))
+                stats['updated' if uri in known else 'added'] += 1
+            with self._lock, self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO documents (merchant, collection, '
+                    'uri, id, position, fetched, content) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+        removed = [(merchant, collection, uri) for uri in known
+                   if uri not in positions]
+        stats['removed'] = len(removed)
+        with self._lock, self._db:
+            self._db.executemany(
+                'DELETE FROM documents '
+                'WHERE merchant = ? AND collection = ? AND uri = ?', removed)
+            self._db.executemany(
+                'UPDATE documents SET position = ? '
+                'WHERE merchant = ? AND collection = ? AND uri = ?',
+                ((position, merchant, collection, uri)
+                 for uri, position in positions.iteritems()))
+            self._db.execute(
+                'INSERT OR REPLACE INTO syncs (merchant, collection, synced) '
+                'VALUES (?, ?, ?)', (merchant, collection, started))
+        return stats
+
+    def _fetch(self, client, uri):
+        """The raw document at uri, None if it is not found"""
+        try:
+            return client.do_req('GET', uri).content
+        except MapiError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _id(self, content, uri):
+        try:
+            id = self.json_codec.loads(content).get('id')
+        except (ValueError, AttributeError):
+            id = None
+        return id if id is not None else _id_from_uri(uri)
+
+    def list(self, merchant, collection):
+        """The documents of a collection of the merchant, in the order of
+        the last sync
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT content FROM documents '
+                'WHERE merchant = ? AND collection = ? ORDER BY position',
+                (merchant, collection)).fetchall()
+        return [self.json_codec.loads(str(content)) for content, in rows]
+
+    def get(self, merchant, collection, id):
+        """The document with the given id, None if it is not in the store"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT content FROM documents '
+                'WHERE merchant = ? AND collection = ? AND id = ?',
+                (merchant, collection, id)).fetchone()
+        if row is None:
+            return None
+        return self.json_codec.loads(str(row[0]))
+
+    def count(self, merchant, collection):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM documents '
+                'WHERE merchant = ? AND collection = ?',
+                (merchant, collection)).fetchone()[0]
+
+    def last_synced(self, merchant, collection):
+        """Time the last sync of the collection started, None if it has
+        never been synced
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT synced FROM syncs '
+                'WHERE merchant = ? AND collection = ?',
+                (merchant, collection)).fetchone()
+        return row[0] if row is not None else None
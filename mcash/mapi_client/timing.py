@@ -0,0 +1,82 @@
+import threading
+import time
+
+__all__ = ["RequestTiming", "PHASES"]
+
+# Phases in the order they happen
+PHASES = ('validate', 'serialize', 'sign', 'connect', 'server_wait',
+          'download', 'decode')
+
+# validation runs before do_req is called, its time is left here for the
+# request that follows on the same thread
+_pending = threading.local()
+
+
+def record_validation(seconds):
+    _pending.validate = seconds
+
+
+def take_validation():
+    seconds = getattr(_pending, 'validate', None)
+    _pending.validate = None
+    return seconds
+
+
+class RequestTiming(object):
+    """Where the time of one MapiClient call went, see the timing_hook
+    argument of MapiClient.
+
+    phases maps the names in PHASES to seconds, summed over all retries of
+    the request. Of hedged GETs only the attempt whose response was used
+    is counted, so the phases never add up to more than the elapsed time.
+    Phases that were not measured are missing. connect is the time spent
+    opening a connection, TCP and TLS handshake, and is missing when a
+    kept-alive connection was reused. Backends that cannot tell connect,
+    server_wait and download apart count all of the round trip as
+    server_wait.
+    """
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.status = None
+        self.attempts = 0
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def merge(self, other):
+        """Add the phases of another RequestTiming, that of one attempt"""
+        for phase, seconds in other.phases.items():
+            self.add(phase, seconds)
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def __repr__(self):
+        phases = ', '.join('%s=%.1fms' % (p, self.phases[p] * 1000)
+                           for p in PHASES if p in self.phases)
+        return '<RequestTiming %s %s %s: %s>' % (self.method, self.url,
+                                                 self.status, phases)
+
+
+class TimedAuth(object):
+    """Wraps an auth callable, adding the time it takes to the sign phase"""
+
+    def __init__(self, auth, timing):
+        self.auth = auth
+        self.timing = timing
+        self.seconds = 0.0
+
+    def __call__(self, *args):
+        start = time.time()
+        try:
+            return self.auth(*args)
+        finally:
+            seconds = time.time() - start
+            self.seconds += seconds
+            self.timing.add('sign', seconds)
@@ -1,20 +1,87 @@
+import time
 from functools import wraps
 from voluptuous import Schema, Required, Any, All, Length, Range
+from voluptuous import Marker, Invalid, MultipleInvalid
+
+from timing import record_validation
+
+FULL = 'full'
+FAST = 'fast'
+OFF = 'off'
+VALIDATION_MODES = (FULL, FAST, OFF)
 
 
 def validate_input(function):
-    """Decorator that validates the kwargs of the function passed to it."""
+    """Decorator that validates the kwargs of the function passed to it.
+
+    The validation schema is looked up when decorating. How thoroughly the
+    input is checked is decided by the validation attribute of the object
+    the method is called on: FULL runs the whole schema, FAST only checks
+    for required and unknown keys and top level types, and OFF skips
+    validation.
+    """
+    try:
+        full_validator = globals()[function.__name__ + '_validator']
+    except KeyError:
+        raise Exception("Could not find validation schema for the"
+                        " function " + function.__name__)
+    fast_validator = _compile_fast_validator(full_validator)
+
     @wraps(function)
     def wrapper(*args, **kwargs):
-        try:
-            name = function.__name__ + '_validator'  # find validator name
-            globals()[name](kwargs)  # call validation function
-            return function(*args, **kwargs)
-        except KeyError:
-            raise Exception("Could not find validation schema for the"
-                            " function " + function.__name__)
+        client = args[0] if args else None
+        mode = getattr(client, 'validation', FULL)
+        timed = getattr(client, 'timing_hook', None) is not None
+        if timed:
+            start = time.time()
+        if mode == FULL:
+            full_validator(kwargs)
+        elif mode == FAST:
+            fast_validator(kwargs)
+        if timed:
+            record_validation(time.time() - start)
+        return function(*args, **kwargs)
     return wrapper
 
+
+def _compile_fast_validator(schema):
+    """Compile the top level of schema into a plain Python check of
+    required keys, unknown keys and value types. Nested structures are only
+    checked to be dicts or lists, and validators like All and Any are
+    skipped.
+    """
+    required = []
+    types = {}
+    for key, value in schema.schema.items():
+        name = key.schema if isinstance(key, Marker) else key
+        if isinstance(key, Required):
+            required.append(name)
+        if isinstance(value, type):
+            types[name] = value
+        elif isinstance(value, dict):
+            types[name] = dict
+        elif isinstance(value, list):
+            types[name] = list
+        else:
+            types[name] = object
+
+    def validator(data):
+        errors = []
+        for name in required:
+            if name not in data:
+                errors.append(Invalid('required key not provided', [name]))
+        for name, value in data.iteritems():
+            expected = types.get(name)
+            if expected is None:
+                errors.append(Invalid('extra keys not allowed', [name]))
+            elif not isinstance(value, expected):
+                errors.append(Invalid('expected ' + expected.__name__,
+                                      [name]))
+        if errors:
+            raise MultipleInvalid(errors)
+        return data
+    return validator
+
 create_user_validator = Schema({
     Required('user_id'): basestring,
     'roles': [Any('user', 'superuser')],
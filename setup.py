@@ -14,9 +14,13 @@ setup(
                       "requests>=2.2.1",
                       "voluptuous>=0.8.4",
                       "poster>=0.8.1",
-                      "wsgiref>=0.1.2"],
+                      "wsgiref>=0.1.2",
+                      "futures>=3.0.0"],
     extras_require={
-        'mapi_client_example':  ["pusherclient>=0.2.0"]
+        'mapi_client_example':  ["pusherclient>=0.2.0"],
+        'fast_signing': ["cryptography>=1.4"],
+        'fast_json': ["ujson>=1.35"],
+        'analytics': ["numpy>=1.8"]
     },
     packages=find_packages('.'),
     namespace_packages=['mcash']
@@ -0,0 +1,73 @@
+import pytest
+from voluptuous import MultipleInvalid
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(mapi_client.AsyncMapiClient, max_workers=10)
+
+
+def _create_payment_request(client, pos_tid):
+    return client.create_payment_request(customer='alice',
+                                         currency='NOK',
+                                         amount='10.00',
+                                         allow_credit=False,
+                                         pos_id='pos1',
+                                         pos_tid=pos_tid,
+                                         action='auth',
+                                         expires_in=60)
+
+
+def test_concurrent_payment_flows(stub, client):
+    futures = [_create_payment_request(client, 'tid%d' % i)
+               for i in range(50)]
+    tids = [f.result()['id'] for f in futures]
+    assert len(set(tids)) == 50
+
+    futures = [client.update_payment_request(tid=tid, action='capture')
+               for tid in tids]
+    for f in futures:
+        f.result()
+
+    futures = [client.get_payment_request_outcome(tid) for tid in tids]
+    assert all(f.result()['status'] == 'ok' for f in futures)
+
+
+def test_depagination(stub, client):
+    for i in range(25):
+        stub.add_settlement({'id': 'settlement%d' % i})
+    assert len(client.get_all_settlements().result()) == 25
+
+
+def test_batches(client):
+    payment_requests = [{'customer': 'alice', 'currency': 'NOK',
+                         'amount': '10.00', 'allow_credit': False,
+                         'pos_id': 'pos1', 'pos_tid': 'tid%d' % i,
+                         'action': 'auth', 'expires_in': 60}
+                        for i in range(5)]
+    results = client.batch_create_payment_requests(payment_requests).result()
+    updates = [{'tid': r['id'], 'action': 'capture'} for r in results]
+    results = client.batch_update_payment_requests(updates).result()
+    assert len(results) == 5
+    assert not any(isinstance(r, Exception) for r in results)
+
+
+def test_iterators_are_returned_directly(stub, client):
+    stub.add_settlement({'id': 'settlement1'})
+    assert list(client.iter_settlements()) == \
+        client.get_all_settlements().result()
+    # one empty page
+    assert list(client.get_shortlink_generator()) == [[]]
+
+
+def test_errors_are_raised_from_the_future(client):
+    with pytest.raises(mapi_client.MapiError) as e:
+        client.get_payment_request_outcome('missing').result()
+    assert e.value.status == 404
+
+
+def test_validation(client):
+    with pytest.raises(MultipleInvalid):
+        _create_payment_request(client, 1).result()
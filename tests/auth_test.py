@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import json
+
+import pytest
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+from mcash import mapi_client
+
+key = RSA.generate(1024)
+privkey = key.exportKey()
+
+
+class FixedTimestampAuth(mapi_client.RsaSha256Auth):
+    def _get_timestamp(self):
+        return '2014-01-01 12:00:00'
+
+
+def _sign(auth):
+    return auth('POST', 'https://api.mca.sh/merchant/v1/payment_request/',
+                {'X-Mcash-Merchant': 'merchant', 'X-Mcash-User': 'user'},
+                '{"amount": "10.00"}')[2]
+
+
+def test_signature_verifies():
+    headers = _sign(FixedTimestampAuth(privkey))
+    signed = ('POST|https://api.mca.sh/merchant/v1/payment_request/|'
+              'X-MCASH-CONTENT-DIGEST=' + headers['X-Mcash-Content-Digest'] +
+              '&X-MCASH-MERCHANT=merchant'
+              '&X-MCASH-TIMESTAMP=2014-01-01 12:00:00&X-MCASH-USER=user')
+    signature = base64.b64decode(headers['Authorization'].split(' ')[1])
+    verifier = PKCS1_v1_5.new(key.publickey())
+    assert verifier.verify(SHA256.new(signed), signature)
+
+
+def test_engines_sign_identically():
+    pytest.importorskip('cryptography')
+    assert (_sign(FixedTimestampAuth(privkey, signer='cryptography')) ==
+            _sign(FixedTimestampAuth(privkey, signer='pycrypto')))
+
+
+def test_custom_signer():
+    class Signer(object):
+        def sign(self, data):
+            return 'signature'
+
+    headers = _sign(FixedTimestampAuth(privkey, signer=Signer()))
+    assert headers['Authorization'] == ('RSA-SHA256 ' +
+                                        base64.b64encode('signature'))
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        mapi_client.RsaSha256Auth(privkey, signer='unknown')
+
+
+def test_digest_covers_the_bytes_sent(stub, make_client):
+    client = make_client(auth=mapi_client.RsaSha256Auth(privkey))
+    client.create_payment_request(
+        customer='alice', currency='NOK', amount='10.00',
+        allow_credit=False, pos_id='pos1', pos_tid='tid1',
+        action='auth', expires_in=60,
+        text=u'Bl\xe5b\xe6rsyltet\xf8y',
+        line_items=[{'product_id': 'p%d' % i, 'total': '1.00',
+                     'item_cost': '1.00', 'quantity': '1'}
+                    for i in range(10)])
+    client.get_all_pos()
+    for request in stub.requests:
+        digest = base64.b64encode(hashlib.sha256(request.body).digest())
+        assert request.headers['x-mcash-content-digest'] == 'SHA256=' + digest
+    assert json.loads(stub.requests[0].body)['text'] == (
+        u'Bl\xe5b\xe6rsyltet\xf8y')
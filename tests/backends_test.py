@@ -0,0 +1,32 @@
+import time
+
+from mcash import mapi_client
+
+
+def _client_ports(stub):
+    return set(r.client_address[1] for r in stub.requests)
+
+
+def test_connections_are_kept_alive(stub, make_client):
+    client = make_client(backend=mapi_client.RequestsFramework())
+    for i in range(5):
+        client.get_all_pos()
+    assert len(stub.requests) == 5
+    assert len(_client_ports(stub)) == 1
+
+
+def test_no_keep_alive(stub, make_client):
+    client = make_client(backend=mapi_client.RequestsFramework(
+        keep_alive=False))
+    for i in range(3):
+        client.get_all_pos()
+    assert len(_client_ports(stub)) == 3
+
+
+def test_idle_connections_are_reaped(stub, make_client):
+    client = make_client(backend=mapi_client.RequestsFramework(max_idle=0.05))
+    client.get_all_pos()
+    client.get_all_pos()
+    time.sleep(0.1)
+    client.get_all_pos()
+    assert len(_client_ports(stub)) == 2
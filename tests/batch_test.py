@@ -0,0 +1,94 @@
+import pytest
+import requests
+from voluptuous import Invalid
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client()
+
+
+def _payment_requests(n):
+    return [{'customer': 'alice',
+             'currency': 'NOK',
+             'amount': '10.00',
+             'allow_credit': False,
+             'pos_id': 'pos1',
+             'pos_tid': 'tid%d' % i,
+             'action': 'auth',
+             'expires_in': 60} for i in range(n)]
+
+
+def test_batch_create_is_ordered_and_idempotent(stub, client):
+    results = client.batch_create_payment_requests(_payment_requests(30))
+    tids = [r['id'] for r in results]
+    assert len(set(tids)) == 30
+    assert tids[7] == stub.outcomes[tids[7]]['id']
+    assert stub.outcomes[tids[7]]['pos_tid'] == 'tid7'
+
+    retried = client.batch_create_payment_requests(_payment_requests(30))
+    assert [r['id'] for r in retried] == tids
+    assert len(stub.payment_requests) == 30
+
+
+def test_batch_update_returns_errors_in_place(stub, client):
+    tids = [r['id'] for r in
+            client.batch_create_payment_requests(_payment_requests(3))]
+    updates = [{'tid': tid, 'action': 'capture', 'amount': '5.00',
+                'capture_id': 'c1'} for tid in tids]
+    updates.insert(1, {'tid': 'missing', 'action': 'capture'})
+
+    results = client.batch_update_payment_requests(updates, max_workers=2)
+    assert isinstance(results[1], mapi_client.MapiError)
+    assert results[1].status == 404
+    assert all(r.status == 204 for i, r in enumerate(results) if i != 1)
+
+    # Sending the same captures again does not capture twice
+    client.batch_update_payment_requests(updates)
+    assert all(len(stub.outcomes[tid]['captures']) == 1 for tid in tids)
+
+
+def test_batch_stream(client):
+    results = dict(client.batch_create_payment_requests(_payment_requests(10),
+                                                        stream=True))
+    assert sorted(results) == range(10)
+
+
+def test_batch_partial_capture_requires_capture_id(stub, client):
+    tids = [r['id'] for r in
+            client.batch_create_payment_requests(_payment_requests(3))]
+    updates = [{'tid': tids[0], 'action': 'capture', 'amount': '5.00',
+                'capture_id': 'c1'},
+               {'tid': tids[1], 'action': 'capture', 'amount': '5.00'},
+               {'tid': tids[2], 'action': 'refund', 'amount': '5.00'}]
+    before = len(stub.requests)
+    results = client.batch_update_payment_requests(updates)
+    assert results[0].status == 204
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ValueError)
+    # only the capture with a capture_id was sent
+    assert len(stub.requests) - before == 1
+    assert len(stub.outcomes[tids[0]]['captures']) == 1
+
+
+def test_batch_returns_any_item_failure_in_place(stub, client):
+    payment_requests = _payment_requests(5)
+    payment_requests[2]['currency'] = 'NOKK'
+    results = client.batch_create_payment_requests(payment_requests)
+    assert isinstance(results[2], Invalid)
+    assert all('id' in r for i, r in enumerate(results) if i != 2)
+    assert len(stub.payment_requests) == 4
+
+    streamed = dict(client.batch_create_payment_requests(payment_requests,
+                                                         stream=True))
+    assert sorted(streamed) == range(5)
+    assert isinstance(streamed[2], Invalid)
+
+
+def test_batch_returns_connection_errors_in_place(client):
+    client.backend = mapi_client.RequestsFramework()
+    client.merchant_api_base_url = 'http://127.0.0.1:1/merchant/v1'
+    results = client.batch_create_payment_requests(_payment_requests(2))
+    assert all(isinstance(r, requests.ConnectionError) for r in results)
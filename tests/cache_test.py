@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.cache import LRUCache, ResponseCache
+
+
+@pytest.fixture
+def stub_options():
+    return {'page_size': 5}
+
+
+@pytest.fixture
+def stub(stub):
+    for value in range(1000, 1012):
+        stub.add_status_code({'value': value, 'name': 'status%d' % value,
+                              'description': 'Status code %d' % value})
+    return stub
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    cache = LRUCache()
+    cache.set('a', 1, ttl=0.05)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+
+def test_status_codes_are_served_from_memory(stub, make_client):
+    cache = ResponseCache()
+    client = make_client(response_cache=cache)
+    uris = client.get_all_status_codes()
+    codes = [client.get_status_code(uri.split('/')[-2]) for uri in uris]
+    requests = len(stub.requests)
+    assert requests == 3 + 12
+
+    assert client.get_all_status_codes() == uris
+    assert [client.get_status_code(uri.split('/')[-2])
+            for uri in uris] == codes
+    assert len(stub.requests) == requests
+    assert cache.stats()['hits'] == {'get_all_status_codes': 1,
+                                     'get_status_code': 12}
+
+
+def test_cached_results_are_copies(make_client):
+    client = make_client(response_cache=ResponseCache())
+    client.get_status_code('1000')['name'] = 'changed'
+    assert client.get_status_code('1000')['name'] == 'status1000'
+
+
+def test_invalidate(make_client):
+    cache = ResponseCache()
+    client = make_client(response_cache=cache)
+    client.get_status_code('1000')
+    client.get_status_code('1001')
+    cache.invalidate('get_status_code', '1000')
+    client.get_status_code('1000')
+    client.get_status_code('1001')
+    assert cache.stats()['misses'] == {'get_status_code': 3}
+    cache.invalidate()
+    assert cache.stats()['size'] == 0
+
+
+def test_endpoints_without_ttl_are_not_cached(stub, make_client):
+    cache = ResponseCache(ttls={'get_status_code': None})
+    client = make_client(response_cache=cache)
+    client.get_status_code('1000')
+    client.get_status_code('1000')
+    assert len(stub.requests) == 2
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    return stub
+
+
+def _concurrently(n, target):
+    results = [None] * n
+
+    def run(i):
+        results[i] = target()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_gets_share_one_request(stub, make_client):
+    coalescer = mapi_client.RequestCoalescer()
+    client = make_client(request_coalescer=coalescer)
+    stub.inject_latency(0.3)
+    results = _concurrently(5, lambda: client.get_pos('pos1'))
+    assert len(stub.requests) == 1
+    assert all(r is results[0] for r in results)
+    assert results[0]['name'] == 'Till 1'
+    assert coalescer.stats() == {'requests': 1, 'coalesced': 4}
+
+
+def test_merchants_do_not_share_responses(stub, make_client):
+    coalescer = mapi_client.RequestCoalescer()
+    clients = [make_client(request_coalescer=coalescer,
+                           mcash_merchant=merchant)
+               for merchant in ('merchant1', 'merchant2')]
+    stub.inject_latency(0.3, 0.3)
+    results = _concurrently(2, lambda: clients.pop().get_pos('pos1'))
+    assert len(stub.requests) == 2
+    assert sorted(r.headers['x-mcash-merchant'] for r in stub.requests) == \
+        ['merchant1', 'merchant2']
+    assert results[0] is not results[1]
+    assert coalescer.stats()['coalesced'] == 0
+
+
+def test_callers_expecting_another_status_do_not_share(stub, make_client):
+    client = make_client(request_coalescer=mapi_client.RequestCoalescer())
+    url = stub.url + '/merchant/v1/pos/pos1/'
+    statuses = [None, 201]
+
+    def get():
+        try:
+            return client.do_req('GET', url, status=statuses.pop()).status
+        except mapi_client.MapiError as e:
+            return e
+    stub.inject_latency(0.3, 0.3)
+    results = _concurrently(2, get)
+    assert len(stub.requests) == 2
+    assert 200 in results
+    assert any(isinstance(r, mapi_client.MapiError) for r in results)
+
+
+def test_sequential_gets_are_not_shared_without_reuse_window(stub,
+                                                             make_client):
+    client = make_client(request_coalescer=mapi_client.RequestCoalescer())
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    assert len(stub.requests) == 2
+
+
+def test_reuse_window(stub, make_client):
+    coalescer = mapi_client.RequestCoalescer(reuse_window=0.2)
+    client = make_client(request_coalescer=coalescer)
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    assert len(stub.requests) == 1
+    time.sleep(0.25)
+    client.get_pos('pos1')
+    assert len(stub.requests) == 2
+
+
+def test_writes_are_not_coalesced(stub, make_client):
+    client = make_client(request_coalescer=mapi_client.RequestCoalescer())
+    stub.inject_latency(0.2, 0.2)
+    _concurrently(2, lambda: client.update_pos(
+        pos_id='pos1', name='Till 1', pos_type='store'))
+    assert len(stub.requests) == 2
+
+
+def test_errors_are_shared_but_not_reused():
+    coalescer = mapi_client.RequestCoalescer(reuse_window=10)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError()
+    for i in range(2):
+        with pytest.raises(ValueError):
+            coalescer.do('key', fail)
+    assert len(calls) == 2
+
+
+def test_depagination_does_not_modify_shared_pages(stub, make_client):
+    for i in range(15):
+        stub.pos['pos%d' % i] = {'id': 'pos%d' % i, 'name': 'Till',
+                                 'type': 'store'}
+    coalescer = mapi_client.RequestCoalescer(reuse_window=10)
+    client = make_client(request_coalescer=coalescer)
+    assert len(client.get_all_pos()) == 15
+    assert len(client.get_all_pos()) == 15
@@ -0,0 +1,56 @@
+"""Fixtures shared by the tests talking to a StubMerchantApi.
+
+A test module puts its data in the stub by overriding the stub fixture
+with one requesting the stub of this file:
+
+    @pytest.fixture
+    def stub(stub):
+        stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+        return stub
+
+The arguments of StubMerchantApi are taken from stub_options, which a
+module overrides, updated with those a test parametrizes the stub with:
+
+    @pytest.mark.parametrize('stub', [{'latency': 0.02}], indirect=True)
+"""
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.stub_server import StubMerchantApi
+
+
+@pytest.fixture
+def stub_options():
+    """Keyword arguments of StubMerchantApi"""
+    return {}
+
+
+@pytest.fixture
+def stub(request, stub_options):
+    options = dict(stub_options, **getattr(request, 'param', {}))
+    with StubMerchantApi(**options) as stub:
+        yield stub
+
+
+@pytest.fixture
+def make_client(request):
+    """Factory of clients of the stub merchant, closed after the test.
+
+    Keyword arguments are passed on to the client class, by default
+    MapiClient with OpenAuth, and the stub is only started when no
+    base_url is given.
+    """
+    clients = []
+
+    def make_client(client_class=mapi_client.MapiClient, **kwargs):
+        if 'base_url' not in kwargs:
+            kwargs['base_url'] = request.getfixturevalue('stub').url
+        kwargs.setdefault('auth', mapi_client.OpenAuth())
+        kwargs.setdefault('mcash_merchant', 'stubmerchant')
+        kwargs.setdefault('mcash_user', 'admin')
+        client = client_class(**kwargs)
+        clients.append(client)
+        return client
+    yield make_client
+    for client in clients:
+        client.close()
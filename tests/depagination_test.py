@@ -0,0 +1,85 @@
+import time
+from itertools import islice
+
+import pytest
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def stub_options():
+    return {'page_size': 2}
+
+
+@pytest.fixture
+def stub(stub):
+    for i in range(7):
+        stub.add_settlement({'id': 'settlement%d' % i})
+    return stub
+
+
+def _wait_for_requests(stub, n, timeout=2):
+    deadline = time.time() + timeout
+    while len(stub.requests) < n and time.time() < deadline:
+        time.sleep(0.01)
+    return len(stub.requests)
+
+
+@pytest.mark.parametrize('prefetch', [0, 1, 3])
+def test_get_all_settlements(stub, make_client, prefetch):
+    client = make_client(depagination_prefetch=prefetch)
+    settlements = client.get_all_settlements()
+    assert settlements == [stub.url + '/merchant/v1/settlement/settlement%d/'
+                           % i for i in range(7)]
+    assert len(stub.requests) == 4
+
+
+def test_pages_are_fetched_ahead(stub, make_client):
+    client = make_client(depagination_prefetch=2)
+    pages = client._depagination_generator(client.merchant_api_base_url +
+                                           '/settlement/')
+    next(pages)
+    assert _wait_for_requests(stub, 3) == 3
+    # the lookahead is bounded
+    time.sleep(0.1)
+    assert len(stub.requests) == 3
+    next(pages)
+    assert _wait_for_requests(stub, 4) == 4
+
+
+def test_early_termination_stops_fetching(stub, make_client):
+    client = make_client(depagination_prefetch=1)
+    pages = client.get_shortlink_generator()
+    next(pages)
+    pages.close()
+    time.sleep(0.1)
+    assert len(stub.requests) <= 2
+
+
+def test_errors_are_raised_to_the_caller(make_client):
+    client = make_client(depagination_prefetch=1)
+    with pytest.raises(mapi_client.MapiError):
+        list(client._depagination_generator(client.merchant_api_base_url +
+                                            '/missing/'))
+
+
+def test_iter_settlements_is_lazy(stub, make_client):
+    client = make_client(depagination_prefetch=0)
+    settlements = client.iter_settlements()
+    assert next(settlements).endswith('/settlement/settlement0/')
+    assert len(stub.requests) == 1
+    assert len(list(islice(settlements, 2))) == 2
+    assert len(stub.requests) == 2
+    settlements.close()
+    assert len(stub.requests) == 2
+
+
+def test_iter_settlements(make_client):
+    client = make_client()
+    assert list(client.iter_settlements()) == client.get_all_settlements()
+
+
+def test_count_settlements(make_client):
+    client = make_client()
+    assert client.count_settlements() == 7
+    assert client.count_shortlinks() == 0
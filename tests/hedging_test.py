@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    return stub
+
+
+def test_slow_get_is_hedged(stub, make_client):
+    policy = mapi_client.HedgingPolicy(min_delay=0.05, max_delay=0.05)
+    client = make_client(hedging_policy=policy)
+    stub.inject_latency(2)
+    start = time.time()
+    assert client.get_pos('pos1')['name'] == 'Till 1'
+    assert time.time() - start < 1
+    assert len(stub.requests) == 2
+    assert policy.stats() == {'requests': 1, 'hedges_fired': 1,
+                              'hedges_won': 1, 'requests_unhedged': 0,
+                              'hedges_skipped': 0}
+
+
+def test_fast_get_is_not_hedged(stub, make_client):
+    policy = mapi_client.HedgingPolicy(max_delay=0.5)
+    client = make_client(hedging_policy=policy)
+    for i in range(3):
+        client.get_pos('pos1')
+    assert len(stub.requests) == 3
+    assert policy.stats()['hedges_fired'] == 0
+
+
+def test_hedge_delay_follows_latency_percentile():
+    policy = mapi_client.HedgingPolicy(percentile=90, min_delay=0.001,
+                                       max_delay=1.0)
+    assert policy.delay() == 1.0
+    for i in range(100):
+        policy._latencies.append(i / 1000.0)
+    assert policy.delay() == 0.09
+
+
+def test_failed_response_does_not_win(stub, make_client):
+    policy = mapi_client.HedgingPolicy(min_delay=0.05, max_delay=0.05)
+    client = make_client(hedging_policy=policy)
+    stub.inject_latency(0.2)
+    stub.inject_errors(503)
+    assert client.get_pos('pos1')['name'] == 'Till 1'
+    assert policy.stats()['hedges_won'] == 0
+
+
+def test_posts_are_not_hedged(stub, make_client):
+    policy = mapi_client.HedgingPolicy(min_delay=0.01, max_delay=0.01)
+    client = make_client(hedging_policy=policy)
+    stub.inject_latency(0.1)
+    client.create_shortlink()
+    assert len(stub.requests) == 1
+    assert policy.stats()['requests'] == 0
+
+
+def _concurrently(threads, calls, target):
+    def run():
+        for i in range(calls):
+            target()
+    threads = [threading.Thread(target=run) for i in range(threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.mark.parametrize('stub', [{'latency': 0.02}], indirect=True)
+def test_busy_client_does_not_add_load(stub, make_client):
+    # every request is slower than the hedge delay
+    policy = mapi_client.HedgingPolicy(min_delay=0.001, max_delay=0.001,
+                                       max_workers=2)
+    client = make_client(hedging_policy=policy)
+    results = []
+    _concurrently(8, 5, lambda: results.append(client.get_pos('pos1')['name']))
+    assert results == ['Till 1'] * 40
+    stats = policy.stats()
+    # at most two attempts are in flight on the workers at any time, the
+    # other callers send their request themselves
+    assert stats['requests'] == 40
+    assert stats['requests_unhedged'] > 0
+    assert stats['hedges_fired'] <= 20
+    # a hedge cancelled before it started is never sent
+    assert 40 <= len(stub.requests) <= 40 + stats['hedges_fired']
+
+
+@pytest.mark.parametrize('stub', [{'latency': 0.02}], indirect=True)
+def test_steady_latency_is_rarely_hedged(stub, make_client):
+    policy = mapi_client.HedgingPolicy()
+    client = make_client(hedging_policy=policy)
+    _concurrently(40, 5, lambda: client.get_pos('pos1'))
+    stats = policy.stats()
+    assert stats['requests'] == 200
+    assert stats['hedges_fired'] <= 20
+    assert 200 <= len(stub.requests) <= 200 + stats['hedges_fired']
+
+
+@pytest.mark.parametrize('stub', [{'latency': 0.05}], indirect=True)
+def test_hedge_is_skipped_without_free_worker(stub, make_client):
+    policy = mapi_client.HedgingPolicy(min_delay=0.001, max_delay=0.001,
+                                       max_workers=1)
+    client = make_client(hedging_policy=policy)
+    client.get_pos('pos1')
+    assert policy.stats() == {'requests': 1, 'hedges_fired': 0,
+                              'hedges_won': 0, 'requests_unhedged': 0,
+                              'hedges_skipped': 1}
+    assert len(stub.requests) == 1
+
+
+def test_close_stops_the_threads(make_client):
+    policy = mapi_client.HedgingPolicy(min_delay=0.001, max_delay=0.001)
+    client = make_client(hedging_policy=policy)
+    client.get_pos('pos1')
+    executor = policy._executor
+    client.close()
+    assert policy._executor is None
+    assert executor._shutdown
+    # a policy shared with another client keeps working
+    assert make_client(hedging_policy=policy).get_pos('pos1')['id'] == 'pos1'
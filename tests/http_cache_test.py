@@ -0,0 +1,180 @@
+import cPickle as pickle
+import json
+import os
+
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.http_cache import _Entry
+
+
+class ScriptedBackend(object):
+    """Returns the given responses in order, and keeps the headers of each
+    request sent
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent_headers = []
+
+    def dispatch_request(self, method, url, body, headers, auth):
+        self.sent_headers.append(headers)
+        return mapi_client.MapiResponse(*self.responses.pop(0))
+
+
+def _entry(content, etag='"1"'):
+    return _Entry(200, {}, content, etag, None, None)
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    return stub
+
+
+def test_stub_answers_not_modified(stub, make_client):
+    cache = mapi_client.HttpCache()
+    client = make_client(http_cache=cache)
+    assert client.get_pos('pos1')['name'] == 'Till 1'
+    assert client.get_pos('pos1')['name'] == 'Till 1'
+    first, second = stub.requests
+    assert 'if-none-match' not in first.headers
+    assert second.headers['if-none-match'].startswith('"')
+    assert cache.stats()['revalidated'] == 1
+    assert cache.stats()['misses'] == 1
+
+    stub.pos['pos1']['name'] = 'Till one'
+    assert client.get_pos('pos1')['name'] == 'Till one'
+    assert client.get_pos('pos1')['name'] == 'Till one'
+    assert cache.stats() == {'hits': 0, 'revalidated': 2, 'misses': 2,
+                             'entries': 1, 'size': cache.storage.size}
+
+
+def test_entries_are_per_merchant(stub, make_client):
+    cache = mapi_client.HttpCache()
+    make_client(http_cache=cache).get_pos('pos1')
+    make_client(http_cache=cache, mcash_merchant='other').get_pos('pos1')
+    assert cache.stats()['misses'] == 2
+    assert 'if-none-match' not in stub.requests[1].headers
+
+
+def test_fresh_responses_are_hits(make_client):
+    backend = ScriptedBackend(
+        (200, {'Cache-Control': 'max-age=60'}, '{"id": "pos1"}'))
+    cache = mapi_client.HttpCache()
+    client = make_client(http_cache=cache, backend=backend,
+                         base_url='http://localhost')
+    assert client.get_pos('pos1') == {'id': 'pos1'}
+    assert client.get_pos('pos1') == {'id': 'pos1'}
+    assert len(backend.sent_headers) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_last_modified(make_client):
+    backend = ScriptedBackend(
+        (200, {'Last-Modified': 'Thu, 01 May 2014 12:00:00 GMT'},
+         '{"id": "settlement1"}'),
+        (304, {}, ''))
+    client = make_client(http_cache=mapi_client.HttpCache(),
+                         backend=backend, base_url='http://localhost')
+    client.get_settlement('settlement1')
+    assert client.get_settlement('settlement1') == {'id': 'settlement1'}
+    assert backend.sent_headers[1]['If-Modified-Since'] == \
+        'Thu, 01 May 2014 12:00:00 GMT'
+    assert 'If-None-Match' not in backend.sent_headers[1]
+
+
+def test_uncacheable_responses(make_client):
+    backend = ScriptedBackend(
+        (200, {'ETag': '"1"', 'Cache-Control': 'no-store'}, '{}'),
+        (200, {}, '{}'),
+        (200, {}, '{}'))
+    cache = mapi_client.HttpCache()
+    client = make_client(http_cache=cache, backend=backend,
+                         base_url='http://localhost')
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    assert 'If-None-Match' not in backend.sent_headers[-1]
+    assert len(cache.storage) == 0
+
+
+def test_only_gets_are_cached(make_client):
+    backend = ScriptedBackend((204, {'ETag': '"1"'}, ''))
+    cache = mapi_client.HttpCache()
+    client = make_client(http_cache=cache, backend=backend,
+                         base_url='http://localhost')
+    client.delete_pos('pos1')
+    assert cache.stats()['misses'] == 0
+
+
+def test_not_found_drops_entry(make_client):
+    backend = ScriptedBackend((200, {'ETag': '"1"'}, '{}'),
+                              (404, {}, '{"error": "not found"}'))
+    cache = mapi_client.HttpCache()
+    client = make_client(http_cache=cache, backend=backend,
+                         base_url='http://localhost')
+    client.get_pos('pos1')
+    with pytest.raises(mapi_client.MapiError):
+        client.get_pos('pos1')
+    assert len(cache.storage) == 0
+
+
+def test_memory_storage_is_bounded():
+    storage = mapi_client.MemoryStorage(max_bytes=25)
+    storage.set('a', _entry('x' * 10))
+    storage.set('b', _entry('x' * 10))
+    assert storage.get('a') is not None
+    storage.set('c', _entry('x' * 10))
+    # b was the least recently used
+    assert storage.get('b') is None
+    assert storage.get('a') is not None
+    assert storage.size == 20
+    assert storage.evictions == 1
+    storage.set('d', _entry('x' * 30))
+    assert storage.get('d') is None
+
+
+def test_disk_storage(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    storage = mapi_client.DiskStorage(directory)
+    storage.set(('m', 'u', 'url'), _entry('{"id": "pos1"}'))
+    assert storage.get(('m', 'u', 'url')).content == '{"id": "pos1"}'
+    assert storage.get(('m', 'u', 'other')) is None
+
+    storage = mapi_client.DiskStorage(directory)
+    assert len(storage) == 1
+    assert storage.get(('m', 'u', 'url')).etag == '"1"'
+    storage.delete(('m', 'u', 'url'))
+    assert len(storage) == 0
+    assert storage.size == 0
+
+
+def test_disk_storage_only_reads_data(tmpdir):
+    storage = mapi_client.DiskStorage(str(tmpdir))
+    storage.set(('m', 'u', 'url'), _entry('{"id": "pos1"}'))
+    name, = [n for n in os.listdir(str(tmpdir)) if n.endswith('.entry')]
+    header, content = tmpdir.join(name).read('rb').split('\n', 1)
+    assert json.loads(header)['etag'] == '"1"'
+    assert content == '{"id": "pos1"}'
+
+    # a pickle planted in the directory is not loaded
+    tmpdir.join(name).write(pickle.dumps(_entry('{}')), 'wb')
+    assert storage.get(('m', 'u', 'url')) is None
+
+
+def test_disk_storage_is_bounded(tmpdir):
+    storage = mapi_client.DiskStorage(str(tmpdir), max_bytes=1000)
+    for i in range(10):
+        storage.set(i, _entry('x' * 300))
+    assert storage.size <= 1000
+    assert storage.get(9) is not None
+    assert storage.evictions > 0
+
+
+def test_disk_storage_serves_client(make_client, tmpdir):
+    cache = mapi_client.HttpCache(mapi_client.DiskStorage(str(tmpdir)))
+    make_client(http_cache=cache).get_pos('pos1')
+    cache = mapi_client.HttpCache(mapi_client.DiskStorage(str(tmpdir)))
+    assert make_client(http_cache=cache).get_pos('pos1')['id'] == 'pos1'
+    assert cache.stats()['revalidated'] == 1
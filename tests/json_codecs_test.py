@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import json
+
+import pytest
+from Crypto.PublicKey import RSA
+
+from mcash import mapi_client
+
+privkey = RSA.generate(1024).exportKey()
+
+payment_request = {'customer': 'alice', 'currency': 'NOK', 'amount': '25.00',
+                   'allow_credit': False, 'pos_id': 'pos/1',
+                   'pos_tid': u'kj\xf8p', 'action': 'auth',
+                   'expires_in': 60, 'text': u'Takk for handelen',
+                   'line_items': [{'product_id': 'p1', 'quantity': '1',
+                                   'total': '25.00', 'item_cost': '25.00',
+                                   'description': u'R\xf8dvin'}]}
+
+
+@pytest.fixture(params=mapi_client.available_json_codecs())
+def codec(request):
+    return mapi_client.get_json_codec(request.param)
+
+
+def test_round_trip(codec):
+    encoded = codec.dumps(payment_request)
+    assert isinstance(encoded, str)
+    assert json.loads(encoded) == payment_request
+    assert codec.loads(encoded) == payment_request
+
+
+def test_big_numbers(codec):
+    big = {'amount': 2 ** 70, 'rate': 0.1}
+    assert codec.loads(codec.dumps(big)) == big
+
+
+@pytest.mark.parametrize('number', ['123456789012345678901',
+                                    '-123456789012345678901',
+                                    '18446744073709551616'])
+def test_integers_beyond_64_bits_are_exact(codec, number):
+    body = '{"id": %s, "amount": "1.00"}' % number
+    assert codec.loads(body) == {'id': int(number), 'amount': '1.00'}
+    assert mapi_client.MapiResponse(200, {}, body).json()['id'] == \
+        int(number)
+
+
+def test_invalid_json_raises_value_error(codec):
+    with pytest.raises(ValueError):
+        codec.loads('{"amount": ')
+
+
+def test_signed_bytes_are_sent(stub, make_client, codec):
+    client = make_client(auth=mapi_client.RsaSha256Auth(privkey),
+                         json_codec=codec.name)
+    tid = client.create_payment_request(**payment_request)['id']
+    request = stub.requests[-1]
+    digest = 'SHA256=' + base64.b64encode(
+        hashlib.sha256(request.body).digest())
+    assert request.headers['x-mcash-content-digest'] == digest
+    assert json.loads(request.body)['pos_tid'] == u'kj\xf8p'
+    assert client.get_payment_request(tid)['pos_id'] == 'pos/1'
+
+
+def test_default_codec_decodes_like_stdlib():
+    codec = mapi_client.get_json_codec()
+    assert codec.name in ('ujson', 'json')
+    assert codec.loads('{"a": "b"}') == {u'a': u'b'}
+    assert isinstance(codec.loads('{"a": "b"}')['a'], unicode)
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        mapi_client.get_json_codec('nope')
@@ -0,0 +1,65 @@
+import pytest
+
+from mcash import mapi_client
+
+
+class CountingCodec(object):
+    def __init__(self):
+        self.loads_calls = 0
+
+    def loads(self, s):
+        self.loads_calls += 1
+        return mapi_client.get_json_codec('json').loads(s)
+
+
+def test_response_is_compact():
+    res = mapi_client.MapiResponse(200, {}, '{}')
+    assert not hasattr(res, '__dict__')
+    with pytest.raises(AttributeError):
+        res.extra = 1
+
+
+def test_json_is_decoded_once():
+    codec = CountingCodec()
+    res = mapi_client.MapiResponse(200, {}, '{"id": "tid1"}')
+    res.json_codec = codec
+    assert codec.loads_calls == 0
+    assert res.json() is res.json()
+    assert codec.loads_calls == 1
+
+
+def test_null_content_is_decoded_once():
+    codec = CountingCodec()
+    res = mapi_client.MapiResponse(200, {}, 'null')
+    res.json_codec = codec
+    assert res.json() is None
+    assert res.json() is None
+    assert codec.loads_calls == 1
+
+
+def test_drop_content():
+    res = mapi_client.MapiResponse(200, {}, '{"id": "tid1"}')
+    assert res.drop_content() == {'id': 'tid1'}
+    assert res.content is None
+    assert res.json() == {'id': 'tid1'}
+
+
+def test_headers_are_case_insensitive():
+    res = mapi_client.MapiResponse(200, {'Retry-After': '2'}, '')
+    assert res.headers['retry-after'] == '2'
+    assert res.headers.get('RETRY-AFTER') == '2'
+    assert 'retry-AFTER' in res.headers
+    assert res.headers.get('X-Missing') is None
+    assert res.headers == {'retry-after': '2'}
+    status, headers, content = res
+    assert headers == {'Retry-After': '2'}
+
+
+def test_error_has_response_interface():
+    error = mapi_client.MapiError(404, {'Content-Type': 'application/json'},
+                                  '{"error": "not found"}')
+    assert error.status == 404
+    assert error.headers['content-type'] == 'application/json'
+    assert error.json() == {'error': 'not found'}
+    assert list(error)[0] == 404
+    assert error.args[0] == 404
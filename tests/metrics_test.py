@@ -0,0 +1,87 @@
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.endpoints import endpoint_template
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    return stub
+
+
+@pytest.fixture
+def metrics():
+    return mapi_client.Metrics()
+
+
+@pytest.fixture
+def client(make_client, metrics):
+    return make_client(metrics=metrics)
+
+
+def test_endpoint_template():
+    base = 'https://mcashtestbed.appspot.com/merchant/v1'
+    assert (endpoint_template(base + '/payment_request/abc123/outcome/') ==
+            '/payment_request/{tid}/outcome/')
+    assert endpoint_template(base + '/pos/?page=3') == '/pos/'
+    assert endpoint_template(base + '/pos/pos1/') == '/pos/{pos_id}/'
+    assert (endpoint_template('https://mcash.no/chat/v1/merchant/m1/channel/'
+                              'c1/message/') ==
+            '/chat/v1/merchant/{merchant_id}/channel/{channel_id}/message/')
+
+
+def test_requests_are_recorded_per_endpoint_and_status(stub, client,
+                                                       metrics):
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    with pytest.raises(mapi_client.MapiError):
+        client.get_pos('missing')
+    stats = metrics.stats()[('GET', '/pos/{pos_id}/')]
+    assert stats['requests'] == 3
+    assert stats['statuses'] == {'200': 2, '404': 1}
+    assert stats['errors'] == 1
+    assert stats['in_flight'] == 0
+    assert stats['request_bytes'] == 0
+    assert stats['response_bytes'] > 0
+
+
+def test_request_bytes(stub, client, metrics):
+    client.create_pos(name='Till 2', pos_type='store', pos_id='pos2')
+    assert metrics.stats()[('POST', '/pos/')]['request_bytes'] == len(
+        stub.requests[-1].body)
+
+
+def test_upload_attachment_is_recorded(stub, client, metrics):
+    client.upload_attachment(stub.url + '/merchant/v1/attachment/',
+                             'text/plain', 'receipt')
+    stats = metrics.stats()[('POST', '/attachment/')]
+    assert stats['requests'] == 1
+    assert stats['request_bytes'] == len(stub.requests[-1].body)
+
+
+def test_prometheus_text(client, metrics):
+    client.get_pos('pos1')
+    text = metrics.prometheus_text()
+    labels = 'endpoint="/pos/{pos_id}/",method="GET"'
+    assert '# TYPE mapi_client_request_duration_seconds histogram' in text
+    assert ('mapi_client_request_duration_seconds_bucket{%s,status="200",'
+            'le="+Inf"} 1' % labels) in text
+    assert ('mapi_client_request_duration_seconds_count{%s,status="200"} 1'
+            % labels) in text
+    assert 'mapi_client_requests_in_flight{%s} 0' % labels in text
+    assert 'mapi_client_request_errors_total{%s} 0' % labels in text
+
+
+def test_custom_sink(make_client):
+    class Sink(mapi_client.MetricsSink):
+        def __init__(self):
+            self.calls = []
+
+        def request_finished(self, method, endpoint, status, latency,
+                             request_bytes, response_bytes):
+            self.calls.append((method, endpoint, status))
+
+    sink = Sink()
+    make_client(metrics=sink).get_pos('pos1')
+    assert sink.calls == [('GET', '/pos/{pos_id}/', 200)]
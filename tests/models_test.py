@@ -0,0 +1,124 @@
+import sys
+
+import pytest
+
+from mcash import mapi_client
+
+settlement = {'id': 'settlement1', 'currency': 'NOK', 'amount': '200.00',
+              'fee': '2.00', 'settlement_date': '2014-05-01',
+              'transactions': [{'tid': 'tid%d' % i, 'pos_id': 'pos1',
+                                'amount': '100.00', 'type': 'payment'}
+                               for i in range(2)]}
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    stub.add_settlement(settlement)
+    return stub
+
+
+def test_model_reads_like_dict():
+    model = mapi_client.Settlement.from_dict(settlement)
+    assert model.id == model['id'] == 'settlement1'
+    assert model.get('currency') == 'NOK'
+    assert model['settlement_date'] == '2014-05-01'
+    assert model.extra == {'settlement_date': '2014-05-01'}
+    assert model.transactions[1].tid == 'tid1'
+    assert model.transactions[1]['pos_id'] == 'pos1'
+    assert model == settlement
+    assert model.to_dict() == settlement
+    assert sorted(model) == sorted(settlement)
+    assert len(model) == len(settlement)
+
+
+def test_missing_fields():
+    model = mapi_client.Pos.from_dict({'id': 'pos1', 'location': None})
+    assert model.name is None
+    assert model.location is None
+    assert 'name' not in model
+    assert 'location' in model
+    with pytest.raises(KeyError):
+        model['name']
+    with pytest.raises(AttributeError):
+        model.unknown
+    assert model.to_dict() == {'id': 'pos1', 'location': None}
+
+
+def test_models_are_compact():
+    model = mapi_client.Settlement.from_dict(settlement)
+    assert not hasattr(model, '__dict__')
+    assert not hasattr(model.transactions[0], '__dict__')
+    assert type(model.transactions[0]) is type(model.transactions[1])
+    assert sys.getsizeof(model) < sys.getsizeof(settlement)
+
+
+def test_shared_values():
+    a = mapi_client.Settlement.from_dict({'currency': ''.join(['N', 'OK'])})
+    b = mapi_client.Settlement.from_dict({'currency': ''.join(['N', 'OK'])})
+    assert a.currency is b.currency
+
+
+def test_keys_that_are_not_identifiers_stay_dicts():
+    model = mapi_client.Pos.from_dict({'id': 'pos1',
+                                       'location': {'lat-lng': [1, 2]}})
+    assert model.location == {'lat-lng': [1, 2]}
+    assert isinstance(model.location, dict)
+
+
+def test_keys_named_like_methods_do_not_hide_them():
+    model = mapi_client.Settlement.from_dict(
+        {'payout_details': {'items': [1, 2], 'bank': 'DNB'}})
+    details = model.payout_details
+    assert isinstance(details, mapi_client.DictRecord)
+    assert sorted(details.items()) == [('bank', 'DNB'), ('items', [1, 2])]
+    assert details['items'] == [1, 2]
+    assert details.bank == 'DNB'
+    assert details.to_dict() == {'items': [1, 2], 'bank': 'DNB'}
+    assert not hasattr(details, '__dict__')
+
+
+def test_record_classes_are_capped(monkeypatch):
+    monkeypatch.setattr(mapi_client.models, '_record_classes', {})
+    monkeypatch.setattr(mapi_client.models, '_max_record_classes', 2)
+    records = [mapi_client.models._record({'key%d' % i: i})
+               for i in range(4)]
+    assert len(mapi_client.models._record_classes) == 2
+    assert isinstance(records[3], mapi_client.DictRecord)
+    assert records[3].key3 == 3
+    assert records[3] == {'key3': 3}
+    # key sets seen before the cap still get their class
+    assert type(mapi_client.models._record({'key0': 5})) is type(records[0])
+
+
+def test_client_returns_models(stub, make_client):
+    client = make_client(typed_results=True)
+    pos = client.get_pos('pos1')
+    assert isinstance(pos, mapi_client.Pos)
+    assert pos.name == 'Till 1'
+    result = client.get_settlement('settlement1')
+    assert isinstance(result, mapi_client.Settlement)
+    assert result == settlement
+    assert isinstance(client.get_last_settlement(), mapi_client.Settlement)
+
+    tid = client.create_payment_request(
+        customer='alice', currency='NOK', amount='20.00', allow_credit=False,
+        pos_id='pos1', pos_tid='tid1', action='auth', text='Takk',
+        expires_in=60)['id']
+    payment_request = client.get_payment_request(tid)
+    assert isinstance(payment_request, mapi_client.PaymentRequest)
+    assert payment_request.amount == '20.00'
+    stub.set_outcome(tid, 'auth', amount='20.00')
+    outcome = client.get_payment_request_outcome(tid)
+    assert isinstance(outcome, mapi_client.PaymentRequestOutcome)
+    assert outcome.status == 'auth'
+
+    shortlink_id = client.create_shortlink()['id']
+    assert isinstance(client.get_shortlink(shortlink_id),
+                      mapi_client.Shortlink)
+
+
+def test_client_returns_dicts_by_default(make_client):
+    client = make_client(typed_results=False)
+    assert type(client.get_pos('pos1')) is dict
+    assert type(client.get_settlement('settlement1')) is dict
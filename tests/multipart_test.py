@@ -0,0 +1,75 @@
+import io
+import os
+import tempfile
+
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.multipart import encode_attachment
+
+
+class TrackingFile(object):
+    """Read-only stream recording the largest single read, it can neither
+    seek nor tell its size
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.largest_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.largest_read = max(self.largest_read, len(data))
+        return data
+
+
+def test_stream_matches_poster_encoding():
+    stream, headers = encode_attachment('receipt data', 'application/json')
+    body = stream.read(10) + stream.read(7) + stream.read()
+    assert len(body) == len(stream) == int(headers['Content-Length'])
+    assert 'receipt data' in body
+
+
+def test_file_is_streamed(stub, make_client):
+    content = os.urandom(1024 * 1024)
+    with tempfile.TemporaryFile() as f:
+        f.write(content)
+        f.seek(0)
+        tracking = TrackingFile(f)
+        make_client().upload_attachment(
+            stub.url + '/merchant/v1/attachment/', 'application/pdf',
+            tracking, length=len(content))
+    assert tracking.largest_read <= 8192
+    request = stub.requests[0]
+    assert 'transfer-encoding' not in request.headers
+    assert int(request.headers['content-length']) == len(request.body)
+    assert content in stub.attachments[0]
+
+
+def test_bytesio():
+    stream, headers = encode_attachment(io.BytesIO('receipt data'),
+                                        'application/pdf')
+    body = stream.read()
+    assert len(body) == int(headers['Content-Length'])
+    assert 'receipt data' in body
+
+
+def test_file_is_read_from_current_position():
+    f = io.BytesIO('skipped receipt data')
+    f.read(8)
+    stream, headers = encode_attachment(f, 'application/pdf')
+    body = stream.read()
+    assert len(body) == int(headers['Content-Length'])
+    assert 'skipped' not in body
+
+
+def test_read_only_stream_needs_length():
+    with pytest.raises(ValueError):
+        encode_attachment(TrackingFile(io.BytesIO('receipt data')),
+                          'application/pdf')
+    stream, headers = encode_attachment(
+        TrackingFile(io.BytesIO('receipt data')), 'application/pdf',
+        length=12)
+    body = stream.read()
+    assert len(body) == int(headers['Content-Length'])
+    assert 'receipt data' in body
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+from concurrent.futures import TimeoutError
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def client(make_client):
+    waiter = mapi_client.OutcomeWaiter(min_interval=0.05, max_interval=0.2)
+    yield make_client(outcome_waiter=waiter)
+    waiter.close()
+
+
+def _create(client, n):
+    payment_requests = [{'customer': 'alice',
+                         'currency': 'NOK',
+                         'amount': '10.00',
+                         'allow_credit': False,
+                         'pos_id': 'pos1',
+                         'pos_tid': 'tid%d' % i,
+                         'action': 'auth',
+                         'expires_in': 60} for i in range(n)]
+    return [r['id'] for r in
+            client.batch_create_payment_requests(payment_requests)]
+
+
+def _polls(stub, tid):
+    return len([r for r in stub.requests
+                if r.method == 'GET' and tid in r.path])
+
+
+def test_future_resolves_on_final_status(stub, client):
+    tid, = _create(client, 1)
+    future = client.wait_for_outcome(tid, timeout=5)
+    time.sleep(0.2)
+    assert not future.done()
+    stub.set_outcome(tid, 'auth')
+    assert future.result(2)['status'] == 'auth'
+    polls = _polls(stub, tid)
+    time.sleep(0.3)
+    assert _polls(stub, tid) == polls
+
+
+def test_many_waits_are_multiplexed(stub, client):
+    tids = _create(client, 50)
+    before = threading.active_count()
+    futures = [client.wait_for_outcome(tid, timeout=5) for tid in tids]
+    # one scheduler thread, polls run on a bounded pool
+    assert threading.active_count() - before <= 11
+    for tid in tids:
+        stub.set_outcome(tid, 'ok')
+    assert all(f.result(3)['status'] == 'ok' for f in futures)
+    assert client.outcome_waiter.stats()['pending'] == 0
+
+
+def test_waits_for_the_same_tid_share_polls(stub, client):
+    tid, = _create(client, 1)
+    futures = [client.wait_for_outcome(tid) for i in range(5)]
+    time.sleep(0.3)
+    stub.set_outcome(tid, 'fail')
+    results = [f.result(2) for f in futures]
+    assert all(r is results[0] for r in results)
+    assert client.outcome_waiter.stats()['polls'] < 10
+
+
+def test_first_polls_are_rate_limited(stub, make_client):
+    waiter = mapi_client.OutcomeWaiter(max_rate=20)
+    client = make_client(outcome_waiter=waiter)
+    tids = _create(client, 20)
+    before = len(stub.requests)
+    start = time.time()
+    futures = [client.wait_for_outcome(tid, timeout=5) for tid in tids]
+    time.sleep(0.5)
+    polls = waiter.stats()['polls']
+    assert 5 <= polls <= 12
+    assert len(stub.requests) - before <= polls
+    for tid in tids:
+        stub.set_outcome(tid, 'ok')
+    assert all(f.result(3)['status'] == 'ok' for f in futures)
+    # 20 first polls take a second at 20 per second
+    assert time.time() - start >= 0.9
+    waiter.close()
+
+
+def test_timeout(stub, client):
+    tid, = _create(client, 1)
+    future = client.wait_for_outcome(tid, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        future.result(2)
+    assert client.outcome_waiter.stats()['pending'] == 0
+
+
+def test_unknown_tid_fails(client):
+    future = client.wait_for_outcome('missing', timeout=2)
+    with pytest.raises(mapi_client.MapiError):
+        future.result(2)
+
+
+def test_permission_outcome(stub, client):
+    rid = client.create_permission_request(customer='alice', pos_id='pos1',
+                                           pos_tid='rid1',
+                                           scope='openid')['id']
+    future = client.wait_for_permission_outcome(rid, timeout=5)
+    stub.set_permission_outcome(rid, 'ok')
+    assert future.result(2)['status'] == 'ok'
+
+
+def test_interval_backs_off_with_age_and_load():
+    waiter = mapi_client.OutcomeWaiter(min_interval=0.5, max_interval=10,
+                                       growth=0.1, max_rate=100)
+    pending = mapi_client.outcomes._Pending('key', None, None)
+    now = pending.created
+    assert waiter._interval(pending, now) == 0.5
+    assert waiter._interval(pending, now + 45) == 5.0
+    assert waiter._interval(pending, now + 1000) == 10
+    waiter._pending = dict.fromkeys(range(5000))
+    assert waiter._interval(pending, now) == 50
+    pending.expires_at = now + 2
+    assert waiter._interval(pending, now) == 2
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from mcash import mapi_client
+from mcash.mapi_client.endpoints import endpoint_family
+from mcash.mapi_client.ratelimit import AdaptiveConcurrencyLimit
+
+
+def test_endpoint_family():
+    assert endpoint_family('https://api.mca.sh/merchant/v1/payment_request/'
+                           'abc/outcome/') == 'payment_request'
+    assert endpoint_family('https://api.mca.sh/merchant/v1/settlement/'
+                           '?page=2') == 'settlement'
+
+
+def test_token_bucket_rate(make_client):
+    limiter = mapi_client.RateLimiter(
+        {'shortlink': mapi_client.EndpointLimits(rate=100, burst=1)})
+    client = make_client(rate_limiter=limiter)
+    start = time.time()
+    for i in range(11):
+        client.create_shortlink()
+    assert time.time() - start >= 0.09
+    # other families are not limited
+    start = time.time()
+    for i in range(11):
+        client.get_all_pos()
+    assert time.time() - start < 0.09
+
+
+def test_concurrency_limit(stub, make_client):
+    limiter = mapi_client.RateLimiter(
+        {'pos': mapi_client.EndpointLimits(
+            concurrency={'initial': 2, 'max_limit': 2})})
+    client = make_client(rate_limiter=limiter)
+    stub.inject_latency(*[0.05] * 6)
+    queued = []
+
+    def poll():
+        while not done.is_set():
+            queued.append(limiter.stats()['pos']['queued'])
+            time.sleep(0.005)
+    done = threading.Event()
+    watcher = threading.Thread(target=poll)
+    watcher.start()
+    threads = [threading.Thread(target=client.get_all_pos) for i in range(6)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    watcher.join()
+    # 6 requests of 50ms, 2 at a time
+    assert time.time() - start >= 0.15
+    assert max(queued) >= 3
+    assert limiter.stats()['pos'] == {'concurrency_limit': 2, 'in_flight': 0,
+                                      'queued': 0}
+
+
+def test_aimd():
+    limit = AdaptiveConcurrencyLimit(initial=10, decrease_interval=0)
+    limit.acquire()
+    limit.release(0.01, 503)
+    assert limit.limit == 5
+    for i in range(5):
+        limit.acquire()
+        limit.release(0.01, 200)
+    assert 5.9 < limit.limit < 6.1
+
+
+def test_latency_target():
+    limit = AdaptiveConcurrencyLimit(initial=10, latency_target=0.1,
+                                     decrease_interval=60)
+    limit.acquire()
+    limit.release(0.5, 200)
+    limit.acquire()
+    limit.release(0.5, 200)
+    # only one decrease per interval
+    assert limit.limit == 5
+
+
+def test_default_limits(make_client):
+    limiter = mapi_client.RateLimiter(
+        default=lambda: mapi_client.EndpointLimits(
+            rate=1000, concurrency={'initial': 4}))
+    client = make_client(rate_limiter=limiter)
+    client.get_all_pos()
+    client.get_all_settlements()
+    assert sorted(limiter.stats()) == ['pos', 'settlement']
+    assert limiter.stats()['pos']['rate'] == 1000
@@ -0,0 +1,102 @@
+import socket
+
+import pytest
+
+from mcash import mapi_client
+
+
+class CountingTimestampAuth(mapi_client.SecretAuth):
+    """Secret auth that stamps each request like RsaSha256Auth does"""
+
+    def __init__(self):
+        mapi_client.SecretAuth.__init__(self, 'secret')
+        self.count = 0
+
+    def __call__(self, method, url, headers, body):
+        self.count += 1
+        headers['X-Mcash-Timestamp'] = str(self.count)
+        return mapi_client.SecretAuth.__call__(self, method, url, headers,
+                                               body)
+
+
+@pytest.fixture
+def make_client(make_client):
+    """Clients signing with CountingTimestampAuth, retrying with a short
+    backoff unless given another retry_policy
+    """
+    def make_retrying_client(**kwargs):
+        kwargs.setdefault('retry_policy',
+                          mapi_client.RetryPolicy(backoff=0.001))
+        return make_client(auth=CountingTimestampAuth(), **kwargs)
+    return make_retrying_client
+
+
+def _create_payment_request(client):
+    return client.create_payment_request(customer='alice', currency='NOK',
+                                         amount='10.00', allow_credit=False,
+                                         pos_id='pos1', pos_tid='tid1',
+                                         action='auth', expires_in=60)
+
+
+def test_idempotent_request_is_retried_and_signed_again(stub, make_client):
+    stub.inject_errors(503, 502)
+    assert _create_payment_request(make_client())['id']
+    assert len(stub.requests) == 3
+    timestamps = [r.headers['x-mcash-timestamp'] for r in stub.requests]
+    assert timestamps == ['1', '2', '3']
+
+
+def test_gives_up_after_max_attempts(stub, make_client):
+    stub.inject_errors(503, 503, 503, 503)
+    with pytest.raises(mapi_client.MapiError) as e:
+        _create_payment_request(make_client())
+    assert e.value.status == 503
+    assert len(stub.requests) == 3
+
+
+def test_non_idempotent_request_is_not_retried(stub, make_client):
+    stub.inject_errors(503)
+    with pytest.raises(mapi_client.MapiError):
+        make_client().create_shortlink()
+    assert len(stub.requests) == 1
+
+
+def test_refund_without_refund_id_is_not_retried(stub, make_client):
+    stub.inject_errors(503)
+    with pytest.raises(mapi_client.MapiError):
+        make_client().update_payment_request(tid='tid', action='refund')
+    assert len(stub.requests) == 1
+
+
+def test_client_errors_are_not_retried(stub, make_client):
+    with pytest.raises(mapi_client.MapiError):
+        make_client().get_payment_request('missing')
+    assert len(stub.requests) == 1
+
+
+def test_retry_budget(stub, make_client):
+    budget = mapi_client.RetryBudget(ratio=0, max_tokens=1)
+    client = make_client(retry_policy=mapi_client.RetryPolicy(
+        backoff=0.001, budget=budget))
+    stub.inject_errors(503, 503, 503)
+    with pytest.raises(mapi_client.MapiError):
+        client.get_all_pos()
+    assert len(stub.requests) == 2
+
+
+def test_connection_errors_are_retried(make_client):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    url = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+    sock.close()
+    client = make_client(base_url=url)
+    with pytest.raises(IOError):
+        client.get_all_pos()
+    assert client.auth.count == 3
+
+
+def test_no_retries_by_default(stub, make_client):
+    stub.inject_errors(503)
+    with pytest.raises(mapi_client.MapiError):
+        make_client(retry_policy=None).get_all_pos()
+    assert len(stub.requests) == 1
@@ -0,0 +1,132 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client import settlement_analytics
+
+
+def _settlement(id, currency, created, transactions):
+    return {'id': id, 'currency': currency, 'created': created,
+            'amount': '%d.00' % sum(t[1] for t in transactions),
+            'fee': '-%d.50' % len(transactions),
+            'transactions': [{'tid': '%s-%d' % (id, i), 'type': type_,
+                              'amount': '%d.00' % amount, 'fee': '0.25'}
+                             for i, (type_, amount) in
+                             enumerate(transactions)]}
+
+
+settlements = [
+    _settlement('s1', 'NOK', '2014-04-30 23:00:00',
+                [('payment', 100), ('payment', 50), ('refund', -20)]),
+    _settlement('s2', 'NOK', '2014-05-01 01:00:00', [('payment', 10)]),
+    _settlement('s3', 'EUR', '2014-05-02 12:00:00', [('payment', 7)]),
+    _settlement('s4', 'NOK', '2015-01-01 12:00:00', []),
+]
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(settlement_analytics, 'numpy', None)
+    return request.param
+
+
+def test_totals(backend):
+    table = mapi_client.SettlementTable.from_settlements(settlements)
+    assert len(table) == 4
+    assert table.totals() == {
+        ('NOK', '2014-04'): (1, Decimal('130.00'), Decimal('-3.50')),
+        ('NOK', '2014-05'): (1, Decimal('10.00'), Decimal('-1.50')),
+        ('EUR', '2014-05'): (1, Decimal('7.00'), Decimal('-1.50')),
+        ('NOK', '2015-01'): (1, Decimal('0.00'), Decimal('-0.50')),
+    }
+    assert table.totals(by=('currency',)) == {
+        ('NOK',): (3, Decimal('140.00'), Decimal('-5.50')),
+        ('EUR',): (1, Decimal('7.00'), Decimal('-1.50')),
+    }
+    assert table.totals(by=('period',), period='year') == {
+        ('2014',): (3, Decimal('147.00'), Decimal('-6.50')),
+        ('2015',): (1, Decimal('0.00'), Decimal('-0.50')),
+    }
+    assert table.totals(by=(), period='day') == {
+        (): (4, Decimal('147.00'), Decimal('-7.00'))}
+    assert ('2014-04-30',) in table.totals(by=('period',), period='day')
+
+
+def test_transaction_totals(backend):
+    table = mapi_client.SettlementTable.from_settlements(settlements)
+    assert table.transaction_totals(by=('currency', 'type')) == {
+        ('NOK', 'payment'): (3, Decimal('160.00'), Decimal('0.75')),
+        ('NOK', 'refund'): (1, Decimal('-20.00'), Decimal('0.25')),
+        ('EUR', 'payment'): (1, Decimal('7.00'), Decimal('0.25')),
+    }
+    assert table.transaction_totals()[('NOK', '2014-04', 'payment')] == (
+        2, Decimal('150.00'), Decimal('0.50'))
+
+
+def test_invalid_grouping(backend):
+    table = mapi_client.SettlementTable.from_settlements(settlements)
+    with pytest.raises(ValueError):
+        table.totals(by=('type',))
+    with pytest.raises(ValueError):
+        table.totals(period='week')
+
+
+def test_empty_table(backend):
+    table = mapi_client.SettlementTable.from_settlements([])
+    assert table.totals() == {}
+    assert table.transaction_totals() == {}
+
+
+def test_amounts_are_exact():
+    assert settlement_analytics._hundredths('0.1') == 10
+    assert settlement_analytics._hundredths('-1.05') == -105
+    assert settlement_analytics._hundredths(12) == 1200
+    assert settlement_analytics._hundredths(None) == 0
+    with pytest.raises(ValueError):
+        settlement_analytics._hundredths('1.005')
+
+
+def test_csv(backend):
+    table = mapi_client.SettlementTable.from_settlements(settlements)
+    f = io.BytesIO()
+    table.to_csv(f)
+    lines = f.getvalue().splitlines()
+    assert lines[0] == 'id,currency,date,amount,fee'
+    assert lines[1] == 's1,NOK,2014-04-30,130.00,-3.50'
+    assert len(lines) == 5
+    f = io.BytesIO()
+    table.transactions_to_csv(f)
+    lines = f.getvalue().splitlines()
+    assert lines[3] == 's1,refund,-20.00,0.25'
+    assert len(lines) == 6
+
+
+def test_save_and_load(backend):
+    table = mapi_client.SettlementTable.from_settlements(settlements)
+    f = io.BytesIO()
+    table.save(f)
+    f.seek(0)
+    loaded = mapi_client.SettlementTable.load(f)
+    assert loaded.ids == table.ids
+    assert loaded.totals() == table.totals()
+    assert loaded.transaction_totals() == table.transaction_totals()
+
+
+def test_load_rejects_other_files():
+    with pytest.raises(ValueError):
+        mapi_client.SettlementTable.load(io.BytesIO('{"ids": []}\n'))
+
+
+@pytest.mark.parametrize('stub', [{'page_size': 2}], indirect=True)
+def test_load_settlements(stub, make_client):
+    for settlement in settlements:
+        stub.add_settlement(settlement)
+    table = mapi_client.load_settlements(make_client(typed_results=True),
+                                         max_workers=2)
+    assert table.ids == ['s1', 's2', 's3', 's4']
+    assert table.totals(by=('currency',))[('NOK',)].count == 3
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1'}
+    return stub
+
+
+@pytest.mark.parametrize('stub', [{'latency': 0.1, 'latency_jitter': 0.05}],
+                         indirect=True)
+def test_latency(stub, make_client):
+    start = time.time()
+    make_client().get_pos('pos1')
+    assert 0.1 <= time.time() - start < 1
+
+
+@pytest.mark.parametrize('stub', [{'error_rate': 1, 'error_statuses': (502,)}],
+                         indirect=True)
+def test_error_rate(stub, make_client):
+    with pytest.raises(mapi_client.MapiError) as e:
+        make_client().get_pos('pos1')
+    assert e.value.status == 502
+
+
+@pytest.mark.parametrize('stub', [{'log_requests': False}], indirect=True)
+def test_connections_closed_on_request(stub, make_client):
+    client = make_client(backend=mapi_client.RequestsFramework(
+        keep_alive=False))
+    for i in range(5):
+        client.get_pos('pos1')
+    assert stub.requests == []
@@ -0,0 +1,109 @@
+import pytest
+
+from mcash import mapi_client
+
+
+@pytest.fixture
+def stub_options():
+    return {'page_size': 10}
+
+
+@pytest.fixture
+def stub(stub):
+    for i in range(25):
+        stub.pos['pos%02d' % i] = {'id': 'pos%02d' % i,
+                                   'name': 'Till %d' % i,
+                                   'type': 'store'}
+    for i in range(30):
+        stub.add_settlement({'id': 'settlement%02d' % i,
+                             'currency': 'NOK', 'amount': '10.00'})
+    return stub
+
+
+@pytest.fixture
+def store():
+    with mapi_client.SyncStore(':memory:') as store:
+        yield store
+
+
+def test_first_sync_fetches_everything(make_client, store):
+    stats = store.sync(make_client())
+    assert stats['pos'] == {'listed': 25, 'added': 25, 'updated': 0,
+                            'removed': 0}
+    assert stats['settlement']['added'] == 30
+    assert stats['shortlink']['listed'] == 0
+    assert store.count('stubmerchant', 'pos') == 25
+    assert store.get('stubmerchant', 'pos', 'pos03')['name'] == 'Till 3'
+    assert store.get('stubmerchant', 'pos', 'missing') is None
+    settlements = store.list('stubmerchant', 'settlement')
+    assert [s['id'] for s in settlements] == ['settlement%02d' % i
+                                              for i in range(30)]
+    assert store.last_synced('stubmerchant', 'pos') is not None
+    assert store.last_synced('stubmerchant', 'shortlink') is not None
+
+
+def test_unchanged_sync_only_lists(stub, make_client, store):
+    client = make_client()
+    store.sync(client)
+    before = len(stub.requests)
+    stats = store.sync(client)
+    # 3 pages of POSes, 1 of shortlinks and 3 of settlements
+    assert len(stub.requests) - before == 7
+    assert stats['settlement'] == {'listed': 30, 'added': 0, 'updated': 0,
+                                   'removed': 0}
+
+
+def test_sync_picks_up_changes(stub, make_client, store):
+    client = make_client()
+    store.sync(client)
+    del stub.pos['pos01']
+    stub.pos['pos99'] = {'id': 'pos99', 'name': 'New till', 'type': 'store'}
+    stub.add_settlement({'id': 'settlement30', 'currency': 'NOK',
+                         'amount': '1.00'})
+    before = len(stub.requests)
+    stats = store.sync(client)
+    # a fourth page of settlements, and the two new documents
+    assert len(stub.requests) - before == 8 + 2
+    assert stats['pos']['added'] == 1
+    assert stats['pos']['removed'] == 1
+    assert stats['settlement']['added'] == 1
+    assert store.get('stubmerchant', 'pos', 'pos01') is None
+    assert store.get('stubmerchant', 'pos', 'pos99')['name'] == 'New till'
+    assert store.list('stubmerchant', 'settlement')[-1]['id'] == \
+        'settlement30'
+
+
+def test_refresh_after(stub, make_client):
+    with mapi_client.SyncStore(':memory:', refresh_after=0) as store:
+        client = make_client()
+        store.sync(client)
+        stub.pos['pos02']['name'] = 'Renamed'
+        stats = store.sync(client)
+        assert stats['pos']['updated'] == 25
+        # settlements do not change
+        assert stats['settlement']['updated'] == 0
+        assert store.get('stubmerchant', 'pos', 'pos02')['name'] == 'Renamed'
+
+
+def test_merchants_are_kept_apart(make_client, store):
+    store.sync(make_client(), collections=['pos'])
+    assert store.count('othermerchant', 'pos') == 0
+    store.sync(make_client(mcash_merchant='othermerchant'),
+               collections=['pos'])
+    assert store.count('othermerchant', 'pos') == 25
+    assert store.count('stubmerchant', 'pos') == 25
+
+
+def test_store_is_persistent(make_client, tmpdir):
+    path = str(tmpdir.join('sync.sqlite'))
+    with mapi_client.SyncStore(path) as store:
+        store.sync(make_client(), collections=['settlement'])
+    with mapi_client.SyncStore(path) as store:
+        assert store.count('stubmerchant', 'settlement') == 30
+        stats = store.sync(make_client(), collections=['settlement'])
+        assert stats['settlement']['added'] == 0
+
+
+def test_unknown_collection(make_client, store):
+    with pytest.raises(ValueError):
+        store.sync(make_client(), collections=['users'])
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from mcash import mapi_client
+from mcash.mapi_client.backends.nullframework import NullFramework
+
+
+@pytest.fixture
+def stub(stub):
+    stub.pos['pos1'] = {'id': 'pos1', 'name': 'Till 1', 'type': 'store'}
+    return stub
+
+
+def test_phases_of_a_call(stub, make_client):
+    timings = []
+    client = make_client(timing_hook=timings.append)
+    stub.inject_latency(0.1)
+    client.update_pos(pos_id='pos1', name='Till 2', pos_type='store')
+    timing, = timings
+    assert timing.method == 'PUT'
+    assert timing.status == 204
+    assert timing.attempts == 1
+    assert set(timing.phases) == set(['validate', 'serialize', 'sign',
+                                      'connect', 'server_wait', 'download'])
+    assert timing.phases['server_wait'] >= 0.1
+    assert timing.total >= 0.1
+
+
+def test_kept_alive_connection_is_not_connected_again(stub, make_client):
+    timings = []
+    client = make_client(timing_hook=timings.append)
+    client.get_pos('pos1')
+    client.get_pos('pos1')
+    first, second = timings
+    assert 0 < first.phases['connect'] < first.total
+    assert 'connect' not in second.phases
+
+
+def test_only_the_used_hedged_attempt_is_counted(stub, make_client):
+    timings = []
+    policy = mapi_client.HedgingPolicy(min_delay=0.05, max_delay=0.05)
+    client = make_client(timing_hook=timings.append, hedging_policy=policy)
+    stub.inject_latency(0.5)
+    start = time.time()
+    client.get_pos('pos1')
+    elapsed = time.time() - start
+    assert policy.stats()['hedges_won'] == 1
+    # the slow attempt completes after the call returned
+    time.sleep(0.6)
+    timing, = timings
+    assert timing.total <= elapsed
+    assert timing.phases['server_wait'] < 0.5
+
+
+def test_timing_is_attached_to_response(stub, make_client):
+    timings = []
+    client = make_client(timing_hook=timings.append)
+    res = client.do_req('GET', stub.url + '/merchant/v1/pos/pos1/')
+    assert res.timing is timings[0]
+    assert 'decode' in res.timing.phases
+    assert res.json()['name'] == 'Till 1'
+
+
+def test_timing_is_attached_to_error(stub, make_client):
+    timings = []
+    client = make_client(timing_hook=timings.append)
+    with pytest.raises(mapi_client.MapiError) as e:
+        client.get_pos('missing')
+    assert e.value.timing is timings[0]
+    assert e.value.timing.status == 404
+
+
+def test_backend_without_timing_counts_round_trip_as_server_wait(
+        make_client):
+    timings = []
+    client = make_client(base_url='http://example.com',
+                         timing_hook=timings.append, backend=NullFramework())
+    client.get_pos('pos1')
+    assert set(timings[0].phases) == set(['serialize', 'sign', 'server_wait',
+                                          'decode'])
+
+
+def test_disabled_by_default(make_client):
+    client = make_client(base_url='http://example.com',
+                         backend=NullFramework())
+    assert client.do_req('GET', 'http://example.com/').timing is None
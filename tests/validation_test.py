@@ -0,0 +1,66 @@
+import pytest
+from voluptuous import MultipleInvalid
+
+from mcash import mapi_client
+from mcash.mapi_client.validation import validate_input
+
+
+def _client(validation):
+    return mapi_client.MapiClient(
+        base_url='https://api.mca.sh',
+        auth=mapi_client.OpenAuth(),
+        mcash_merchant='merchant',
+        mcash_user='user',
+        backend=mapi_client.NullFramework(content='{"id": "tid"}'),
+        validation=validation)
+
+
+def _create_payment_request(client, **kwargs):
+    arguments = dict(customer='alice', currency='NOK', amount='10.00',
+                     allow_credit=False, pos_id='pos1', pos_tid='tid1',
+                     action='auth', expires_in=60)
+    arguments.update(kwargs)
+    return client.create_payment_request(**arguments)
+
+
+@pytest.mark.parametrize('validation', ['full', 'fast', 'off'])
+def test_valid_input(validation):
+    assert _create_payment_request(_client(validation))['id'] == 'tid'
+
+
+@pytest.mark.parametrize('validation', ['full', 'fast'])
+def test_wrong_type(validation):
+    with pytest.raises(MultipleInvalid):
+        _create_payment_request(_client(validation), allow_credit='no')
+
+
+def test_fast_validation_checks_required_and_extra_keys():
+    client = _client('fast')
+    with pytest.raises(MultipleInvalid):
+        client.create_pos(name='name', pos_type='store')
+    with pytest.raises(MultipleInvalid):
+        client.create_pos(name='name', pos_type='store', pos_id='pos1',
+                          unknown=True)
+
+
+def test_fast_validation_skips_nested_structures():
+    line_items = [{'product_id': 'product-1'}]
+    with pytest.raises(MultipleInvalid):
+        _create_payment_request(_client('full'), line_items=line_items)
+    _create_payment_request(_client('fast'), line_items=line_items)
+
+
+def test_validation_off():
+    _create_payment_request(_client('off'), currency='NORWEGIAN KRONER')
+
+
+def test_unknown_validation_mode():
+    with pytest.raises(ValueError):
+        _client('sometimes')
+
+
+def test_missing_schema_fails_when_decorating():
+    with pytest.raises(Exception):
+        @validate_input
+        def no_such_endpoint(self):
+            pass